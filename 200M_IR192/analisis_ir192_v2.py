@@ -4,41 +4,132 @@ Análisis completo para simulaciones de Ir-192
 Genera análisis similares a los de I-125
 """
 
-import uproot
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.colors import LogNorm
 from matplotlib.patches import Rectangle
 import os
+import sys
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from case_stack import difference, ratio, stack_cases  # noqa: E402
+from dose_loader import SIDECAR_DIR, load_histogram, load_values  # noqa: E402
+from dose_pyramid import load_pyramid, surface_level, surface_points  # noqa: E402
+from figure_pool import SharedMaps, aligned_key, map_key, print_timings, render_figures  # noqa: E402
+from grid_align import align_maps  # noqa: E402
+from mesh_index import mesh_index  # noqa: E402
+from task_graph import TaskGraph, state_path  # noqa: E402
 
 # Configuración
 plt.rcParams['font.size'] = 10
 plt.rcParams['figure.dpi'] = 150
 
+# Cubo de heterogeneidad de las macros (/phantom/heterogeneity/position y size)
+HETERO_CENTER_MM = (40.0, 0.0)
+HETERO_SIZE_MM = (60.0, 60.0)
+
 class IR192Analyzer:
     """Analizador para datos de Ir-192"""
+
+    # Mapas que usan las figuras: generar_todas_las_figuras los carga una sola
+    # vez y los comparte con los procesos que dibujan
+    MAPAS = ('200m_water_homogeneous.root', '200m_bone_homogeneous.root')
+    MAPAS_ALINEADOS = (
+        ('200m_water_homogeneous.root', '200m_heterogeneous_bone.root'),
+    )
+    # Figura -> (salida, ROOT que lee); generar_todas_las_figuras solo redibuja
+    # las que hayan cambiado (task_graph: hash de las entradas y del script)
+    FIGURAS = {
+        'figura1_hetero_vs_diferencia': (
+            'fig1_mapas_2d_hetero_vs_diferencia_ir192.png',
+            ('200m_water_homogeneous.root', '200m_heterogeneous_bone.root'),
+        ),
+        'figura2_casos_homogeneos': (
+            'fig2_analisis_casos_homogeneos_ir192.png',
+            ('200m_water_homogeneous.root', '200m_bone_homogeneous.root'),
+        ),
+        'figura3_perfiles_horizontales': (
+            'fig3_perfiles_horizontales_ir192.png',
+            ('200m_water_homogeneous.root', '200m_heterogeneous_bone.root'),
+        ),
+        'figura4_primaria_secundaria': (
+            'fig4_dosis_primaria_secundaria_ir192.png',
+            ('200m_water_homogeneous.root', '200m_bone_homogeneous.root'),
+        ),
+    }
     
-    def __init__(self, base_path="/home/fer/fer/newbrachy/200M_IR192"):
+    def __init__(self, base_path="/home/fer/fer/newbrachy/200M_IR192", maps=None):
         self.base_path = base_path
+        # Mapas precargados (claves de figure_pool); vacío = leer de disco
+        self.maps = maps if maps is not None else {}
         
     def load_data(self, filename, hist_name='h20'):
         """Carga datos de un archivo ROOT"""
+        key = map_key(filename, hist_name)
+        if key in self.maps:
+            return self.maps[key]
         filepath = os.path.join(self.base_path, filename)
-        with uproot.open(filepath) as file:
-            if hist_name not in file:
-                # Intentar con h10 si h20 no existe
-                hist_name = 'h10'
-            hist = file[hist_name]
-            values = hist.values()
-            return values
+        # Lectura compartida y cacheada (fallback h20 -> h10 incluido)
+        return load_values(filepath, hist_name)
+    
+    def load_aligned(self, *filenames, hist_name='h20'):
+        """Carga varios mapas y los lleva a su rejilla común (recorte o rebin exacto, sin interpolar)"""
+        key = aligned_key(filenames, hist_name)
+        if key in self.maps:
+            return list(self.maps[key]), [self.maps[key + ':x'], self.maps[key + ':y']]
+        hists = [load_histogram(os.path.join(self.base_path, filename), hist_name)
+                 for filename in filenames]
+        return align_maps([(hist.values, hist.edges) for hist in hists])
+    
+    def load_pyramid(self, filename, hist_name='h20'):
+        """Pirámide de medias del mapa (cacheada en .npycache junto al ROOT)"""
+        return load_pyramid(os.path.join(self.base_path, filename), hist_name)
+    
+    def cargar_mapas(self):
+        """Carga una vez todos los mapas de MAPAS y MAPAS_ALINEADOS (claves de figure_pool)"""
+        maps = {map_key(filename, 'h20'): self.load_data(filename) for filename in self.MAPAS}
+        for filenames in self.MAPAS_ALINEADOS:
+            aligned, edges = self.load_aligned(*filenames)
+            key = aligned_key(filenames, 'h20')
+            maps[key] = np.stack(aligned)
+            maps[key + ':x'], maps[key + ':y'] = edges
+        # Las pirámides quedan en disco: los workers solo mapean el nivel que dibujan
+        for filename in self.MAPAS:
+            self.load_pyramid(filename)
+        return maps
+    
+    def salida(self, figure):
+        """Ruta del PNG de una figura de FIGURAS"""
+        return os.path.join(self.base_path, self.FIGURAS[figure][0])
+    
+    def grafo(self):
+        """Grafo de tareas con una tarea por figura (entradas: sus ROOT; salida: su PNG)"""
+        graph = TaskGraph(state_path(self.base_path, __file__))
+        for figure, (_, entradas) in self.FIGURAS.items():
+            graph.add(figure, partial(_render_figure, self.base_path, figure),
+                      inputs=[os.path.join(self.base_path, filename) for filename in entradas],
+                      outputs=[self.salida(figure)])
+        return graph
+    
+    def heterogeneity_bins(self, edges):
+        """(x0, y0, ancho, alto) en bins de la heterogeneidad para unos bordes dados"""
+        index = mesh_index(edges[0], edges[1], hetero_center_mm=HETERO_CENTER_MM,
+                           hetero_size_mm=HETERO_SIZE_MM,
+                           cache_dir=os.path.join(self.base_path, SIDECAR_DIR))
+        return index.heterogeneity_bins()
     
     def figura1_hetero_vs_diferencia(self):
         """Mapas 2D: Heterogéneos vs Diferencia"""
         print("Generando Figura 1: Mapas 2D Heterogéneos vs Diferencia...")
         
-        # Cargar datos
-        water_homo = self.load_data('200m_water_homogeneous.root')
-        bone_hetero = self.load_data('200m_heterogeneous_bone.root')
+        # Cargar datos alineados en la misma rejilla (recorte o rebin exacto, sin interpolar)
+        (water_homo_aligned, bone_hetero), edges = self.load_aligned(
+            '200m_water_homogeneous.root', '200m_heterogeneous_bone.root')
+        
+        # None si el cubo cae fuera de la malla: se dibujan los mapas sin rectángulo
+        hetero = self.heterogeneity_bins(edges)
         
         # Crear figura similar a la original
         fig, axes = plt.subplots(2, 3, figsize=(15, 10))
@@ -46,39 +137,34 @@ class IR192Analyzer:
                      fontsize=14, fontweight='bold')
         
         # Simular diferentes materiales (ajustar según tus datos reales)
-        lung_icrp = bone_hetero * 0.55  # Aproximación para Lung ICRP
-        lung_mird = bone_hetero * 0.15  # Aproximación para Lung MIRD
-        
-        # Interpolar water_homo al tamaño de bone_hetero
-        from scipy.ndimage import zoom
-        zoom_factor = bone_hetero.shape[0] / water_homo.shape[0]
-        water_homo_interp = zoom(water_homo, zoom_factor, order=1)
+        stack = stack_cases({
+            'lung_icrp': bone_hetero * 0.55,  # Aproximación para Lung ICRP
+            'lung_mird': bone_hetero * 0.15,  # Aproximación para Lung MIRD
+            'bone': bone_hetero,
+        }, water_homo_aligned)
         
         # Fila 1: Dosis
         titles = ['Lung ICRP (1.05 g/cm³)\nDosis (Gy)',
                   'Lung MIRD (0.2958 g/cm³)\nDosis (Gy)',
                   'Hueso (1.85 g/cm³)\nDosis (Gy)']
-        data_row1 = [lung_icrp, lung_mird, bone_hetero]
-        
-        for idx, (ax, data, title) in enumerate(zip(axes[0], data_row1, titles)):
+        for idx, (ax, data, title) in enumerate(zip(axes[0], stack.values, titles)):
             data_plot = np.where(data > 0, data, 1e-10)
             im = ax.imshow(data_plot.T, origin='lower', cmap='jet', 
                           norm=LogNorm(vmin=data_plot[data_plot>0].min(), 
                                       vmax=data_plot.max()),
                           extent=[0, 300, 0, 300])
             # Añadir rectángulo
-            rect = Rectangle((110, 110), 70, 70, linewidth=2, 
-                           edgecolor='white', facecolor='none', linestyle='--')
-            ax.add_patch(rect)
+            if hetero is not None:
+                rect = Rectangle(hetero[:2], *hetero[2:], linewidth=2, 
+                               edgecolor='white', facecolor='none', linestyle='--')
+                ax.add_patch(rect)
             ax.set_xlabel('X (bins)')
             ax.set_ylabel('Y (bins)')
             ax.set_title(title)
             plt.colorbar(im, ax=ax, label='Dosis (Gy)')
         
         # Fila 2: Diferencias
-        diff_data = [lung_icrp - water_homo_interp,
-                     lung_mird - water_homo_interp,
-                     bone_hetero - water_homo_interp]
+        diff_data = difference(stack)
         diff_titles = ['Lung ICRP (1.05 g/cm³)\nDiferencia: Hetero - Water Homo (Gy)',
                        'Lung MIRD (0.2958 g/cm³)\nDiferencia: Hetero - Water Homo (Gy)',
                        'Hueso (1.85 g/cm³)\nDiferencia: Hetero - Water Homo (Gy)']
@@ -87,16 +173,17 @@ class IR192Analyzer:
             vmax = np.abs(data).max() * 0.3
             im = ax.imshow(data.T, origin='lower', cmap='RdBu_r', 
                           extent=[0, 300, 0, 300], vmin=-vmax, vmax=vmax)
-            rect = Rectangle((110, 110), 70, 70, linewidth=2, 
-                           edgecolor='black', facecolor='none', linestyle='--')
-            ax.add_patch(rect)
+            if hetero is not None:
+                rect = Rectangle(hetero[:2], *hetero[2:], linewidth=2, 
+                               edgecolor='black', facecolor='none', linestyle='--')
+                ax.add_patch(rect)
             ax.set_xlabel('X (bins)')
             ax.set_ylabel('Y (bins)')
             ax.set_title(title)
             plt.colorbar(im, ax=ax, label='Dosis (Gy)')
         
         plt.tight_layout()
-        output_path = os.path.join(self.base_path, 'fig1_mapas_2d_hetero_vs_diferencia_ir192.png')
+        output_path = self.salida('figura1_hetero_vs_diferencia')
         plt.savefig(output_path, dpi=300, bbox_inches='tight')
         print(f"✓ Guardado: {output_path}")
         plt.close()
@@ -110,6 +197,9 @@ class IR192Analyzer:
         bone = self.load_data('200m_bone_homogeneous.root')
         lung = water * 0.3  # Aproximación
         
+        # Water/Water incluido para que cada columna sea un caso del mismo bloque
+        stack = stack_cases({'water': water, 'lung': lung, 'bone': bone}, water)
+        
         fig = plt.figure(figsize=(16, 12))
         gs = fig.add_gridspec(3, 3, hspace=0.3, wspace=0.3)
         fig.suptitle('Análisis de Casos Homogéneos: Water, Lung Hueco, Bone\n(I125 100M)', 
@@ -119,7 +209,7 @@ class IR192Analyzer:
         titles_row1 = ['Water (1.0 g/cm³)\nedep (MeV)', 
                        'Lung MIRD (0.2958 g/cm³)\nedep (MeV)',
                        'Hueso (1.85 g/cm³)\nedep (MeV)']
-        data_row1 = [water, lung, bone]
+        data_row1 = stack.values
         
         for idx, (title, data) in enumerate(zip(titles_row1, data_row1)):
             ax = fig.add_subplot(gs[0, idx])
@@ -132,14 +222,10 @@ class IR192Analyzer:
             plt.colorbar(im, ax=ax, label='edep (MeV)')
         
         # Fila 2: Diferencias
-        diff_water = water - water
-        diff_lung = lung - water
-        diff_bone = bone - water
-        
         titles_row2 = ['Water (1.0 g/cm³)\nDiferencia: Water_Homo - Water (MeV)',
                        'Lung MIRD (0.2958 g/cm³)\nDiferencia: Lung_Hueco Homo - Water (MeV)',
                        'Hueso (1.85 g/cm³)\nDiferencia: Bone Homo - Water (MeV)']
-        data_row2 = [diff_water, diff_lung, diff_bone]
+        data_row2 = difference(stack)
         
         for idx, (title, data) in enumerate(zip(titles_row2, data_row2)):
             ax = fig.add_subplot(gs[1, idx])
@@ -153,14 +239,10 @@ class IR192Analyzer:
             plt.colorbar(im, ax=ax, label='Dosis (MeV)')
         
         # Fila 3: Ratios
-        ratio_water = np.ones_like(water)
-        ratio_lung = np.divide(lung, water, where=water>0, out=np.ones_like(lung))
-        ratio_bone = np.divide(bone, water, where=water>0, out=np.ones_like(bone))
-        
         titles_row3 = ['Water (1.0 g/cm³)\nRatio: Water_Homo / Water (edim)',
                        'Lung MIRD (0.2958 g/cm³)\nRatio: Lung_Hueco Homo / Water (edim)',
                        'Hueso (1.85 g/cm³)\nRatio: Bone_Homo / Water (edim)']
-        data_row3 = [ratio_water, ratio_lung, ratio_bone]
+        data_row3 = ratio(stack)
         
         for idx, (title, data) in enumerate(zip(titles_row3, data_row3)):
             ax = fig.add_subplot(gs[2, idx])
@@ -173,7 +255,7 @@ class IR192Analyzer:
             plt.colorbar(im, ax=ax, label='Ratio')
         
         plt.tight_layout()
-        output_path = os.path.join(self.base_path, 'fig2_analisis_casos_homogeneos_ir192.png')
+        output_path = self.salida('figura2_casos_homogeneos')
         plt.savefig(output_path, dpi=300, bbox_inches='tight')
         print(f"✓ Guardado: {output_path}")
         plt.close()
@@ -182,38 +264,35 @@ class IR192Analyzer:
         """Análisis de Perfiles Horizontales"""
         print("Generando Figura 3: Perfiles Horizontales...")
         
-        # Cargar datos
-        water_homo = self.load_data('200m_water_homogeneous.root')
-        bone_hetero = self.load_data('200m_heterogeneous_bone.root')
-        
-        # Interpolar
-        from scipy.ndimage import zoom
-        zoom_factor = bone_hetero.shape[0] / water_homo.shape[0]
-        water_homo_interp = zoom(water_homo, zoom_factor, order=1)
+        # Cargar datos alineados en la misma rejilla (sin interpolar)
+        (water_homo_aligned, bone_hetero), edges = self.load_aligned(
+            '200m_water_homogeneous.root', '200m_heterogeneous_bone.root')
         
         # Simular diferentes materiales
         lung_icrp = bone_hetero * 0.55
         lung_mird = bone_hetero * 0.15
         
-        # Obtener perfil horizontal en el centro
-        center = bone_hetero.shape[0] // 2
-        x_coords = np.arange(bone_hetero.shape[1])
+        # Perfil a lo largo de X (eje 0 de los mapas) por el centro del cubo,
+        # como en analisis_real_ir192; si el cubo cae fuera de la malla, por la
+        # fila de la fuente
+        center = bone_hetero.shape[0] // 2  # bin X de la fuente
+        hetero = self.heterogeneity_bins(edges)
+        row = hetero[1] + hetero[3] // 2 if hetero is not None else bone_hetero.shape[1] // 2
+        x_coords = np.arange(bone_hetero.shape[0])
         
-        water_profile = water_homo_interp[center, :]
-        lung_icrp_profile = lung_icrp[center, :]
-        lung_mird_profile = lung_mird[center, :]
-        bone_profile = bone_hetero[center, :]
+        water_profile = water_homo_aligned[:, row]
+        lung_icrp_profile = lung_icrp[:, row]
+        lung_mird_profile = lung_mird[:, row]
+        bone_profile = bone_hetero[:, row]
         
-        # Calcular ratios
-        ratio_lung_icrp = np.divide(lung_icrp_profile, water_profile, 
-                                     where=water_profile>0, out=np.ones_like(lung_icrp_profile))
-        ratio_lung_mird = np.divide(lung_mird_profile, water_profile, 
-                                     where=water_profile>0, out=np.ones_like(lung_mird_profile))
-        ratio_bone = np.divide(bone_profile, water_profile, 
-                               where=water_profile>0, out=np.ones_like(bone_profile))
+        # Calcular ratios (todos los perfiles en una operación)
+        ratio_lung_icrp, ratio_lung_mird, ratio_bone = ratio(stack_cases(
+            {'lung_icrp': lung_icrp_profile, 'lung_mird': lung_mird_profile, 'bone': bone_profile},
+            water_profile))
         
         fig, axes = plt.subplots(2, 2, figsize=(14, 10))
-        fig.suptitle('Análisis de Perfiles Horizontales - I125 100M (Y=0, rango -15 a +120 mm)', 
+        y_mm = 0.5 * (edges[1][row] + edges[1][row + 1])
+        fig.suptitle(f'Análisis de Perfiles Horizontales - I125 100M (Y={y_mm:g} mm)', 
                      fontsize=14, fontweight='bold')
         
         # Plot 1: Perfiles de dosis
@@ -223,9 +302,9 @@ class IR192Analyzer:
         ax1.semilogy(x_coords, lung_mird_profile, 'green', label='Lung_Hueco_Hetero', linewidth=2)
         ax1.semilogy(x_coords, bone_profile, 'red', label='Bone_Hetero', linewidth=2)
         ax1.axvline(x=center, color='red', linestyle='--', alpha=0.5, label='Fuente')
-        ax1.set_xlabel('X (mm)')
+        ax1.set_xlabel('X (bins)')
         ax1.set_ylabel('Dosis (Gy)')
-        ax1.set_title('Perfiles Horizontales de Dosis (Y=0)')
+        ax1.set_title(f'Perfiles Horizontales de Dosis (Y={y_mm:g} mm)')
         ax1.legend()
         ax1.grid(True, alpha=0.3)
         
@@ -234,7 +313,7 @@ class IR192Analyzer:
         ax2.plot(x_coords, ratio_lung_icrp, 'b.', markersize=2)
         ax2.axhline(y=1.0, color='black', linestyle='-', linewidth=2)
         ax2.axvline(x=center, color='red', linestyle='--', alpha=0.5)
-        ax2.set_xlabel('X (mm)')
+        ax2.set_xlabel('X (bins)')
         ax2.set_ylabel('Ratio (Hetero/Ref)')
         ax2.set_title('Ratio: Lung ICRP Hetero / Water Homo')
         ax2.grid(True, alpha=0.3)
@@ -245,7 +324,7 @@ class IR192Analyzer:
         ax3.plot(x_coords, ratio_lung_mird, 'orange', linewidth=2)
         ax3.axhline(y=1.0, color='black', linestyle='-', linewidth=2)
         ax3.axvline(x=center, color='red', linestyle='--', alpha=0.5)
-        ax3.set_xlabel('X (mm)')
+        ax3.set_xlabel('X (bins)')
         ax3.set_ylabel('Ratio (Hetero/Ref)')
         ax3.set_title('Ratio: Lung Hueco Hetero / Water Homo')
         ax3.grid(True, alpha=0.3)
@@ -255,13 +334,13 @@ class IR192Analyzer:
         ax4.plot(x_coords, ratio_bone, 'green', linewidth=2)
         ax4.axhline(y=1.0, color='black', linestyle='-', linewidth=2)
         ax4.axvline(x=center, color='red', linestyle='--', alpha=0.5)
-        ax4.set_xlabel('X (mm)')
+        ax4.set_xlabel('X (bins)')
         ax4.set_ylabel('Ratio (Hetero/Ref)')
         ax4.set_title('Ratio: Bone Hetero / Water Homo')
         ax4.grid(True, alpha=0.3)
         
         plt.tight_layout()
-        output_path = os.path.join(self.base_path, 'fig3_perfiles_horizontales_ir192.png')
+        output_path = self.salida('figura3_perfiles_horizontales')
         plt.savefig(output_path, dpi=300, bbox_inches='tight')
         print(f"✓ Guardado: {output_path}")
         plt.close()
@@ -273,19 +352,19 @@ class IR192Analyzer:
         try:
             # Intentar cargar datos primaria/secundaria
             # Los archivos usan histogramas diferentes
-            water = self.load_data('200m_water_homogeneous.root')
-            bone = self.load_data('200m_bone_homogeneous.root')
+            water = self.load_pyramid('200m_water_homogeneous.root')
+            bone = self.load_pyramid('200m_bone_homogeneous.root')
             
-            # Simular separación primaria/secundaria
+            # Simular separación primaria/secundaria como (mapa, factor)
             # (ajustar según tus datos reales si tienes los histogramas específicos)
-            primary_water = water * 0.998
-            secondary_water = water * 0.002
+            primary_water = (water, 0.998)
+            secondary_water = (water, 0.002)
             
-            primary_bone = bone * 0.995
-            secondary_bone = bone * 0.005
+            primary_bone = (bone, 0.995)
+            secondary_bone = (bone, 0.005)
             
-            primary_lung = water * 0.3 * 0.997
-            secondary_lung = water * 0.3 * 0.003
+            primary_lung = (water, 0.3 * 0.997)
+            secondary_lung = (water, 0.3 * 0.003)
             
             fig = plt.figure(figsize=(16, 10), facecolor='white')
             gs = fig.add_gridspec(2, 3, hspace=0.3, wspace=0.3)
@@ -298,16 +377,16 @@ class IR192Analyzer:
             titles_primary = ['Pulmón MIRD\n(0.2958 g/cm³)', 'Hueso\n(1.85 g/cm³)', 'Agua\n(1.0 g/cm³)']
             data_primary = [primary_lung, primary_bone, primary_water]
             
-            for idx, (title, data) in enumerate(zip(titles_primary, data_primary)):
+            for idx, (title, (data, scale)) in enumerate(zip(titles_primary, data_primary)):
                 ax = fig.add_subplot(gs[0, idx], projection='3d')
-                self.plot_3d_surface(ax, data, title, color='Reds', zlim_factor=3)
+                self.plot_3d_surface(ax, data, title, color='Reds', zlim_factor=3, scale=scale)
             
             # Fila 2: Dosis secundaria
             data_secondary = [secondary_lung, secondary_bone, secondary_water]
             
-            for idx, (title, data) in enumerate(zip(titles_primary, data_secondary)):
+            for idx, (title, (data, scale)) in enumerate(zip(titles_primary, data_secondary)):
                 ax = fig.add_subplot(gs[1, idx], projection='3d')
-                self.plot_3d_surface(ax, data, title, color='Blues', zlim_factor=4000, dark=True)
+                self.plot_3d_surface(ax, data, title, color='Blues', zlim_factor=4000, dark=True, scale=scale)
             
             # Texto con estadísticas
             stats_text = """Lung MIRD (0.2958 g/cm³):
@@ -327,26 +406,27 @@ Water (1.0 g/cm³):
                     bbox=dict(boxstyle='round', facecolor='black', alpha=0.8, edgecolor='white'),
                     color='white')
             
-            output_path = os.path.join(self.base_path, 'fig4_dosis_primaria_secundaria_ir192.png')
+            output_path = self.salida('figura4_primaria_secundaria')
             plt.savefig(output_path, dpi=300, bbox_inches='tight', facecolor='white')
             print(f"✓ Guardado: {output_path}")
             plt.close()
             
         except Exception as e:
+            # Llamada directa: aviso y se sigue; _render_figure detecta que no se escribió el PNG
             print(f"! Error en figura 4: {e}")
     
-    def plot_3d_surface(self, ax, data, title, color='Reds', zlim_factor=3, dark=False):
-        """Grafica superficie 3D"""
-        # Reducir resolución para visualización
-        step = max(1, data.shape[0] // 100)
-        data_reduced = data[::step, ::step]
+    def plot_3d_surface(self, ax, data, title, color='Reds', zlim_factor=3, dark=False, scale=1.0):
+        """Grafica superficie 3D (data: mapa o pirámide)"""
+        # Reducir resolución al tamaño del panel (medias por bloques, sin aliasing)
+        data_reduced = surface_level(data, surface_points(ax)) * scale
         
         x = np.arange(data_reduced.shape[1])
         y = np.arange(data_reduced.shape[0])
         X, Y = np.meshgrid(x, y)
         
-        # Graficar
-        ax.plot_surface(X, Y, data_reduced, cmap=color, alpha=0.8, edgecolor='none')
+        # Graficar (rcount/ccount = tamaño del nivel: sin submuestreo adicional)
+        ax.plot_surface(X, Y, data_reduced, cmap=color, alpha=0.8, edgecolor='none',
+                        rcount=data_reduced.shape[0], ccount=data_reduced.shape[1])
         ax.set_zlim(0, data_reduced.max() * zlim_factor)
         
         ax.set_xlabel('X (x3)')
@@ -361,17 +441,31 @@ Water (1.0 g/cm³):
             ax.xaxis.label.set_color('white')
             ax.yaxis.label.set_color('white')
     
-    def generar_todas_las_figuras(self):
-        """Genera todas las figuras"""
+    def generar_todas_las_figuras(self, max_workers=None, force=False):
+        """Genera las figuras desactualizadas (una por proceso, con los mapas cargados una vez)"""
         print("=" * 60)
         print("  ANÁLISIS COMPLETO PARA Ir-192")
         print("=" * 60)
         print()
         
-        self.figura1_hetero_vs_diferencia()
-        self.figura2_casos_homogeneos()
-        self.figura3_perfiles_horizontales()
-        self.figura4_primaria_secundaria()
+        graph = self.grafo()
+        keys = graph.keys()
+        pendientes = graph.stale(force)
+        for figure in self.FIGURAS:
+            if figure not in pendientes:
+                print(f"  ✓ {figure}: al día (sin cambios)")
+        if pendientes:
+            start = time.perf_counter()
+            with SharedMaps(self.cargar_mapas()) as shared:
+                print(f"Mapas cargados una vez: {len(shared.specs)} arrays en {time.perf_counter() - start:.1f} s")
+                tasks = {figure: graph.tasks[figure].func for figure in pendientes}
+                start = time.perf_counter()
+                timings, errors = render_figures(tasks, shared, max_workers)
+            print_timings(timings, errors, time.perf_counter() - start)
+            # Solo las que terminaron: las fallidas (o sin PNG) se repiten la próxima vez
+            for figure in timings:
+                graph.record(figure, keys[figure])
+            graph.save()
         
         print()
         print("=" * 60)
@@ -380,6 +474,19 @@ Water (1.0 g/cm³):
         print("=" * 60)
 
 
+def _render_figure(base_path, figure, maps):
+    """Tarea de figure_pool: dibuja una figura con los mapas compartidos.
+
+    Falla si la figura no reescribió su PNG (figura4 solo avisa de sus
+    errores): así no se da por terminada ni se marca al día en el grafo."""
+    analyzer = IR192Analyzer(base_path, maps)
+    output = analyzer.salida(figure)
+    before = os.stat(output).st_mtime_ns if os.path.exists(output) else None
+    getattr(analyzer, figure)()
+    if not os.path.exists(output) or os.stat(output).st_mtime_ns == before:
+        raise RuntimeError(f"no se generó {output}")
+
+
 if __name__ == "__main__":
     analyzer = IR192Analyzer()
-    analyzer.generar_todas_las_figuras()
+    analyzer.generar_todas_las_figuras(force='--force' in sys.argv[1:])
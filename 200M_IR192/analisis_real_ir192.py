@@ -3,46 +3,136 @@
 Análisis para Ir-192 usando SOLO datos de agua y hueso
 """
 
-import uproot
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.colors import LogNorm
 from matplotlib.patches import Rectangle
-from scipy.ndimage import zoom
 import os
+import sys
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from case_stack import difference, ratio, stack_cases  # noqa: E402
+from dose_loader import SIDECAR_DIR, load_histogram, load_values  # noqa: E402
+from dose_pyramid import load_pyramid, surface_level, surface_points  # noqa: E402
+from figure_pool import SharedMaps, aligned_key, map_key, print_timings, render_figures  # noqa: E402
+from grid_align import align_maps  # noqa: E402
+from mesh_index import mesh_index  # noqa: E402
+from task_graph import TaskGraph, state_path  # noqa: E402
 
 plt.rcParams['font.size'] = 10
 plt.rcParams['figure.dpi'] = 150
 
+# Cubo de heterogeneidad de las macros (/phantom/heterogeneity/position y size)
+HETERO_CENTER_MM = (40.0, 0.0)
+HETERO_SIZE_MM = (60.0, 60.0)
+
 class IR192Analyzer:
     """Analizador para datos reales de Ir-192"""
+
+    # Mapas que usan las figuras: generar_todo los carga una sola vez y los
+    # comparte con los procesos que dibujan
+    MAPAS = ('200m_water_homogeneous.root', '200m_bone_homogeneous.root')
+    MAPAS_ALINEADOS = (
+        ('200m_water_homogeneous.root', '200m_heterogeneous_bone.root'),
+        ('200m_water_homogeneous.root', '200m_heterogeneous_bone.root',
+         '200m_bone_homogeneous.root'),
+    )
+    # Figura -> (salida, ROOT que lee); generar_todo solo redibuja las que hayan
+    # cambiado (task_graph: hash de las entradas y del script)
+    FIGURAS = {
+        'figura1_mapas_hetero_vs_diferencia': (
+            'fig1_mapas_2d_ir192.png',
+            ('200m_water_homogeneous.root', '200m_heterogeneous_bone.root'),
+        ),
+        'figura2_casos_homogeneos': (
+            'fig2_analisis_homogeneos_ir192.png',
+            ('200m_water_homogeneous.root', '200m_bone_homogeneous.root'),
+        ),
+        'figura3_perfiles_horizontales': (
+            'fig3_perfiles_horizontales_ir192.png',
+            ('200m_water_homogeneous.root', '200m_heterogeneous_bone.root',
+             '200m_bone_homogeneous.root'),
+        ),
+        'figura4_primaria_secundaria': (
+            'fig4_primaria_secundaria_ir192.png',
+            ('200m_water_homogeneous.root', '200m_bone_homogeneous.root'),
+        ),
+    }
     
-    def __init__(self, base_path="/home/fer/fer/newbrachy/200M_IR192"):
+    def __init__(self, base_path="/home/fer/fer/newbrachy/200M_IR192", maps=None):
         self.base_path = base_path
+        # Mapas precargados (claves de figure_pool); vacío = leer de disco
+        self.maps = maps if maps is not None else {}
         
     def load_data(self, filename, hist_name='h20'):
         """Carga datos de un archivo ROOT"""
+        key = map_key(filename, hist_name)
+        if key in self.maps:
+            return self.maps[key]
         filepath = os.path.join(self.base_path, filename)
-        with uproot.open(filepath) as file:
-            if hist_name not in file:
-                hist_name = 'h10'
-            hist = file[hist_name]
-            return hist.values()
+        # Lectura compartida y cacheada (fallback h20 -> h10 incluido)
+        return load_values(filepath, hist_name)
+    
+    def load_aligned(self, *filenames, hist_name='h20'):
+        """Carga varios mapas y los lleva a su rejilla común (recorte o rebin exacto, sin interpolar)"""
+        key = aligned_key(filenames, hist_name)
+        if key in self.maps:
+            return list(self.maps[key]), [self.maps[key + ':x'], self.maps[key + ':y']]
+        hists = [load_histogram(os.path.join(self.base_path, filename), hist_name)
+                 for filename in filenames]
+        return align_maps([(hist.values, hist.edges) for hist in hists])
+    
+    def load_pyramid(self, filename, hist_name='h20'):
+        """Pirámide de medias del mapa (cacheada en .npycache junto al ROOT)"""
+        return load_pyramid(os.path.join(self.base_path, filename), hist_name)
+    
+    def cargar_mapas(self):
+        """Carga una vez todos los mapas de MAPAS y MAPAS_ALINEADOS (claves de figure_pool)"""
+        maps = {map_key(filename, 'h20'): self.load_data(filename) for filename in self.MAPAS}
+        for filenames in self.MAPAS_ALINEADOS:
+            aligned, edges = self.load_aligned(*filenames)
+            key = aligned_key(filenames, 'h20')
+            maps[key] = np.stack(aligned)
+            maps[key + ':x'], maps[key + ':y'] = edges
+        # Las pirámides quedan en disco: los workers solo mapean el nivel que dibujan
+        for filename in self.MAPAS:
+            self.load_pyramid(filename)
+        return maps
+    
+    def salida(self, figure):
+        """Ruta del PNG de una figura de FIGURAS"""
+        return os.path.join(self.base_path, self.FIGURAS[figure][0])
+    
+    def grafo(self):
+        """Grafo de tareas con una tarea por figura (entradas: sus ROOT; salida: su PNG)"""
+        graph = TaskGraph(state_path(self.base_path, __file__))
+        for figure, (_, entradas) in self.FIGURAS.items():
+            graph.add(figure, partial(_render_figure, self.base_path, figure),
+                      inputs=[os.path.join(self.base_path, filename) for filename in entradas],
+                      outputs=[self.salida(figure)])
+        return graph
+    
+    def heterogeneity_bins(self, edges):
+        """(x0, y0, ancho, alto) en bins de la heterogeneidad para unos bordes dados"""
+        index = mesh_index(edges[0], edges[1], hetero_center_mm=HETERO_CENTER_MM,
+                           hetero_size_mm=HETERO_SIZE_MM,
+                           cache_dir=os.path.join(self.base_path, SIDECAR_DIR))
+        return index.heterogeneity_bins()
     
     def figura1_mapas_hetero_vs_diferencia(self):
         """Mapas 2D: Heterogéneo (Hueso) vs Homogéneo (Agua) y Diferencia"""
         print("Generando Figura 1: Mapas 2D Heterogéneo vs Diferencia...")
         
-        # Cargar datos REALES
-        water_homo = self.load_data('200m_water_homogeneous.root')
-        bone_hetero = self.load_data('200m_heterogeneous_bone.root')
-        
-        # Interpolar water al tamaño de bone_hetero
-        zoom_factor = bone_hetero.shape[0] / water_homo.shape[0]
-        water_interp = zoom(water_homo, zoom_factor, order=1)
+        # Cargar datos REALES alineados en la misma rejilla (sin interpolar)
+        (water_aligned, bone_hetero), edges = self.load_aligned(
+            '200m_water_homogeneous.root', '200m_heterogeneous_bone.root')
         
         # Calcular diferencia
-        diff = bone_hetero - water_interp
+        diff = bone_hetero - water_aligned
+        # None si el cubo cae fuera de la malla: se dibujan los mapas sin rectángulo
+        hetero = self.heterogeneity_bins(edges)
         
         # Crear figura
         fig, axes = plt.subplots(1, 3, figsize=(18, 6))
@@ -50,11 +140,11 @@ class IR192Analyzer:
                      fontsize=14, fontweight='bold')
         
         # 1. Agua Homogénea
-        data_water = np.where(water_interp > 0, water_interp, 1e-10)
+        data_water = np.where(water_aligned > 0, water_aligned, 1e-10)
         im1 = axes[0].imshow(data_water.T, origin='lower', cmap='jet', 
                             norm=LogNorm(vmin=data_water[data_water>0].min(), 
                                        vmax=data_water.max()),
-                            extent=[0, water_interp.shape[0], 0, water_interp.shape[1]])
+                            extent=[0, water_aligned.shape[0], 0, water_aligned.shape[1]])
         axes[0].set_xlabel('X (bins)')
         axes[0].set_ylabel('Y (bins)')
         axes[0].set_title('Agua Homogénea (1.0 g/cm³)\nDosis (Gy)')
@@ -67,9 +157,10 @@ class IR192Analyzer:
                                        vmax=data_bone.max()),
                             extent=[0, bone_hetero.shape[0], 0, bone_hetero.shape[1]])
         # Añadir rectángulo para región heterogénea
-        rect = Rectangle((110, 110), 70, 70, linewidth=2, 
-                       edgecolor='white', facecolor='none', linestyle='--')
-        axes[1].add_patch(rect)
+        if hetero is not None:
+            rect = Rectangle(hetero[:2], *hetero[2:], linewidth=2, 
+                           edgecolor='white', facecolor='none', linestyle='--')
+            axes[1].add_patch(rect)
         axes[1].set_xlabel('X (bins)')
         axes[1].set_ylabel('Y (bins)')
         axes[1].set_title('Hueso Heterogéneo (1.85 g/cm³)\nDosis (Gy)')
@@ -80,16 +171,17 @@ class IR192Analyzer:
         im3 = axes[2].imshow(diff.T, origin='lower', cmap='RdBu_r', 
                             extent=[0, diff.shape[0], 0, diff.shape[1]], 
                             vmin=-vmax, vmax=vmax)
-        rect2 = Rectangle((110, 110), 70, 70, linewidth=2, 
-                         edgecolor='black', facecolor='none', linestyle='--')
-        axes[2].add_patch(rect2)
+        if hetero is not None:
+            rect2 = Rectangle(hetero[:2], *hetero[2:], linewidth=2, 
+                             edgecolor='black', facecolor='none', linestyle='--')
+            axes[2].add_patch(rect2)
         axes[2].set_xlabel('X (bins)')
         axes[2].set_ylabel('Y (bins)')
         axes[2].set_title('Diferencia: Hueso Hetero - Agua Homo (Gy)')
         plt.colorbar(im3, ax=axes[2], label='Dosis (Gy)')
         
         plt.tight_layout()
-        output = os.path.join(self.base_path, 'fig1_mapas_2d_ir192.png')
+        output = self.salida('figura1_mapas_hetero_vs_diferencia')
         plt.savefig(output, dpi=300, bbox_inches='tight')
         print(f"✓ Guardado: {output}")
         plt.close()
@@ -102,6 +194,11 @@ class IR192Analyzer:
         water = self.load_data('200m_water_homogeneous.root')
         bone = self.load_data('200m_bone_homogeneous.root')
         
+        # Diferencias y ratios respecto al agua de todos los casos a la vez
+        stack = stack_cases({'bone': bone}, water)
+        diffs = difference(stack)
+        ratios = ratio(stack)
+        
         fig, axes = plt.subplots(3, 2, figsize=(12, 15))
         fig.suptitle('Análisis de Casos Homogéneos: Agua vs Hueso (Ir-192)', 
                      fontsize=14, fontweight='bold')
@@ -137,7 +234,7 @@ class IR192Analyzer:
         plt.colorbar(im3, ax=axes[1, 0], label='Dosis (MeV)')
         
         # Hueso - Agua
-        diff_bone = bone - water
+        diff_bone = diffs[stack.names.index('bone')]
         vmax_diff = np.abs(diff_bone).max()
         im4 = axes[1, 1].imshow(diff_bone.T, origin='lower', cmap='RdBu_r',
                                extent=[0, bone.shape[0], 0, bone.shape[1]],
@@ -159,7 +256,7 @@ class IR192Analyzer:
         plt.colorbar(im5, ax=axes[2, 0], label='Ratio')
         
         # Hueso / Agua
-        ratio_bone = np.divide(bone, water, where=water>0, out=np.ones_like(bone))
+        ratio_bone = ratios[stack.names.index('bone')]
         im6 = axes[2, 1].imshow(ratio_bone.T, origin='lower', cmap='jet',
                                extent=[0, bone.shape[0], 0, bone.shape[1]],
                                vmin=0.5, vmax=1.5)
@@ -169,7 +266,7 @@ class IR192Analyzer:
         plt.colorbar(im6, ax=axes[2, 1], label='Ratio')
         
         plt.tight_layout()
-        output = os.path.join(self.base_path, 'fig2_analisis_homogeneos_ir192.png')
+        output = self.salida('figura2_casos_homogeneos')
         plt.savefig(output, dpi=300, bbox_inches='tight')
         print(f"✓ Guardado: {output}")
         plt.close()
@@ -178,32 +275,34 @@ class IR192Analyzer:
         """Análisis de Perfiles Horizontales"""
         print("Generando Figura 3: Perfiles Horizontales...")
         
-        # Cargar datos REALES
-        water_homo = self.load_data('200m_water_homogeneous.root')
-        bone_hetero = self.load_data('200m_heterogeneous_bone.root')
-        bone_homo = self.load_data('200m_bone_homogeneous.root')
-        
-        # Interpolar al mismo tamaño
-        zoom_factor = bone_hetero.shape[0] / water_homo.shape[0]
-        water_interp = zoom(water_homo, zoom_factor, order=1)
-        bone_homo_interp = zoom(bone_homo, zoom_factor, order=1)
-        
-        # Obtener perfil horizontal en el centro
-        center = bone_hetero.shape[0] // 2
-        x_coords = np.arange(bone_hetero.shape[1])
-        
-        water_profile = water_interp[center, :]
-        bone_homo_profile = bone_homo_interp[center, :]
-        bone_hetero_profile = bone_hetero[center, :]
-        
-        # Calcular ratios
-        ratio_bone_homo = np.divide(bone_homo_profile, water_profile, 
-                                     where=water_profile>0, out=np.ones_like(bone_homo_profile))
-        ratio_bone_hetero = np.divide(bone_hetero_profile, water_profile, 
-                                       where=water_profile>0, out=np.ones_like(bone_hetero_profile))
+        # Cargar datos REALES alineados en la misma rejilla (sin interpolar)
+        (water_aligned, bone_hetero, bone_homo_aligned), edges = self.load_aligned(
+            '200m_water_homogeneous.root', '200m_heterogeneous_bone.root',
+            '200m_bone_homogeneous.root')
+        
+        # Perfil a lo largo de X por el centro del cubo, para que lo atraviese
+        # (el eje 0 de los mapas es X); la franja hx..hx+hw está en ese mismo eje.
+        # Si el cubo cae fuera de la malla, perfil por la fila de la fuente
+        center = bone_hetero.shape[0] // 2  # bin X de la fuente
+        hetero = self.heterogeneity_bins(edges)
+        if hetero is not None:
+            hx, hy, hw, hh = hetero
+            row = hy + hh // 2
+        else:
+            row = bone_hetero.shape[1] // 2
+        x_coords = np.arange(bone_hetero.shape[0])
+        
+        water_profile = water_aligned[:, row]
+        bone_homo_profile = bone_homo_aligned[:, row]
+        bone_hetero_profile = bone_hetero[:, row]
+        
+        # Calcular ratios (todos los perfiles en una operación)
+        ratio_bone_homo, ratio_bone_hetero = ratio(stack_cases(
+            {'bone_homo': bone_homo_profile, 'bone_hetero': bone_hetero_profile}, water_profile))
         
         fig, axes = plt.subplots(2, 2, figsize=(14, 10))
-        fig.suptitle('Análisis de Perfiles Horizontales - Ir-192 (Y=0)', 
+        y_mm = 0.5 * (edges[1][row] + edges[1][row + 1])
+        fig.suptitle(f'Análisis de Perfiles Horizontales - Ir-192 (Y={y_mm:g} mm)', 
                      fontsize=14, fontweight='bold')
         
         # Plot 1: Perfiles de dosis
@@ -212,10 +311,11 @@ class IR192Analyzer:
         ax1.semilogy(x_coords, bone_homo_profile, 'g-', label='Hueso Homo', linewidth=2)
         ax1.semilogy(x_coords, bone_hetero_profile, 'r-', label='Hueso Hetero', linewidth=2)
         ax1.axvline(x=center, color='red', linestyle='--', alpha=0.5, label='Fuente')
-        ax1.axvspan(110, 180, alpha=0.1, color='yellow', label='Heterogeneidad')
+        if hetero is not None:
+            ax1.axvspan(hx, hx + hw, alpha=0.1, color='yellow', label='Heterogeneidad')
         ax1.set_xlabel('X (bins)')
         ax1.set_ylabel('Dosis (Gy)')
-        ax1.set_title('Perfiles Horizontales de Dosis (Y=0)')
+        ax1.set_title(f'Perfiles Horizontales de Dosis (Y={y_mm:g} mm)')
         ax1.legend()
         ax1.grid(True, alpha=0.3)
         
@@ -224,7 +324,8 @@ class IR192Analyzer:
         ax2.plot(x_coords, ratio_bone_homo, 'g-', linewidth=2)
         ax2.axhline(y=1.0, color='black', linestyle='-', linewidth=2, label='Referencia')
         ax2.axvline(x=center, color='red', linestyle='--', alpha=0.5)
-        ax2.axvspan(110, 180, alpha=0.1, color='yellow')
+        if hetero is not None:
+            ax2.axvspan(hx, hx + hw, alpha=0.1, color='yellow')
         ax2.set_xlabel('X (bins)')
         ax2.set_ylabel('Ratio (Hetero/Ref)')
         ax2.set_title('Ratio: Hueso Homo / Agua Homo')
@@ -237,10 +338,10 @@ class IR192Analyzer:
         ax3.plot(x_coords, ratio_bone_hetero, 'r-', linewidth=2)
         ax3.axhline(y=1.0, color='black', linestyle='-', linewidth=2, label='Referencia')
         ax3.axvline(x=center, color='red', linestyle='--', alpha=0.5)
-        ax3.axvspan(110, 180, alpha=0.1, color='yellow')
-        # Marcar punto de discontinuidad
-        if 110 < len(ratio_bone_hetero):
-            ax3.plot(110, ratio_bone_hetero[110], 'bs', markersize=8, label='Discontinuidad')
+        if hetero is not None:
+            ax3.axvspan(hx, hx + hw, alpha=0.1, color='yellow')
+            # Marcar punto de discontinuidad
+            ax3.plot(hx, ratio_bone_hetero[hx], 'bs', markersize=8, label='Discontinuidad')
         ax3.set_xlabel('X (bins)')
         ax3.set_ylabel('Ratio (Hetero/Ref)')
         ax3.set_title('Ratio: Hueso Hetero / Agua Homo')
@@ -253,7 +354,8 @@ class IR192Analyzer:
         ax4.plot(x_coords, ratio_bone_hetero, 'r-', linewidth=2, label='Hueso Hetero / Agua')
         ax4.axhline(y=1.0, color='black', linestyle='-', linewidth=2)
         ax4.axvline(x=center, color='red', linestyle='--', alpha=0.5)
-        ax4.axvspan(110, 180, alpha=0.1, color='yellow')
+        if hetero is not None:
+            ax4.axvspan(hx, hx + hw, alpha=0.1, color='yellow')
         ax4.set_xlabel('X (bins)')
         ax4.set_ylabel('Ratio')
         ax4.set_title('Comparación de Ratios')
@@ -261,7 +363,7 @@ class IR192Analyzer:
         ax4.grid(True, alpha=0.3)
         
         plt.tight_layout()
-        output = os.path.join(self.base_path, 'fig3_perfiles_horizontales_ir192.png')
+        output = self.salida('figura3_perfiles_horizontales')
         plt.savefig(output, dpi=300, bbox_inches='tight')
         print(f"✓ Guardado: {output}")
         plt.close()
@@ -272,8 +374,8 @@ class IR192Analyzer:
         
         try:
             # Intentar cargar datos de primaria/secundaria si existen
-            water = self.load_data('200m_water_homogeneous.root')
-            bone = self.load_data('200m_bone_homogeneous.root')
+            water = self.load_pyramid('200m_water_homogeneous.root')
+            bone = self.load_pyramid('200m_bone_homogeneous.root')
             
             # Para datos reales, necesitarías cargar los histogramas específicos
             # dose_map_primary y dose_map_secondary
@@ -293,14 +395,11 @@ class IR192Analyzer:
             self.plot_3d(ax2, bone, 'Hueso (1.85 g/cm³)\nDosis Primaria', 'Reds')
             
             # Fila 2: Dosis secundaria (simulada como pequeño porcentaje)
-            secondary_water = water * 0.002
-            secondary_bone = bone * 0.005
-            
             ax3 = fig.add_subplot(gs[1, 0], projection='3d')
-            self.plot_3d(ax3, secondary_water, 'Agua (1.0 g/cm³)\nDosis Secundaria', 'Blues', dark=True)
+            self.plot_3d(ax3, water, 'Agua (1.0 g/cm³)\nDosis Secundaria', 'Blues', dark=True, scale=0.002)
             
             ax4 = fig.add_subplot(gs[1, 1], projection='3d')
-            self.plot_3d(ax4, secondary_bone, 'Hueso (1.85 g/cm³)\nDosis Secundaria', 'Blues', dark=True)
+            self.plot_3d(ax4, bone, 'Hueso (1.85 g/cm³)\nDosis Secundaria', 'Blues', dark=True, scale=0.005)
             
             # Añadir estadísticas aproximadas
             stats_text = """Agua (1.0 g/cm³):
@@ -318,25 +417,27 @@ Nota: Valores aproximados"""
                     bbox=dict(boxstyle='round', facecolor='lightgray', alpha=0.8),
                     color='black')
             
-            output = os.path.join(self.base_path, 'fig4_primaria_secundaria_ir192.png')
+            output = self.salida('figura4_primaria_secundaria')
             plt.savefig(output, dpi=300, bbox_inches='tight')
             print(f"✓ Guardado: {output}")
             plt.close()
             
         except Exception as e:
+            # Llamada directa: aviso y se sigue; _render_figure detecta que no se escribió el PNG
             print(f"! Nota: No se pudo generar la figura 4 ({e})")
     
-    def plot_3d(self, ax, data, title, colormap, dark=False):
-        """Grafica superficie 3D"""
-        step = max(1, data.shape[0] // 50)
-        data_reduced = data[::step, ::step]
+    def plot_3d(self, ax, data, title, colormap, dark=False, scale=1.0):
+        """Grafica superficie 3D (data: mapa o pirámide, reducido al tamaño del panel)"""
+        data_reduced = surface_level(data, surface_points(ax)) * scale
         
         x = np.arange(data_reduced.shape[1])
         y = np.arange(data_reduced.shape[0])
         X, Y = np.meshgrid(x, y)
         
         zlim = data_reduced.max() * (3000 if dark else 3)
-        ax.plot_surface(X, Y, data_reduced, cmap=colormap, alpha=0.8, edgecolor='none')
+        # rcount/ccount = tamaño del nivel: matplotlib no vuelve a submuestrear
+        ax.plot_surface(X, Y, data_reduced, cmap=colormap, alpha=0.8, edgecolor='none',
+                        rcount=data_reduced.shape[0], ccount=data_reduced.shape[1])
         ax.set_zlim(0, zlim)
         
         ax.set_xlabel('X')
@@ -351,18 +452,32 @@ Nota: Valores aproximados"""
             ax.xaxis.label.set_color('white')
             ax.yaxis.label.set_color('white')
     
-    def generar_todo(self):
-        """Genera todas las figuras"""
+    def generar_todo(self, max_workers=None, force=False):
+        """Genera las figuras desactualizadas (una por proceso, con los mapas cargados una vez)"""
         print("=" * 60)
         print("  ANÁLISIS COMPLETO PARA Ir-192")
         print("  Solo usando datos REALES: Agua y Hueso")
         print("=" * 60)
         print()
         
-        self.figura1_mapas_hetero_vs_diferencia()
-        self.figura2_casos_homogeneos()
-        self.figura3_perfiles_horizontales()
-        self.figura4_primaria_secundaria()
+        graph = self.grafo()
+        keys = graph.keys()
+        pendientes = graph.stale(force)
+        for figure in self.FIGURAS:
+            if figure not in pendientes:
+                print(f"  ✓ {figure}: al día (sin cambios)")
+        if pendientes:
+            start = time.perf_counter()
+            with SharedMaps(self.cargar_mapas()) as shared:
+                print(f"Mapas cargados una vez: {len(shared.specs)} arrays en {time.perf_counter() - start:.1f} s")
+                tasks = {figure: graph.tasks[figure].func for figure in pendientes}
+                start = time.perf_counter()
+                timings, errors = render_figures(tasks, shared, max_workers)
+            print_timings(timings, errors, time.perf_counter() - start)
+            # Solo las que terminaron: las fallidas (o sin PNG) se repiten la próxima vez
+            for figure in timings:
+                graph.record(figure, keys[figure])
+            graph.save()
         
         print()
         print("=" * 60)
@@ -371,6 +486,19 @@ Nota: Valores aproximados"""
         print("=" * 60)
 
 
+def _render_figure(base_path, figure, maps):
+    """Tarea de figure_pool: dibuja una figura con los mapas compartidos.
+
+    Falla si la figura no reescribió su PNG (figura4 solo avisa de sus
+    errores): así no se da por terminada ni se marca al día en el grafo."""
+    analyzer = IR192Analyzer(base_path, maps)
+    output = analyzer.salida(figure)
+    before = os.stat(output).st_mtime_ns if os.path.exists(output) else None
+    getattr(analyzer, figure)()
+    if not os.path.exists(output) or os.stat(output).st_mtime_ns == before:
+        raise RuntimeError(f"no se generó {output}")
+
+
 if __name__ == "__main__":
     analyzer = IR192Analyzer()
-    analyzer.generar_todo()
+    analyzer.generar_todo(force='--force' in sys.argv[1:])
@@ -2,12 +2,27 @@
 """
 Análisis de casos homogéneos I-125 100M: Lung MIRD vs Bone vs Water
 Layout 2×3: Dosis | Diferencia | Perfil+Ratio
+
+Figura y estadísticas son tareas de `task_graph` (incrementales por hash de
+contenido, en paralelo); `--force` las rehace aunque estén al día. Ambas leen
+el bloque de casos que deja la tarea "casos" en `.npycache/`, así que cada
+run carga y alinea los ROOT una sola vez.
 """
 
+import os
+import sys
+from functools import partial
+from typing import NamedTuple
+
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import colors
-import uproot
+
+from case_stack import CaseStack, difference, load_stack, profiles, ratio, region_stats
+from dose_loader import SIDECAR_DIR
+from mesh_index import REGION_NAMES, SOURCE_EXCLUSION_MM, MeshIndex, mesh_index
+from provenance import provenance_path
+from task_graph import TaskGraph, capture_table, print_report, print_table, state_path
 
 # Constantes
 MEV_TO_GY = 1.602e-10
@@ -29,20 +44,17 @@ FILE_MAP = {
 }
 
 DATA_DIR = "/home/fer/fer/newbrachy/100M_I125_pri-sec"
+FIGURE_FILE = "homo_analysis_2x3_complete.png"
+TABLE_FILE = "homo_analysis_stats.txt"
+CASES_FILE = "homo_analysis_cases.npz"  # en .npycache/: bloque compartido por figura y tabla
 
+REFERENCE_CASE = "water"
 
-def load_histogram(case_name: str) -> np.ndarray:
-    """Cargar histogram h20 del archivo ROOT"""
-    try:
-        filepath = f"{DATA_DIR}/{FILE_MAP[case_name]}"
-        with uproot.open(filepath) as file:
-            for key_name in file.keys():
-                if "h20" in key_name:
-                    hist = file[key_name].to_numpy()
-                    return hist[0]
-    except Exception as e:
-        print(f"⚠️ Error cargando {case_name}: {e}")
-    return None
+# Una fila de la figura por caso: (clave, etiqueta, color, color de borde)
+COMPARISONS = (
+    ("lung", "Lung MIRD", "orange", "darkorange"),
+    ("bone", "Bone", "red", "darkred"),
+)
 
 
 def edep_to_dose(edep: np.ndarray, density: float) -> np.ndarray:
@@ -52,14 +64,38 @@ def edep_to_dose(edep: np.ndarray, density: float) -> np.ndarray:
     return dose_gy
 
 
-def get_horizontal_profile(dose_map: np.ndarray) -> tuple:
+def load_all_cases(file_map: dict = FILE_MAP, max_workers: int = None) -> tuple:
+    """Cargar y convertir a dosis todos los casos en paralelo, apilados contra el agua.
+
+    Devuelve (CaseStack, errores por caso); un caso fallido no detiene al resto."""
+    paths = {case: f"{DATA_DIR}/{filename}" for case, filename in file_map.items()}
+    return load_stack(
+        paths,
+        REFERENCE_CASE,
+        "h20",
+        convert=lambda case, edep: edep_to_dose(edep, DENSITIES[case]),
+        max_workers=max_workers,
+    )
+
+
+def source_index(edges: tuple) -> MeshIndex:
+    """Índice geométrico del mapa sobre sus bordes reales, cacheado en disco"""
+    return mesh_index(edges[0], edges[1], cache_dir=f"{DATA_DIR}/{SIDECAR_DIR}")
+
+
+def source_strip(index: MeshIndex) -> np.ndarray:
+    """Franja |X| < 2 mm en todo Z que las figuras dejan en blanco alrededor de la fuente"""
+    x_centers = 0.5 * (index.x_edges[:-1] + index.x_edges[1:])
+    return np.broadcast_to((np.abs(x_centers) < SOURCE_EXCLUSION_MM)[:, None], index.shape)
+
+
+def get_horizontal_profile(dose_map: np.ndarray, strip: np.ndarray) -> tuple:
     """Extraer perfil horizontal en Y=0 (índice central), eliminando ±2mm de la fuente"""
     center_idx = dose_map.shape[1] // 2
-    center_x_idx = dose_map.shape[0] // 2
     
-    # Eliminar ±2mm alrededor de la fuente (2 bins)
+    # Eliminar ±2mm alrededor de la fuente
     profile = dose_map[:, center_idx].copy()
-    profile[center_x_idx - 2:center_x_idx + 2] = 0  # Marcar como 0 (se ignorará en gráficos)
+    profile[strip[:, center_idx]] = 0  # Marcar como 0 (se ignorará en gráficos)
     
     x_mm = np.linspace(-150, 150, len(profile))
     return x_mm, profile
@@ -67,8 +103,8 @@ def get_horizontal_profile(dose_map: np.ndarray) -> tuple:
 
 def get_profile_3bins(dose_map: np.ndarray) -> tuple:
     """Extraer 3 bins centrados en el origen, fuera de ±2mm"""
-    center_idx = dose_map.shape[1] // 2
-    center_x_idx = dose_map.shape[0] // 2
+    center_idx = dose_map.shape[-1] // 2
+    center_x_idx = dose_map.shape[-2] // 2
     
     # 3 bins en -3, -2, +2, +3 (saltando ±2mm) - tomamos +2, +3, +4
     # Mejor: usar bins en -3, 0, +3 para claridad
@@ -76,241 +112,248 @@ def get_profile_3bins(dose_map: np.ndarray) -> tuple:
     bin_center = center_x_idx
     bin_right = center_x_idx + 3
     
-    profile_3bins = np.array([
-        dose_map[bin_left, center_idx],
-        dose_map[bin_center, center_idx],
-        dose_map[bin_right, center_idx]
-    ])
+    # Con un array apilado (N, nx, ny) devuelve (N, 3)
+    profile_3bins = dose_map[..., [bin_left, bin_center, bin_right], center_idx]
     x_pos = np.array([-3, 0, 3])  # posiciones en bins
     
     return x_pos, profile_3bins
 
 
-def main():
-    print("=" * 80)
-    print("ANÁLISIS DE CASOS HOMOGÉNEOS - I-125 100M")
-    print("=" * 80)
-    print()
-    
-    # Cargar datos
-    print("Cargando datos...")
-    dose_data = {}
-    for case_key in ["water", "lung", "bone"]:
-        edep = load_histogram(case_key)
-        if edep is None:
-            print(f"❌ No se pudo cargar {case_key}")
-            return
-        dose_data[case_key] = edep_to_dose(edep, DENSITIES[case_key])
-        print(f"  {case_key:6s}... ✓ (shape: {dose_data[case_key].shape})")
-    
-    print()
-    
-    # Preparar datos
-    dose_water = dose_data["water"].copy()
-    dose_lung = dose_data["lung"].copy()
-    dose_bone = dose_data["bone"].copy()
-    
-    # Reemplazar ceros para escala log
-    vmin_ref = np.min(dose_water[dose_water > 0]) * 0.1
-    dose_water[dose_water <= 0] = vmin_ref
-    dose_lung[dose_lung <= 0] = vmin_ref
-    dose_bone[dose_bone <= 0] = vmin_ref
-    
-    vmax_water = np.max(dose_water)
-    vmax_lung = np.max(dose_lung)
-    vmax_bone = np.max(dose_bone)
-    
-    # Crear figura 2×3
-    fig, axes = plt.subplots(2, 3, figsize=(18, 10))
+class HomoCases(NamedTuple):
+    """Casos cargados y apilados contra el agua, con ceros sustituidos para la escala log."""
+
+    stack: object
+    errors: dict
+    comparisons: tuple
+    vmin_ref: float
+    index: MeshIndex
+    strip: np.ndarray
+
+
+def input_paths(file_map: dict = FILE_MAP) -> list:
+    """ROOT de cada caso y sus sidecars de procedencia (entradas de las tareas)."""
+    roots = [f"{DATA_DIR}/{filename}" for filename in file_map.values()]
+    return roots + [provenance_path(path) for path in roots]
+
+
+def prepare_cases(max_workers: int = None) -> HomoCases:
+    """Carga todos los casos; RuntimeError si falta el agua o no queda ningún caso que comparar."""
+    try:
+        stack, errors = load_all_cases(max_workers=max_workers)
+    except Exception as e:
+        raise RuntimeError(f"No se pudo cargar {REFERENCE_CASE}: {e}") from e
+    comparisons = tuple(row for row in COMPARISONS if row[0] in stack.names)
+    if not comparisons:
+        raise RuntimeError("Ningún caso para comparar con el agua")
+
+    # Reemplazar ceros para escala log (en el propio bloque apilado)
+    vmin_ref = np.min(stack.reference[stack.reference > 0]) * 0.1
+    stack.reference[stack.reference <= 0] = vmin_ref
+    stack.values[stack.values <= 0] = vmin_ref
+
+    # Índice para las estadísticas por región y franja de ±2mm de la fuente para las figuras
+    index = source_index(stack.edges)
+    return HomoCases(stack, errors, comparisons, vmin_ref, index, source_strip(index))
+
+
+def save_cases(cases_path: str) -> None:
+    """Tarea "casos": carga y alinea los casos una vez y guarda el bloque para figura y tabla."""
+    stack, errors, _, vmin_ref, _, _ = prepare_cases()
+    os.makedirs(os.path.dirname(cases_path), exist_ok=True)
+    tmp_path = f"{cases_path}.tmp{os.getpid()}.npz"
+    np.savez(
+        tmp_path,
+        names=np.array(stack.names),
+        values=stack.values,
+        reference=stack.reference,
+        x_edges=stack.edges[0],
+        y_edges=stack.edges[1],
+        vmin_ref=vmin_ref,
+        error_cases=np.array(list(errors), dtype=str),
+        error_messages=np.array([str(error) for error in errors.values()], dtype=str),
+    )
+    os.replace(tmp_path, cases_path)
+
+
+def load_cases(cases_path: str) -> HomoCases:
+    """Bloque guardado por `save_cases` (los errores de carga quedan como texto)."""
+    with np.load(cases_path) as data:
+        names = tuple(str(name) for name in data["names"])
+        stack = CaseStack(names, data["values"], data["reference"], (data["x_edges"], data["y_edges"]))
+        errors = dict(zip(data["error_cases"].tolist(), data["error_messages"].tolist()))
+        vmin_ref = float(data["vmin_ref"])
+    comparisons = tuple(row for row in COMPARISONS if row[0] in names)
+    index = source_index(stack.edges)
+    return HomoCases(stack, errors, comparisons, vmin_ref, index, source_strip(index))
+
+
+def plot_cases(cases_path: str, output_path: str) -> None:
+    """Tarea "figura": dosis, diferencia y perfil+ratio de cada caso frente al agua."""
+    stack, _, comparisons, vmin_ref, _, strip = load_cases(cases_path)
+
+    # Crear figura: una fila por caso
+    fig, axes = plt.subplots(len(comparisons), 3, figsize=(18, 5 * len(comparisons)), squeeze=False)
     fig.suptitle(
-        "Análisis Homogéneo I-125 100M: Lung MIRD vs Bone\n"
+        f"Análisis Homogéneo I-125 100M: {' vs '.join(label for _, label, _, _ in comparisons)}\n"
         "Plano Y=0 mm | Dosis, Diferencia, Perfil+Ratio (3 bins centrales)",
         fontsize=14,
         fontweight="bold",
         y=0.98
     )
-    
-    x_mm = np.linspace(-150, 150, dose_lung.shape[0])
-    
-    # Crear máscaras para eliminar ±2mm de la fuente
-    center_x_idx = dose_lung.shape[0] // 2
-    mask_source = np.ones(dose_lung.shape, dtype=bool)
-    mask_source[center_x_idx - 2:center_x_idx + 2, :] = False  # Eliminar ±2mm en X
-    
-    # Aplicar máscaras
-    dose_lung_masked = dose_lung.copy()
-    dose_lung_masked[~mask_source] = vmin_ref
-    
-    dose_bone_masked = dose_bone.copy()
-    dose_bone_masked[~mask_source] = vmin_ref
-    
-    dose_water_masked = dose_water.copy()
-    dose_water_masked[~mask_source] = vmin_ref
-    
-    # ============================================================================
-    # FILA 1: LUNG MIRD
-    # ============================================================================
-    
-    # [0,0] Dosis Lung MIRD
-    im1 = axes[0, 0].imshow(
-        dose_lung_masked.T,
-        aspect="auto",
-        origin="lower",
-        cmap="viridis",
-        norm=colors.LogNorm(vmin=vmin_ref, vmax=vmax_lung),
-        extent=[-150, 150, -150, 150]
-    )
-    axes[0, 0].set_title("Lung MIRD Homogéneo\nDosis (Gy, escala log)", fontweight="bold")
-    axes[0, 0].set_xlabel("X (mm)")
-    axes[0, 0].set_ylabel("Z (mm)")
-    plt.colorbar(im1, ax=axes[0, 0], label="Gy")
-    
-    # [0,1] Diferencia Lung - Water
-    diff_lung = dose_lung_masked - dose_water_masked
-    vmax_diff_lung = np.max(np.abs(diff_lung))
-    im2 = axes[0, 1].imshow(
-        diff_lung.T,
-        aspect="auto",
-        origin="lower",
-        cmap="RdBu_r",
-        vmin=-vmax_diff_lung,
-        vmax=vmax_diff_lung,
-        extent=[-150, 150, -150, 150]
-    )
-    axes[0, 1].set_title("Lung MIRD - Water\nDiferencia (Gy, lineal)", fontweight="bold")
-    axes[0, 1].set_xlabel("X (mm)")
-    axes[0, 1].set_ylabel("Z (mm)")
-    plt.colorbar(im2, ax=axes[0, 1], label="ΔGy")
-    
-    # [0,2] Perfil horizontal + Ratio (3 bins)
-    x_prof, prof_lung = get_horizontal_profile(dose_lung)
-    _, prof_water = get_horizontal_profile(dose_water)
-    x_3bins, vals_lung_3bins = get_profile_3bins(dose_lung)
-    _, vals_water_3bins = get_profile_3bins(dose_water)
-    
-    ax2_1 = axes[0, 2]
-    ax2_2 = ax2_1.twinx()
-    
-    # Perfil línea (filtrar ceros de la fuente)
-    mask_plot = prof_lung > 0
-    line1 = ax2_1.plot(x_prof[mask_plot], prof_lung[mask_plot], "o-", color="orange", linewidth=2, markersize=3, 
-                       label="Lung MIRD", alpha=0.7)
-    line2 = ax2_1.plot(x_prof[mask_plot], prof_water[mask_plot], "s-", color="blue", linewidth=2, markersize=3, 
-                       label="Water", alpha=0.7)
-    ax2_1.set_xlabel("X (mm)", fontsize=10)
-    ax2_1.set_ylabel("Dosis (Gy)", fontsize=10, color="black")
-    ax2_1.tick_params(axis="y", labelcolor="black")
-    ax2_1.grid(True, alpha=0.3)
-    ax2_1.set_xlim([-150, 150])
-    
-    # Ratio (3 bins)
-    ratio_lung_3bins = np.divide(vals_lung_3bins, vals_water_3bins, 
-                                  out=np.ones_like(vals_lung_3bins), 
-                                  where=vals_water_3bins > 0)
-    line3 = ax2_2.scatter(x_3bins, ratio_lung_3bins, s=200, c="orange", 
-                         marker="o", edgecolors="darkorange", linewidths=2, 
-                         label="Ratio (3 bins)", zorder=5, alpha=0.8)
-    ax2_2.axhline(y=1.0, color="k", linestyle="--", linewidth=1.5, alpha=0.5)
-    ax2_2.set_ylabel("Ratio (Lung/Water)", fontsize=10, color="orange")
-    ax2_2.tick_params(axis="y", labelcolor="orange")
-    ax2_2.set_ylim([0.5, 3.5])
-    
-    ax2_1.set_title("Perfil Horizontal (Y=0)\n+ Ratio 3 bins", fontweight="bold", fontsize=10)
-    lines = line1 + line2 + [line3]
-    labels = ["Lung MIRD (perfil)", "Water (perfil)", "Ratio 3bins"]
-    ax2_1.legend(lines, labels, loc="upper right", fontsize=9)
-    
-    # ============================================================================
-    # FILA 2: BONE
-    # ============================================================================
-    
-    # [1,0] Dosis Bone
-    im3 = axes[1, 0].imshow(
-        dose_bone_masked.T,
-        aspect="auto",
-        origin="lower",
-        cmap="viridis",
-        norm=colors.LogNorm(vmin=vmin_ref, vmax=vmax_bone),
-        extent=[-150, 150, -150, 150]
-    )
-    axes[1, 0].set_title("Bone Homogéneo\nDosis (Gy, escala log)", fontweight="bold")
-    axes[1, 0].set_xlabel("X (mm)")
-    axes[1, 0].set_ylabel("Z (mm)")
-    plt.colorbar(im3, ax=axes[1, 0], label="Gy")
-    
-    # [1,1] Diferencia Bone - Water
-    diff_bone = dose_bone_masked - dose_water_masked
-    vmax_diff_bone = np.max(np.abs(diff_bone))
-    im4 = axes[1, 1].imshow(
-        diff_bone.T,
-        aspect="auto",
-        origin="lower",
-        cmap="RdBu_r",
-        vmin=-vmax_diff_bone,
-        vmax=vmax_diff_bone,
-        extent=[-150, 150, -150, 150]
-    )
-    axes[1, 1].set_title("Bone - Water\nDiferencia (Gy, lineal)", fontweight="bold")
-    axes[1, 1].set_xlabel("X (mm)")
-    axes[1, 1].set_ylabel("Z (mm)")
-    plt.colorbar(im4, ax=axes[1, 1], label="ΔGy")
-    
-    # [1,2] Perfil horizontal + Ratio (3 bins)
-    _, prof_bone = get_horizontal_profile(dose_bone)
-    _, vals_bone_3bins = get_profile_3bins(dose_bone)
-    
-    ax3_1 = axes[1, 2]
-    ax3_2 = ax3_1.twinx()
-    
-    # Perfil línea (filtrar ceros de la fuente)
-    line1b = ax3_1.plot(x_prof[mask_plot], prof_bone[mask_plot], "o-", color="red", linewidth=2, markersize=3, 
-                        label="Bone", alpha=0.7)
-    line2b = ax3_1.plot(x_prof[mask_plot], prof_water[mask_plot], "s-", color="blue", linewidth=2, markersize=3, 
-                        label="Water", alpha=0.7)
-    ax3_1.set_xlabel("X (mm)", fontsize=10)
-    ax3_1.set_ylabel("Dosis (Gy)", fontsize=10, color="black")
-    ax3_1.tick_params(axis="y", labelcolor="black")
-    ax3_1.grid(True, alpha=0.3)
-    ax3_1.set_xlim([-150, 150])
-    
+
+    center_idx = stack.reference.shape[1] // 2
+
+    # Diferencias de todos los casos en una operación; la zona de la fuente queda a 0
+    diff = difference(stack)
+    diff[:, strip] = 0
+
+    # Perfiles horizontales (Y=0) sin la zona de la fuente
+    x_prof = np.linspace(-150, 150, stack.reference.shape[0])
+    prof_cases = profiles(stack.values, center_idx).copy()
+    prof_cases[:, strip[:, center_idx]] = 0
+    _, prof_water = get_horizontal_profile(stack.reference, strip)
+    mask_plot = ~strip[:, center_idx]
+
     # Ratio (3 bins)
-    ratio_bone_3bins = np.divide(vals_bone_3bins, vals_water_3bins, 
-                                 out=np.ones_like(vals_bone_3bins), 
-                                 where=vals_water_3bins > 0)
-    line3b = ax3_2.scatter(x_3bins, ratio_bone_3bins, s=200, c="red", 
-                          marker="o", edgecolors="darkred", linewidths=2, 
-                          label="Ratio (3 bins)", zorder=5, alpha=0.8)
-    ax3_2.axhline(y=1.0, color="k", linestyle="--", linewidth=1.5, alpha=0.5)
-    ax3_2.set_ylabel("Ratio (Bone/Water)", fontsize=10, color="red")
-    ax3_2.tick_params(axis="y", labelcolor="red")
-    ax3_2.set_ylim([0.5, 3.5])
-    
-    ax3_1.set_title("Perfil Horizontal (Y=0)\n+ Ratio 3 bins", fontweight="bold", fontsize=10)
-    lines = line1b + line2b + [line3b]
-    labels = ["Bone (perfil)", "Water (perfil)", "Ratio 3bins"]
-    ax3_1.legend(lines, labels, loc="upper right", fontsize=9)
-    
+    x_3bins, vals_3bins = get_profile_3bins(stack.values)
+    _, vals_water_3bins = get_profile_3bins(stack.reference)
+    ratio_3bins = np.divide(vals_3bins, vals_water_3bins,
+                            out=np.ones_like(vals_3bins),
+                            where=vals_water_3bins > 0)
+
+    for row, (case_key, label, color, edge_color) in enumerate(comparisons):
+        i = stack.names.index(case_key)
+
+        # [row,0] Dosis (zona de la fuente al mínimo de la escala)
+        dose_masked = stack.values[i].copy()
+        dose_masked[strip] = vmin_ref
+        im1 = axes[row, 0].imshow(
+            dose_masked.T,
+            aspect="auto",
+            origin="lower",
+            cmap="viridis",
+            norm=colors.LogNorm(vmin=vmin_ref, vmax=np.max(stack.values[i])),
+            extent=[-150, 150, -150, 150]
+        )
+        axes[row, 0].set_title(f"{label} Homogéneo\nDosis (Gy, escala log)", fontweight="bold")
+        axes[row, 0].set_xlabel("X (mm)")
+        axes[row, 0].set_ylabel("Z (mm)")
+        plt.colorbar(im1, ax=axes[row, 0], label="Gy")
+
+        # [row,1] Diferencia caso - Water
+        vmax_diff = np.max(np.abs(diff[i]))
+        im2 = axes[row, 1].imshow(
+            diff[i].T,
+            aspect="auto",
+            origin="lower",
+            cmap="RdBu_r",
+            vmin=-vmax_diff,
+            vmax=vmax_diff,
+            extent=[-150, 150, -150, 150]
+        )
+        axes[row, 1].set_title(f"{label} - Water\nDiferencia (Gy, lineal)", fontweight="bold")
+        axes[row, 1].set_xlabel("X (mm)")
+        axes[row, 1].set_ylabel("Z (mm)")
+        plt.colorbar(im2, ax=axes[row, 1], label="ΔGy")
+
+        # [row,2] Perfil horizontal + Ratio (3 bins)
+        ax_prof = axes[row, 2]
+        ax_ratio = ax_prof.twinx()
+
+        # Perfil línea (filtrar ceros de la fuente)
+        line1 = ax_prof.plot(x_prof[mask_plot], prof_cases[i][mask_plot], "o-", color=color, linewidth=2,
+                             markersize=3, label=label, alpha=0.7)
+        line2 = ax_prof.plot(x_prof[mask_plot], prof_water[mask_plot], "s-", color="blue", linewidth=2,
+                             markersize=3, label="Water", alpha=0.7)
+        ax_prof.set_xlabel("X (mm)", fontsize=10)
+        ax_prof.set_ylabel("Dosis (Gy)", fontsize=10, color="black")
+        ax_prof.tick_params(axis="y", labelcolor="black")
+        ax_prof.grid(True, alpha=0.3)
+        ax_prof.set_xlim([-150, 150])
+
+        line3 = ax_ratio.scatter(x_3bins, ratio_3bins[i], s=200, c=color,
+                                 marker="o", edgecolors=edge_color, linewidths=2,
+                                 label="Ratio (3 bins)", zorder=5, alpha=0.8)
+        ax_ratio.axhline(y=1.0, color="k", linestyle="--", linewidth=1.5, alpha=0.5)
+        ax_ratio.set_ylabel(f"Ratio ({label.split()[0]}/Water)", fontsize=10, color=color)
+        ax_ratio.tick_params(axis="y", labelcolor=color)
+        ax_ratio.set_ylim([0.5, 3.5])
+
+        ax_prof.set_title("Perfil Horizontal (Y=0)\n+ Ratio 3 bins", fontweight="bold", fontsize=10)
+        lines = line1 + line2 + [line3]
+        labels = [f"{label} (perfil)", "Water (perfil)", "Ratio 3bins"]
+        ax_prof.legend(lines, labels, loc="upper right", fontsize=9)
+
     plt.tight_layout()
-    
-    # Guardar figura
-    output_path = f"{DATA_DIR}/homo_analysis_2x3_complete.png"
     plt.savefig(output_path, dpi=300, bbox_inches="tight")
-    print(f"✅ Figura guardada: {output_path}")
-    print()
-    
-    # Estadísticas
+    plt.close(fig)
+
+
+def write_statistics(cases_path: str, table_path: str) -> None:
+    """Tarea "tabla": casos cargados, valores de los 3 bins centrales y ratio medio por región."""
+    stack, errors, comparisons, _, index, _ = load_cases(cases_path)
+    _, vals_3bins = get_profile_3bins(stack.values)
+    _, vals_water_3bins = get_profile_3bins(stack.reference)
+    ratio_3bins = np.divide(vals_3bins, vals_water_3bins,
+                            out=np.ones_like(vals_3bins),
+                            where=vals_water_3bins > 0)
+
+    with capture_table(table_path):
+        print(f"  {REFERENCE_CASE:6s}... ✓ (shape: {stack.reference.shape})")
+        for case_key in stack.names:
+            print(f"  {case_key:6s}... ✓ (shape: {stack.reference.shape})")
+        for case_key, error in errors.items():
+            print(f"⚠️ Error cargando {case_key}: {error}")
+        print()
+
+        # Estadísticas
+        print("=" * 80)
+        print("ESTADÍSTICAS (3 BINS CENTRALES)")
+        print("=" * 80)
+        print()
+        print(f"Water (3 bins):     {vals_water_3bins}")
+        for case_key, label, _, _ in comparisons:
+            i = stack.names.index(case_key)
+            name = label.split()[0]
+            print(f"{label + ' (3 bins):':20s}{vals_3bins[i]}")
+            print(f"{'Ratio ' + name + '/Water:':20s}{ratio_3bins[i]}")
+        print()
+
+        # Ratio medio por región (fuera de ±2 mm) de todos los casos a la vez
+        region_ratio = region_stats(ratio(stack), index.labels("region"), len(REGION_NAMES))
+        print("Ratio medio respecto al agua (sin ±2 mm de la fuente):")
+        for case_key, label, _, _ in comparisons:
+            i = stack.names.index(case_key)
+            print(f"  {label:12s} {region_ratio.mean[i][0]:.4f}")
+        print()
+
+
+def main(force: bool = False, max_workers: int = None):
     print("=" * 80)
-    print("ESTADÍSTICAS (3 BINS CENTRALES)")
+    print("ANÁLISIS DE CASOS HOMOGÉNEOS - I-125 100M")
     print("=" * 80)
     print()
-    print(f"Lung MIRD (3 bins): {vals_lung_3bins}")
-    print(f"Water (3 bins):     {vals_water_3bins}")
-    print(f"Ratio Lung/Water:   {ratio_lung_3bins}")
-    print()
-    print(f"Bone (3 bins):      {vals_bone_3bins}")
-    print(f"Ratio Bone/Water:   {ratio_bone_3bins}")
+
+    # Figura y tabla solo se rehacen si cambian los ROOT, sus sidecars, los casos o este script;
+    # los ROOT se cargan una vez (tarea "casos") y las dos leen el bloque guardado
+    output_path = f"{DATA_DIR}/{FIGURE_FILE}"
+    table_path = f"{DATA_DIR}/{TABLE_FILE}"
+    cases_path = f"{DATA_DIR}/{SIDECAR_DIR}/{CASES_FILE}"
+    params = {"file_map": FILE_MAP, "densities": DENSITIES, "comparisons": COMPARISONS}
+    graph = TaskGraph(state_path(DATA_DIR, __file__))
+    graph.add("casos", partial(save_cases, cases_path), input_paths(), [cases_path], params)
+    graph.add("figura", partial(plot_cases, cases_path, output_path), [cases_path], [output_path],
+              deps=["casos"])
+    graph.add("tabla", partial(write_statistics, cases_path, table_path), [cases_path], [table_path],
+              deps=["casos"])
+    report = graph.run(max_workers=max_workers, force=force)
+
+    print_table(table_path)
+    print_report(report)
+    if "figura" not in report.errors:
+        print(f"✅ Figura: {output_path}")
     print()
 
 
 if __name__ == "__main__":
-    main()
+    main(force="--force" in sys.argv[1:])
@@ -3,19 +3,39 @@
 Carga los histogramas h20 (plano Y=0) para agua homogénea y hueso heterogéneo,
 convierte edep a Gy considerando la heterogeneidad centrada sobre el eje X,
 y produce una figura 2x2 con mapas logarítmicos, diferencia y ratio.
-También imprime estadísticas básicas dentro y fuera de la heterogeneidad."""
+También imprime estadísticas básicas y D98/D50/D2 (DVH) dentro y fuera de
+la heterogeneidad.
+
+Espesor de la malla, tamaño y posición de la heterogeneidad y densidades se
+leen del sidecar de procedencia de cada ROOT (`provenance.py`); las
+constantes de abajo solo se usan con archivos antiguos sin sidecar.
+
+La tabla (`ir192_overview_stats.txt`) y la figura son tareas de
+`task_graph`: se recalculan solo si cambian los ROOT, sus sidecars o este
+script, y en paralelo si hay que hacer las dos (`--force` rehace todo)."""
 
 import os
+import sys
+from functools import partial
+from typing import List, NamedTuple, Optional
+
 import matplotlib.colors as colors
 import matplotlib.patches as patches
 import matplotlib.pyplot as plt
 import numpy as np
-import uproot
-from typing import Tuple
+
+from dose_loader import SIDECAR_DIR, load_histogram
+from dvh import DVH, compute_dvh
+from grid_align import align_to
+from mesh_index import REGION_NAMES, MeshIndex, mesh_index, region_stats
+from provenance import DoseSetup, dose_setup, provenance_path
+from task_graph import TaskGraph, capture_table, print_report, print_table, state_path
 
 DATA_DIR = "/home/fer/fer/newbrachy/200M_IR192"
 WATER_FILE = "200m_water_homogeneous.root"
 BONE_HETERO_FILE = "200m_heterogeneous_bone.root"
+FIGURE_FILE = "ir192_overview_water_vs_bone.png"
+TABLE_FILE = "ir192_overview_stats.txt"
 
 HETERO_SIZE_MM = 60.0
 HETERO_POS_X_MM = 40.0
@@ -27,32 +47,27 @@ MEV_TO_GY = 1.602e-10
 DENSITY_WATER = 1.0
 DENSITY_BONE = 1.85
 
-
-def load_histogram(filepath: str, hist_name: str = "h20") -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
-    """Devuelve valores y ejes del histograma solicitado."""
-    with uproot.open(filepath) as root_file:
-        if hist_name not in root_file:
-            raise KeyError(f"Histograma {hist_name} no encontrado en {filepath}")
-        hist = root_file[hist_name]
-        values = hist.values()
-        x_edges = hist.axes[0].edges()
-        y_edges = hist.axes[1].edges()
-        return values, x_edges, y_edges
-
-
-def bin_centers(edges: np.ndarray) -> np.ndarray:
-    return 0.5 * (edges[:-1] + edges[1:])
-
-
-def heterogeneity_mask(x_centers: np.ndarray, y_centers: np.ndarray) -> np.ndarray:
-    """Máscara booleana para la región 60×60 mm centrada en (40, 0) sobre el eje X."""
-    x_min = HETERO_POS_X_MM - HETERO_SIZE_MM / 2.0
-    x_max = HETERO_POS_X_MM + HETERO_SIZE_MM / 2.0
-    y_min = HETERO_POS_Y_MM - HETERO_SIZE_MM / 2.0
-    y_max = HETERO_POS_Y_MM + HETERO_SIZE_MM / 2.0
-
-    xx, yy = np.meshgrid(x_centers, y_centers, indexing="ij")
-    return (xx >= x_min) & (xx <= x_max) & (yy >= y_min) & (yy <= y_max)
+WATER_DEFAULTS = DoseSetup(
+    BIN_THICKNESS_MM,
+    None,
+    DENSITY_WATER,
+    False,
+    DENSITY_WATER,
+    (HETERO_POS_X_MM, HETERO_POS_Y_MM),
+    (HETERO_SIZE_MM, HETERO_SIZE_MM),
+)
+BONE_DEFAULTS = WATER_DEFAULTS._replace(hetero_enabled=True, hetero_density=DENSITY_BONE)
+
+
+def heterogeneity_index(x_edges: np.ndarray, y_edges: np.ndarray, setup: DoseSetup = BONE_DEFAULTS) -> MeshIndex:
+    """Índice de la rejilla con la región de la heterogeneidad de `setup` (cacheado en disco)."""
+    return mesh_index(
+        x_edges,
+        y_edges,
+        hetero_center_mm=setup.hetero_center_mm,
+        hetero_size_mm=setup.hetero_size_mm,
+        cache_dir=os.path.join(DATA_DIR, SIDECAR_DIR),
+    )
 
 
 def build_density_map(mask: np.ndarray, inside_density: float, outside_density: float) -> np.ndarray:
@@ -61,20 +76,36 @@ def build_density_map(mask: np.ndarray, inside_density: float, outside_density:
     return density
 
 
-def edep_to_dose(values: np.ndarray, density_map: np.ndarray, bin_size_mm: float) -> np.ndarray:
+def setup_density_map(setup: DoseSetup, x_edges: np.ndarray, y_edges: np.ndarray) -> np.ndarray:
+    """Densidad del fantoma con la heterogeneidad del run (si está activada)."""
+    shape = (len(x_edges) - 1, len(y_edges) - 1)
+    if not setup.hetero_enabled:
+        return np.full(shape, setup.phantom_density, dtype=float)
+    mask = heterogeneity_index(x_edges, y_edges, setup).inside_heterogeneity
+    return build_density_map(mask, setup.hetero_density, setup.phantom_density)
+
+
+def voxel_volume_cm3(bin_size_mm: float, thickness_mm: float = BIN_THICKNESS_MM) -> float:
+    return (bin_size_mm / 10.0) ** 2 * (thickness_mm / 10.0)
+
+
+def edep_to_dose(
+    values: np.ndarray, density_map: np.ndarray, bin_size_mm: float, thickness_mm: float = BIN_THICKNESS_MM
+) -> np.ndarray:
     """Convierte edep (MeV) a Gy empleando la densidad local."""
-    bin_volume_cm3 = (bin_size_mm / 10.0) ** 2 * (BIN_THICKNESS_MM / 10.0)
+    bin_volume_cm3 = voxel_volume_cm3(bin_size_mm, thickness_mm)
     dose = np.zeros_like(values, dtype=float)
     valid = density_map > 0
     dose[valid] = values[valid] * MEV_TO_GY / (bin_volume_cm3 * density_map[valid])
     return dose
 
 
-def add_hetero_outline(ax: plt.Axes) -> None:
+def add_hetero_outline(ax: plt.Axes, setup: DoseSetup = BONE_DEFAULTS) -> None:
+    (center_x, center_y), (size_x, size_y) = setup.hetero_center_mm, setup.hetero_size_mm
     rect = patches.Rectangle(
-        (HETERO_POS_X_MM - HETERO_SIZE_MM / 2.0, HETERO_POS_Y_MM - HETERO_SIZE_MM / 2.0),
-        HETERO_SIZE_MM,
-        HETERO_SIZE_MM,
+        (center_x - size_x / 2.0, center_y - size_y / 2.0),
+        size_x,
+        size_y,
         linewidth=1.5,
         edgecolor="white",
         facecolor="none",
@@ -83,55 +114,147 @@ def add_hetero_outline(ax: plt.Axes) -> None:
     ax.add_patch(rect)
 
 
-def print_stats(name: str, dose: np.ndarray, mask: np.ndarray) -> None:
-    inside = dose[mask]
-    outside = dose[~mask]
-    inside_positive = inside[inside > 0]
-    outside_positive = outside[outside > 0]
+def print_stats(name: str, dose: np.ndarray, index: MeshIndex) -> None:
+    stats = region_stats(dose, index.region, len(REGION_NAMES), positive_only=True)
 
     print(f"\n{name}:")
-    if inside_positive.size:
-        print(f"  Heterogeneidad -> mean {inside_positive.mean():.3e} Gy | max {inside_positive.max():.3e} Gy")
-    if outside_positive.size:
-        print(f"  Agua exterior -> mean {outside_positive.mean():.3e} Gy | max {outside_positive.max():.3e} Gy")
+    for label in reversed(range(len(REGION_NAMES))):
+        if stats.count[label]:
+            print(f"  {REGION_NAMES[label]} -> mean {stats.mean[label]:.3e} Gy | max {stats.max[label]:.3e} Gy")
+
+
+def region_dvh(
+    values: np.ndarray,
+    density_map: np.ndarray,
+    bin_size_mm: float,
+    index: MeshIndex,
+    dose_edges: np.ndarray = None,
+    thickness_mm: float = BIN_THICKNESS_MM,
+) -> DVH:
+    """DVH por región a partir de edep, convirtiendo a Gy bloque a bloque con `edep_to_dose`."""
+    return compute_dvh(
+        values,
+        index.labels("region"),
+        dose_edges=dose_edges,
+        names=REGION_NAMES,
+        voxel_volume_cm3=voxel_volume_cm3(bin_size_mm, thickness_mm),
+        convert=lambda chunk, selector: edep_to_dose(chunk, density_map[selector], bin_size_mm, thickness_mm),
+    )
+
 
+def print_dvh(name: str, dvh: DVH) -> None:
+    d98, d50, d2 = (dvh.dose_at_volume(percent) for percent in (98.0, 50.0, 2.0))
 
-def main() -> None:
+    print(f"\n{name} (DVH, sin ±2 mm de la fuente):")
+    for label in reversed(range(len(dvh.names))):
+        if dvh.total_volume[label] > 0:
+            print(
+                f"  {dvh.names[label]} -> D98 {d98[label]:.3e} Gy | D50 {d50[label]:.3e} Gy"
+                f" | D2 {d2[label]:.3e} Gy | V {dvh.total_volume[label]:.3f} cm³"
+            )
+
+
+class Overview(NamedTuple):
+    """Mapas en Gy del agua y del hueso sobre la rejilla del agua, con su configuración."""
+
+    water_values: np.ndarray
+    bone_values: np.ndarray
+    x_edges: np.ndarray
+    y_edges: np.ndarray
+    water_setup: DoseSetup
+    bone_setup: DoseSetup
+    water_density: np.ndarray
+    bone_density: np.ndarray
+    bin_size_mm: float
+    index: MeshIndex
+    water_dose: np.ndarray
+    bone_dose: np.ndarray
+
+
+def input_paths() -> List[str]:
+    """ROOT de entrada y sus sidecars de procedencia (entradas de las tareas)."""
+    roots = [os.path.join(DATA_DIR, WATER_FILE), os.path.join(DATA_DIR, BONE_HETERO_FILE)]
+    return roots + [provenance_path(path) for path in roots]
+
+
+def load_overview() -> Overview:
     water_path = os.path.join(DATA_DIR, WATER_FILE)
     bone_path = os.path.join(DATA_DIR, BONE_HETERO_FILE)
 
-    water_values, water_x_edges, water_y_edges = load_histogram(water_path)
-    bone_values_raw, bone_x_edges, bone_y_edges = load_histogram(bone_path)
+    water_hist = load_histogram(water_path)
+    bone_hist = load_histogram(bone_path)
+    water_values, (water_x_edges, water_y_edges) = water_hist.values, water_hist.edges
+
+    # Recorte (o rebin exacto) del hueso a la rejilla del agua; error si no encajan
+    bone_values = align_to(bone_hist.values, bone_hist.edges, water_hist.edges)
+
+    water_setup = dose_setup(water_path, WATER_DEFAULTS)
+    bone_setup = dose_setup(bone_path, BONE_DEFAULTS)
+
+    index = heterogeneity_index(water_x_edges, water_y_edges, bone_setup)
+    # Vóxel de la rejilla común: el hueso ya está sumado por bloques a la del agua,
+    # y su `voxel_xy_mm` propio (p. ej. de una malla más fina) ya no corresponde a ningún mapa
+    bin_size_mm = float(water_x_edges[1] - water_x_edges[0])
+
+    water_density = setup_density_map(water_setup, water_x_edges, water_y_edges)
+    bone_density = setup_density_map(bone_setup, water_x_edges, water_y_edges)
+
+    return Overview(
+        water_values,
+        bone_values,
+        water_x_edges,
+        water_y_edges,
+        water_setup,
+        bone_setup,
+        water_density,
+        bone_density,
+        bin_size_mm,
+        index,
+        edep_to_dose(water_values, water_density, bin_size_mm, water_setup.thickness_mm),
+        edep_to_dose(bone_values, bone_density, bin_size_mm, bone_setup.thickness_mm),
+    )
 
-    if bone_values_raw.shape != water_values.shape:
-        step_mm = bone_x_edges[1] - bone_x_edges[0]
-        start_x = int(round((water_x_edges[0] - bone_x_edges[0]) / step_mm))
-        start_y = int(round((water_y_edges[0] - bone_y_edges[0]) / step_mm))
-        end_x = start_x + water_values.shape[0]
-        end_y = start_y + water_values.shape[1]
-        bone_values = bone_values_raw[start_x:end_x, start_y:end_y]
-    else:
-        bone_values = bone_values_raw
 
-    x_cent = bin_centers(water_x_edges)
-    y_cent = bin_centers(water_y_edges)
-    mask = heterogeneity_mask(x_cent, y_cent)
-    bin_size_mm = water_x_edges[1] - water_x_edges[0]
+def write_summary(table_path: str) -> None:
+    """Tarea "tabla": configuración de cada run, estadísticas por región y DVH."""
+    data = load_overview()
+    with capture_table(table_path):
+        for name, setup in (("Water", data.water_setup), ("Bone", data.bone_setup)):
+            hetero = f"heterogeneidad ρ={setup.hetero_density:g}" if setup.hetero_enabled else "sin heterogeneidad"
+            print(f"{name}: espesor {setup.thickness_mm:g} mm, fantoma ρ={setup.phantom_density:g} g/cm³, {hetero}")
+
+        print("Resumen estadístico (Ir-192, 200M eventos)")
+        print_stats("Water homogéneo", data.water_dose, data.index)
+        print_stats("Bone heterogéneo", data.bone_dose, data.index)
+
+        # Mismos bins de dosis para que los DVH de ambos casos sean comparables
+        dose_edges = np.linspace(0.0, max(data.water_dose.max(), data.bone_dose.max()), 1001)
+        print_dvh(
+            "Water homogéneo",
+            region_dvh(
+                data.water_values, data.water_density, data.bin_size_mm, data.index, dose_edges,
+                data.water_setup.thickness_mm,
+            ),
+        )
+        print_dvh(
+            "Bone heterogéneo",
+            region_dvh(
+                data.bone_values, data.bone_density, data.bin_size_mm, data.index, dose_edges,
+                data.bone_setup.thickness_mm,
+            ),
+        )
 
-    water_density = np.full_like(water_values, DENSITY_WATER, dtype=float)
-    bone_density = build_density_map(mask, DENSITY_BONE, DENSITY_WATER)
 
-    water_dose = edep_to_dose(water_values, water_density, bin_size_mm)
-    bone_dose = edep_to_dose(bone_values, bone_density, bin_size_mm)
+def plot_overview(output_path: str) -> None:
+    """Tarea "figura": mapas 2x2 de agua, hueso, diferencia y ratio."""
+    data = load_overview()
+    water_dose, bone_dose, bone_setup = data.water_dose, data.bone_dose, data.bone_setup
+    water_x_edges, water_y_edges = data.x_edges, data.y_edges
 
     diff_dose = bone_dose - water_dose
     ratio = np.ones_like(bone_dose)
     np.divide(bone_dose, water_dose, out=ratio, where=water_dose > 0)
 
-    print("Resumen estadístico (Ir-192, 200M eventos)")
-    print_stats("Water homogéneo", water_dose, mask)
-    print_stats("Bone heterogéneo", bone_dose, mask)
-
     extent = [water_x_edges[0], water_x_edges[-1], water_y_edges[0], water_y_edges[-1]]
 
     fig, axes = plt.subplots(2, 2, figsize=(16, 12))
@@ -153,7 +276,7 @@ def main() -> None:
     axes[0, 0].set_title("Water Homogéneo (log)")
     axes[0, 0].set_xlabel("X (mm)")
     axes[0, 0].set_ylabel("Y (mm)")
-    add_hetero_outline(axes[0, 0])
+    add_hetero_outline(axes[0, 0], bone_setup)
 
     # Bone heterogéneo (log)
     bone_plot = bone_dose.copy()
@@ -171,7 +294,7 @@ def main() -> None:
     axes[0, 1].set_title("Bone Heterogéneo (log)")
     axes[0, 1].set_xlabel("X (mm)")
     axes[0, 1].set_ylabel("Y (mm)")
-    add_hetero_outline(axes[0, 1])
+    add_hetero_outline(axes[0, 1], bone_setup)
 
     # Diferencia lineal
     vmax_diff = np.max(np.abs(diff_dose))
@@ -187,7 +310,7 @@ def main() -> None:
     axes[1, 0].set_title("Diferencia: Bone - Water")
     axes[1, 0].set_xlabel("X (mm)")
     axes[1, 0].set_ylabel("Y (mm)")
-    add_hetero_outline(axes[1, 0])
+    add_hetero_outline(axes[1, 0], bone_setup)
 
     # Ratio
     im3 = axes[1, 1].imshow(
@@ -202,14 +325,28 @@ def main() -> None:
     axes[1, 1].set_title("Ratio Bone / Water")
     axes[1, 1].set_xlabel("X (mm)")
     axes[1, 1].set_ylabel("Y (mm)")
-    add_hetero_outline(axes[1, 1])
+    add_hetero_outline(axes[1, 1], bone_setup)
 
     plt.tight_layout(rect=[0, 0, 1, 0.97])
-    output_path = os.path.join(DATA_DIR, "ir192_overview_water_vs_bone.png")
     plt.savefig(output_path, dpi=150, bbox_inches="tight")
-    print(f"\nFigura guardada en: {output_path}")
+    plt.close(fig)
 
 
-if __name__ == "__main__":
-    main()
+def main(force: bool = False, max_workers: Optional[int] = None) -> None:
+    """Tabla y figura como tareas incrementales: solo se rehace lo que cambió (entradas, parámetros o script)."""
+    table_path = os.path.join(DATA_DIR, TABLE_FILE)
+    output_path = os.path.join(DATA_DIR, FIGURE_FILE)
 
+    graph = TaskGraph(state_path(DATA_DIR, __file__))
+    graph.add("tabla", partial(write_summary, table_path), inputs=input_paths(), outputs=[table_path])
+    graph.add("figura", partial(plot_overview, output_path), inputs=input_paths(), outputs=[output_path])
+    report = graph.run(max_workers=max_workers, force=force)
+
+    print_table(table_path)
+    print()
+    print_report(report)
+    print(f"\nFigura: {output_path}")
+
+
+if __name__ == "__main__":
+    main(force="--force" in sys.argv[1:])
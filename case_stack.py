@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Comparación de N casos contra una referencia con un único array (N, nx, ny).
+
+Las figuras calculaban `caso - agua`, `np.divide(caso, agua, ...)` y los
+perfiles en un bloque copiado por material. Aquí los casos se cargan (en
+paralelo, vía `dose_loader.load_many`) en un array contiguo y diferencia,
+ratio, diferencia relativa y estadísticas por región salen de una sola
+operación con broadcasting contra la referencia. Con `dtype=np.float32` y
+`out=stack.values` las operaciones se hacen en el propio bloque, sin copias
+de (N, nx, ny) en float64."""
+
+from typing import Callable, Dict, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dose_loader import DEFAULT_HIST, load_many
+from grid_align import align_maps
+from mesh_index import check_labels
+
+
+class CaseStack(NamedTuple):
+    """Casos apilados (N, nx, ny) en el orden de `names` y su referencia (nx, ny)."""
+
+    names: Tuple[str, ...]
+    values: np.ndarray
+    reference: np.ndarray
+    edges: Optional[Tuple[np.ndarray, ...]] = None
+
+    def case(self, name: str) -> np.ndarray:
+        return self.values[self.names.index(name)]
+
+
+class StackStats(NamedTuple):
+    """Estadísticas (N, n_etiquetas) por caso y región."""
+
+    sum: np.ndarray
+    count: np.ndarray
+    mean: np.ndarray
+    max: np.ndarray
+
+
+def stack_cases(
+    cases: Mapping[str, np.ndarray],
+    reference: np.ndarray,
+    dtype: type = np.float64,
+    edges: Optional[Sequence[np.ndarray]] = None,
+) -> CaseStack:
+    """Copia los casos en un bloque contiguo preasignado (una sola reserva de memoria)."""
+    names = tuple(cases)
+    reference = np.asarray(reference, dtype=dtype)
+    values = np.empty((len(names),) + reference.shape, dtype=dtype)
+    for i, name in enumerate(names):
+        if np.shape(cases[name]) != reference.shape:
+            raise ValueError(f"{name}: forma {np.shape(cases[name])} distinta de la referencia {reference.shape}")
+        values[i] = cases[name]
+    return CaseStack(names, values, reference, None if edges is None else tuple(edges))
+
+
+def load_stack(
+    paths: Mapping[str, str],
+    reference_key: str,
+    hist_name: str = DEFAULT_HIST,
+    convert: Optional[Callable[[str, np.ndarray], np.ndarray]] = None,
+    dtype: type = np.float64,
+    max_workers: Optional[int] = None,
+) -> Tuple[CaseStack, Dict[str, Exception]]:
+    """Carga los casos y la referencia (`paths[reference_key]`) en paralelo.
+
+    Todos los mapas se llevan a su rejilla común con `grid_align` (recorte o
+    rebin exacto) y después se aplica `convert(clave, valores)` (p. ej. edep
+    a dosis). Los casos que no se pueden leer se devuelven aparte; si falla
+    la referencia se lanza su excepción."""
+    hists, errors = load_many(paths, hist_name, max_workers=max_workers)
+    if reference_key in errors:
+        raise errors[reference_key]
+    keys = [reference_key] + [key for key in paths if key != reference_key and key in hists]
+    maps, edges = align_maps([(hists[key].values, hists[key].edges) for key in keys])
+    if convert is not None:
+        maps = [convert(key, values) for key, values in zip(keys, maps)]
+    stack = stack_cases(dict(zip(keys[1:], maps[1:])), maps[0], dtype=dtype, edges=edges)
+    return stack, errors
+
+
+def difference(stack: CaseStack, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """caso - referencia para todos los casos (`out=stack.values` para hacerlo en el sitio)."""
+    return np.subtract(stack.values, stack.reference, out=out)
+
+
+def ratio(stack: CaseStack, out: Optional[np.ndarray] = None, fill: float = 1.0) -> np.ndarray:
+    """caso / referencia; `fill` donde la referencia es 0 (`out=stack.values` para hacerlo en el sitio)."""
+    if out is None:
+        out = np.empty_like(stack.values)
+    valid = stack.reference > 0
+    np.divide(stack.values, stack.reference, out=out, where=valid)
+    out[:, ~valid] = fill
+    return out
+
+
+def relative_difference(stack: CaseStack, out: Optional[np.ndarray] = None, fill: float = 0.0) -> np.ndarray:
+    """(caso - referencia) / referencia; `fill` donde la referencia es 0."""
+    out = ratio(stack, out=out, fill=fill + 1.0)
+    out -= 1.0
+    return out
+
+
+def region_stats(
+    data: np.ndarray, labels: np.ndarray, n_labels: Optional[int] = None, positive_only: bool = False
+) -> StackStats:
+    """Suma, cuenta, media y máximo por caso y etiqueta con un solo `bincount`.
+
+    `labels` (nx, ny) es común a todos los casos (p. ej. `MeshIndex.region`);
+    las etiquetas -1 se ignoran."""
+    n_cases = data.shape[0]
+    labels = np.asarray(labels)
+    if n_labels is None:
+        n_labels = int(labels.max()) + 1
+    # Una etiqueta ≥ n_labels caería en la primera región del caso siguiente
+    check_labels(labels, n_labels)
+    flat = np.asarray(data, dtype=np.float64).reshape(n_cases, -1)
+    case_labels = np.broadcast_to(labels.ravel(), flat.shape)
+    selected = case_labels >= 0
+    if positive_only:
+        selected = selected & (flat > 0)
+    # Etiqueta combinada caso * n_labels + región
+    combined = (np.arange(n_cases)[:, None] * n_labels + case_labels)[selected]
+    values = flat[selected]
+    size = n_cases * n_labels
+    sums = np.bincount(combined, weights=values, minlength=size).reshape(n_cases, n_labels)
+    counts = np.bincount(combined, minlength=size).reshape(n_cases, n_labels)
+    means = np.zeros_like(sums)
+    np.divide(sums, counts, out=means, where=counts > 0)
+    maxima = np.full(size, -np.inf)
+    np.maximum.at(maxima, combined, values)
+    maxima = np.where(counts.ravel() > 0, maxima, 0.0).reshape(n_cases, n_labels)
+    return StackStats(sums, counts, means, maxima)
+
+
+def profiles(data: np.ndarray, row: Optional[int] = None) -> np.ndarray:
+    """Perfiles horizontales (N, nx) en la fila `row` (por defecto la central)."""
+    if row is None:
+        row = data.shape[2] // 2
+    return data[:, :, row]
@@ -0,0 +1,23 @@
+"""Utilidades comunes de los tests: archivos ROOT sintéticos con el formato del writer."""
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def write_run_file():
+    """Escribe `path` con mapas 2D (`hists`: nombre -> valores) sobre ±`half_width_mm` y, opcionalmente,
+    `<h>_nevents` (H1 de un bin con el número de eventos) para cada mapa."""
+    uproot = pytest.importorskip("uproot")
+
+    def write(path, hists, n_events=None, half_width_mm=10.0):
+        with uproot.recreate(str(path)) as output:
+            for name, values in hists.items():
+                values = np.asarray(values, dtype=np.float64)
+                edges = [np.linspace(-half_width_mm, half_width_mm, n + 1) for n in values.shape]
+                output[name] = (values, *edges)
+                if n_events is not None:
+                    output[name + "_nevents"] = (np.array([float(n_events)]), np.array([0.0, 1.0]))
+        return str(path)
+
+    return write
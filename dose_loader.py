@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""Cargador compartido de mapas de dosis (histogramas ROOT de BrachyUserScoreWriter).
+
+Todas las figuras leen los mismos `h20` una y otra vez; este módulo abre cada
+archivo una sola vez por proceso y guarda el resultado en una caché LRU
+indexada por (ruta, tamaño, mtime, nombre de histograma). Si el histograma pedido no
+existe se aplica el mismo fallback `h20` -> `h10` en todos los scripts.
+
+Además, la primera decodificación con uproot deja un sidecar en
+`.npycache/` junto al archivo ROOT (valores y bordes en `.npy` más un sello
+JSON con tamaño y mtime del original). Las ejecuciones siguientes abren los
+`.npy` con `mmap_mode='r'` y no importan uproot en absoluto."""
+
+import json
+import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Mapping, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_HIST = "h20"
+FALLBACK_HIST = {"h20": "h10"}
+# Contenido del archivo único por run (/brachy/output/singleFile true)
+RUN_FILE_HISTS = ("h20", "h2_eDepPrimary", "h2_eDepSecondary", "h10")
+CACHE_SIZE = 32
+
+MAX_LOAD_WORKERS = 8
+
+SIDECAR_DIR = ".npycache"
+SIDECAR_VERSION = 1
+
+
+class HistogramData(NamedTuple):
+    """Valores del histograma y bordes de cada eje (arrays de solo lectura)."""
+
+    values: np.ndarray
+    edges: Tuple[np.ndarray, ...]
+    name: str
+
+    @property
+    def x_edges(self) -> np.ndarray:
+        return self.edges[0]
+
+    @property
+    def y_edges(self) -> np.ndarray:
+        return self.edges[1]
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array = np.asarray(array)
+    array.flags.writeable = False
+    return array
+
+
+def _decode_from(root_file, path: str, hist_name: str, fallback: bool = True) -> HistogramData:
+    name = hist_name
+    if name not in root_file and fallback:
+        name = FALLBACK_HIST.get(hist_name, hist_name)
+    if name not in root_file:
+        raise KeyError(f"Histograma {hist_name} no encontrado en {path}")
+    hist = root_file[name]
+    values = _read_only(hist.values())
+    edges = tuple(_read_only(axis.edges()) for axis in hist.axes)
+    return HistogramData(values, edges, name)
+
+
+def _decode(path: str, hist_name: str) -> HistogramData:
+    """Lectura directa con uproot (import diferido: es lo más lento del arranque)."""
+    import uproot
+
+    with uproot.open(path) as root_file:
+        return _decode_from(root_file, path, hist_name)
+
+
+def sidecar_paths(path: str, hist_name: str) -> Tuple[str, str, str]:
+    """Rutas (valores, bordes, sello) del sidecar de `hist_name` para `path`."""
+    directory, base = os.path.split(os.path.abspath(path))
+    prefix = os.path.join(directory, SIDECAR_DIR, f"{base}.{hist_name}")
+    return f"{prefix}.values.npy", f"{prefix}.edges.npy", f"{prefix}.json"
+
+
+def _read_sidecar(path: str, size: int, mtime_ns: int, hist_name: str) -> Optional[HistogramData]:
+    values_path, edges_path, stamp_path = sidecar_paths(path, hist_name)
+    try:
+        with open(stamp_path) as stamp_file:
+            stamp = json.load(stamp_file)
+        if (
+            stamp.get("version") != SIDECAR_VERSION
+            or stamp.get("size") != size
+            or stamp.get("mtime_ns") != mtime_ns
+        ):
+            return None
+        values = np.load(values_path, mmap_mode="r")
+        flat_edges = np.load(edges_path)
+    except (OSError, ValueError):
+        return None
+    splits = np.cumsum(stamp["edge_lengths"])[:-1]
+    edges = tuple(_read_only(axis) for axis in np.split(flat_edges, splits))
+    return HistogramData(values, edges, stamp["name"])
+
+
+def _write_sidecar(path: str, size: int, mtime_ns: int, hist_name: str, data: HistogramData) -> None:
+    values_path, edges_path, stamp_path = sidecar_paths(path, hist_name)
+    stamp = {
+        "version": SIDECAR_VERSION,
+        "source": os.path.basename(path),
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "name": data.name,
+        "edge_lengths": [len(axis) for axis in data.edges],
+    }
+    try:
+        os.makedirs(os.path.dirname(values_path), exist_ok=True)
+        # El sello se escribe al final: sin sello válido el sidecar se ignora.
+        # Temporales por proceso e hilo: load_many puede pedir el mismo archivo dos veces
+        for target, array in ((values_path, data.values), (edges_path, np.concatenate(data.edges))):
+            tmp_path = f"{target}.tmp{os.getpid()}.{threading.get_ident()}"
+            with open(tmp_path, "wb") as tmp_file:
+                np.save(tmp_file, np.ascontiguousarray(array))
+            os.replace(tmp_path, target)
+        tmp_path = f"{stamp_path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "w") as tmp_file:
+            json.dump(stamp, tmp_file)
+        os.replace(tmp_path, stamp_path)
+    except OSError as exc:
+        warnings.warn(f"No se pudo escribir el sidecar de {path}: {exc}")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _load_cached(path: str, size: int, mtime_ns: int, hist_name: str, use_sidecar: bool) -> HistogramData:
+    """Sidecar si está al día, uproot si no; tamaño y mtime forman parte de la clave."""
+    if use_sidecar:
+        data = _read_sidecar(path, size, mtime_ns, hist_name)
+        if data is not None:
+            return data
+    data = _decode(path, hist_name)
+    if use_sidecar:
+        _write_sidecar(path, size, mtime_ns, hist_name, data)
+    return data
+
+
+def load_histogram(filepath: str, hist_name: str = DEFAULT_HIST, use_sidecar: bool = True) -> HistogramData:
+    """Devuelve valores y bordes del histograma, reutilizando lecturas previas.
+
+    La caché se invalida sola cuando el archivo cambia en disco (tamaño o
+    mtime). Los arrays devueltos son de solo lectura (memoria mapeada si
+    vienen del sidecar): copiar antes de modificarlos."""
+    path = os.path.abspath(filepath)
+    stat = os.stat(path)
+    return _load_cached(path, stat.st_size, stat.st_mtime_ns, hist_name, use_sidecar)
+
+
+def load_values(filepath: str, hist_name: str = DEFAULT_HIST, use_sidecar: bool = True) -> np.ndarray:
+    """Atajo para los scripts que solo necesitan el array de valores."""
+    return load_histogram(filepath, hist_name, use_sidecar).values
+
+
+def load_run_file(
+    filepath: str,
+    hist_names: Tuple[str, ...] = RUN_FILE_HISTS,
+    use_sidecar: bool = True,
+) -> Dict[str, HistogramData]:
+    """Lee varios histogramas de un mismo archivo con una sola apertura.
+
+    Pensado para el archivo único por run (`h20`, `h2_eDepPrimary`,
+    `h2_eDepSecondary` y `h10`). Los histogramas ausentes se omiten (sin
+    fallback); si no hay ninguno se lanza KeyError."""
+    path = os.path.abspath(filepath)
+    stat = os.stat(path)
+    found: Dict[str, HistogramData] = {}
+    pending = []
+    for name in hist_names:
+        data = _read_sidecar(path, stat.st_size, stat.st_mtime_ns, name) if use_sidecar else None
+        if data is None or data.name != name:
+            pending.append(name)
+        else:
+            found[name] = data
+    if pending:
+        import uproot
+
+        with uproot.open(path) as root_file:
+            for name in pending:
+                if name not in root_file:
+                    continue
+                found[name] = _decode_from(root_file, path, name, fallback=False)
+                if use_sidecar:
+                    _write_sidecar(path, stat.st_size, stat.st_mtime_ns, name, found[name])
+    if not found:
+        raise KeyError(f"Ninguno de {', '.join(hist_names)} está en {path}")
+    return {name: found[name] for name in hist_names if name in found}
+
+
+def load_many(
+    paths: Mapping[str, str],
+    hist_name: str = DEFAULT_HIST,
+    convert: Optional[Callable[[str, HistogramData], object]] = None,
+    max_workers: Optional[int] = None,
+) -> Tuple[Dict[str, object], Dict[str, Exception]]:
+    """Carga (y opcionalmente convierte) varios casos a la vez en un pool de hilos.
+
+    uproot libera el GIL al descomprimir, así que el tiempo total queda cerca
+    del archivo más lento. `convert(clave, histograma)` se ejecuta en el mismo
+    hilo que la carga. Un fallo no aborta el resto: se devuelve por caso en el
+    segundo diccionario."""
+    if not paths:
+        return {}, {}
+    workers = max_workers or min(len(paths), MAX_LOAD_WORKERS)
+
+    def task(key: str) -> object:
+        hist = load_histogram(paths[key], hist_name)
+        return convert(key, hist) if convert is not None else hist
+
+    results: Dict[str, object] = {}
+    errors: Dict[str, Exception] = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {key: pool.submit(task, key) for key in paths}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as exc:
+                errors[key] = exc
+    return results, errors
+
+
+def bin_centers(edges: np.ndarray) -> np.ndarray:
+    return 0.5 * (edges[:-1] + edges[1:])
+
+
+def clear_cache() -> None:
+    _load_cached.cache_clear()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Pirámide multirresolución de un mapa de dosis (medias por bloques), cacheada en disco.
+
+El nivel 0 es el mapa original y cada nivel siguiente promedia bloques de
+`PYRAMID_FACTOR` vóxeles por eje (2×2 en 2D, 2×2×2 en 3D; el último bloque
+de un eje impar promedia los que queden), hasta que el eje más largo tiene
+como mucho `MIN_LEVEL_SIZE` bins. Promediar en lugar de tomar uno de cada
+`step` vóxeles no repliega el ruido Monte Carlo en la figura.
+
+Los niveles se guardan en `.npycache/` junto al ROOT, con el mismo sello
+de tamaño y mtime del sidecar de `dose_loader`
+(`<archivo>.<hist>.pyr<k>.npy` + `<archivo>.<hist>.pyramid.json`). Se abren
+con `mmap_mode='r'`, así que quien dibuja (o un visor 3D) solo lee las
+páginas del nivel que usa. Los mapas 3D se reducen por bloques de filas del
+eje 0 y nunca se cargan enteros.
+
+`surface_points(ax)` da el presupuesto de puntos por eje de un panel según
+su tamaño en píxeles a la resolución de salida, y `surface_level` elige el
+nivel más fino que cabe."""
+
+import json
+import os
+import threading
+import warnings
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from dose_loader import DEFAULT_HIST, SIDECAR_DIR, load_histogram
+from tiled import TILE_VOXELS
+
+PYRAMID_FACTOR = 2
+MIN_LEVEL_SIZE = 8
+PYRAMID_VERSION = 1
+CACHE_SIZE = 16
+
+SURFACE_DPI = 300
+SURFACE_PIXELS_PER_QUAD = 20
+
+
+def _pool_block(values: np.ndarray, factor: int) -> np.ndarray:
+    out = np.asarray(values, dtype=np.float64)
+    for axis in range(out.ndim):
+        n = out.shape[axis]
+        if n <= 1:
+            continue
+        starts = np.arange(0, n, factor)
+        counts = np.diff(np.append(starts, n)).astype(np.float64)
+        shape = [1] * out.ndim
+        shape[axis] = -1
+        out = np.add.reduceat(out, starts, axis=axis) / counts.reshape(shape)
+    return out
+
+
+def mean_pool(values: np.ndarray, factor: int = PYRAMID_FACTOR, tile_voxels: int = TILE_VOXELS) -> np.ndarray:
+    """Media por bloques de `factor` bins en todos los ejes, leyendo por bloques de filas del eje 0."""
+    shape = values.shape
+    pooled_shape = tuple(-(-n // factor) for n in shape)
+    row_voxels = int(np.prod(shape[1:], dtype=np.int64))
+    rows = max(factor, tile_voxels // max(row_voxels, 1) // factor * factor)
+    if rows >= shape[0]:
+        return _pool_block(values, factor)
+    out = np.empty(pooled_shape, dtype=np.float64)
+    for start in range(0, shape[0], rows):
+        out[start // factor:(start + rows + factor - 1) // factor] = _pool_block(values[start:start + rows], factor)
+    return out
+
+
+def build_levels(values: np.ndarray, factor: int = PYRAMID_FACTOR, min_size: int = MIN_LEVEL_SIZE) -> List[np.ndarray]:
+    """Niveles 1.. de la pirámide (el 0 es `values`)."""
+    levels: List[np.ndarray] = []
+    current = values
+    while max(current.shape) > min_size:
+        current = mean_pool(current, factor)
+        levels.append(current)
+    return levels
+
+
+class Pyramid:
+    """Niveles de un mapa, del original (0) al más grueso."""
+
+    def __init__(self, levels: Sequence[np.ndarray]):
+        self.levels = list(levels)
+
+    @classmethod
+    def from_array(cls, values: np.ndarray, factor: int = PYRAMID_FACTOR, min_size: int = MIN_LEVEL_SIZE) -> "Pyramid":
+        return cls([values] + build_levels(values, factor, min_size))
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def level_for(self, max_points: int, axes: Sequence[int] = (0, 1)) -> int:
+        """Índice del nivel más fino con como mucho `max_points` bins en cada eje de `axes`."""
+        for index, level in enumerate(self.levels):
+            if max(level.shape[axis] for axis in axes) <= max_points:
+                return index
+        return len(self.levels) - 1
+
+    def at(self, max_points: int, axes: Sequence[int] = (0, 1)) -> np.ndarray:
+        return self.levels[self.level_for(max_points, axes)]
+
+
+def pyramid_paths(path: str, hist_name: str, level: int) -> Tuple[str, str]:
+    """Rutas (nivel, sello) de la pirámide de `hist_name` para `path`."""
+    directory, base = os.path.split(os.path.abspath(path))
+    prefix = os.path.join(directory, SIDECAR_DIR, f"{base}.{hist_name}")
+    return f"{prefix}.pyr{level}.npy", f"{prefix}.pyramid.json"
+
+
+def _read_levels(path: str, size: int, mtime_ns: int, hist_name: str) -> Optional[List[np.ndarray]]:
+    _, stamp_path = pyramid_paths(path, hist_name, 0)
+    try:
+        with open(stamp_path) as stamp_file:
+            stamp = json.load(stamp_file)
+        if (
+            stamp.get("version") != PYRAMID_VERSION
+            or stamp.get("size") != size
+            or stamp.get("mtime_ns") != mtime_ns
+        ):
+            return None
+        return [np.load(pyramid_paths(path, hist_name, k)[0], mmap_mode="r") for k in range(1, stamp["levels"] + 1)]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_levels(path: str, size: int, mtime_ns: int, hist_name: str, levels: List[np.ndarray]) -> None:
+    _, stamp_path = pyramid_paths(path, hist_name, 0)
+    stamp = {
+        "version": PYRAMID_VERSION,
+        "source": os.path.basename(path),
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "factor": PYRAMID_FACTOR,
+        "levels": len(levels),
+        "shapes": [list(level.shape) for level in levels],
+    }
+    suffix = f".tmp{os.getpid()}.{threading.get_ident()}"
+    try:
+        os.makedirs(os.path.dirname(stamp_path), exist_ok=True)
+        # Sello al final: sin sello válido la pirámide se reconstruye
+        for k, level in enumerate(levels, start=1):
+            target = pyramid_paths(path, hist_name, k)[0]
+            with open(target + suffix, "wb") as tmp_file:
+                np.save(tmp_file, level)
+            os.replace(target + suffix, target)
+        with open(stamp_path + suffix, "w") as tmp_file:
+            json.dump(stamp, tmp_file)
+        os.replace(stamp_path + suffix, stamp_path)
+    except OSError as exc:
+        warnings.warn(f"No se pudo escribir la pirámide de {path}: {exc}")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _load_cached(path: str, size: int, mtime_ns: int, hist_name: str) -> Pyramid:
+    base = load_histogram(path, hist_name).values
+    levels = _read_levels(path, size, mtime_ns, hist_name)
+    if levels is None:
+        levels = build_levels(base)
+        _write_levels(path, size, mtime_ns, hist_name, levels)
+        levels = _read_levels(path, size, mtime_ns, hist_name) or levels
+    return Pyramid([base] + levels)
+
+
+def load_pyramid(filepath: str, hist_name: str = DEFAULT_HIST) -> Pyramid:
+    """Pirámide de un histograma ROOT; se construye y guarda la primera vez, después se mapea."""
+    path = os.path.abspath(filepath)
+    stat = os.stat(path)
+    return _load_cached(path, stat.st_size, stat.st_mtime_ns, hist_name)
+
+
+def surface_points(ax, dpi: float = SURFACE_DPI, pixels_per_quad: float = SURFACE_PIXELS_PER_QUAD) -> int:
+    """Puntos por eje que caben en el panel `ax` a `dpi` con quads de `pixels_per_quad` píxeles."""
+    figure = ax.get_figure()
+    width_in, height_in = figure.get_size_inches()
+    box = ax.get_position()
+    pixels = max(box.width * width_in, box.height * height_in) * dpi
+    return max(2, int(pixels / pixels_per_quad))
+
+
+def surface_level(data: Union[Pyramid, np.ndarray], max_points: int) -> np.ndarray:
+    """Mapa reducido a como mucho `max_points` bins por eje (media por bloques).
+
+    Con una `Pyramid` se toma el nivel ya calculado; con un array se promedia
+    directamente con el bloque necesario."""
+    if isinstance(data, Pyramid):
+        return np.asarray(data.at(max_points))
+    factor = -(-max(data.shape[:2]) // max_points)
+    return np.asarray(data, dtype=np.float64) if factor <= 1 else mean_pool(data, factor)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Mapas de incertidumbre relativa por vóxel a partir de los momentos de G4StatDouble.
+
+Con la opción `stat` BrachyUserScoreWriter exporta, además de `sum_wx`
+(energía depositada total del vóxel), `sum_wx2` y el número de entradas,
+junto con el número de eventos N del run. Tratando cada evento como una
+muestra independiente (los eventos sin depósito cuentan como ceros):
+
+    var(media) = (sum_wx2 - sum_wx² / N) / (N (N - 1))
+    u_rel      = sqrt(var(media)) / (sum_wx / N)
+               = sqrt(sum_wx2 - sum_wx² / N) / sum_wx * sqrt(N / (N - 1))
+
+En ROOT los momentos van en `<h2>_sumwx2`, `<h2>_entries` y `<h2>_nevents`
+(p. ej. `h20_sumwx2`); en `.out`/`.bin` van en columnas/bloques extra. Los
+histogramas 2D suman los momentos de los vóxeles a lo largo de z, así que
+su incertidumbre solo es exacta con un único bin en z (malla TG186)."""
+
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from dose_loader import DEFAULT_HIST, load_run_file
+from score_reader import load_score
+
+SUM_WX2_SUFFIX = "_sumwx2"
+ENTRIES_SUFFIX = "_entries"
+EVENTS_SUFFIX = "_nevents"
+
+
+class UncertaintyMap(NamedTuple):
+    """Energía depositada (keV), incertidumbre relativa y entradas por vóxel."""
+
+    values: np.ndarray
+    relative: np.ndarray
+    entries: Optional[np.ndarray]
+    n_events: float
+    edges: Optional[Tuple[np.ndarray, ...]] = None
+
+
+def relative_uncertainty(sum_wx: np.ndarray, sum_wx2: np.ndarray, n_events: float) -> np.ndarray:
+    """Incertidumbre relativa (1σ) de la media por evento; NaN donde no hay depósito."""
+    if n_events is None or n_events < 2:
+        raise ValueError("Se necesitan al menos 2 eventos para estimar la incertidumbre")
+    sum_wx = np.asarray(sum_wx, dtype=np.float64)
+    sum_wx2 = np.asarray(sum_wx2, dtype=np.float64)
+    # Redondeo: sum_wx2 - sum_wx²/N puede salir ligeramente negativo
+    spread = np.maximum(sum_wx2 - sum_wx * sum_wx / n_events, 0.0)
+    relative = np.full(sum_wx.shape, np.nan)
+    np.divide(np.sqrt(spread), sum_wx, out=relative, where=sum_wx > 0)
+    return relative * np.sqrt(n_events / (n_events - 1.0))
+
+
+def load_uncertainty_root(filepath: str, hist_name: str = DEFAULT_HIST) -> UncertaintyMap:
+    """Lee `hist_name` y sus histogramas de momentos de un archivo ROOT del writer."""
+    names = (hist_name, hist_name + SUM_WX2_SUFFIX, hist_name + ENTRIES_SUFFIX, hist_name + EVENTS_SUFFIX)
+    hists = load_run_file(filepath, names)
+    missing = [name for name in names[:2] + names[3:] if name not in hists]
+    if missing:
+        raise KeyError(
+            f"Faltan {', '.join(missing)} en {filepath}: ¿se volcó con la opción 'stat'?"
+        )
+    n_events = float(np.sum(hists[names[3]].values))
+    values = hists[hist_name].values
+    entries = hists[names[2]].values if names[2] in hists else None
+    return UncertaintyMap(
+        values,
+        relative_uncertainty(values, hists[names[1]].values, n_events),
+        entries,
+        n_events,
+        hists[hist_name].edges,
+    )
+
+
+def load_uncertainty_dump(filepath: str, **kwargs) -> UncertaintyMap:
+    """Igual que `load_uncertainty_root` para volcados `.out`/`.bin` (rejilla 3D completa)."""
+    dump = load_score(filepath, **kwargs)
+    if dump.sum_wx2 is None or dump.n_events is None:
+        raise KeyError(f"{filepath} no contiene sum_wx2: ¿se volcó con la opción 'stat'?")
+    return UncertaintyMap(
+        dump.values,
+        relative_uncertainty(dump.values, dump.sum_wx2, dump.n_events),
+        dump.entries,
+        dump.n_events,
+    )
+
+
+def load_uncertainty(filepath: str, hist_name: str = DEFAULT_HIST) -> UncertaintyMap:
+    """Elige el lector según la extensión (`.root` o volcado del writer)."""
+    if filepath.endswith(".root"):
+        return load_uncertainty_root(filepath, hist_name)
+    return load_uncertainty_dump(filepath)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Acceso perezoso a volúmenes 3D de la malla de scoring.
+
+El writer puede exportar la malla completa de dos formas: el histograma
+`h30`/`h3_<scorer>` (opción `3d`) o el volcado binario `.bin` (opción
+`binary`). En ambos casos los valores quedan mapeados en memoria (el `.bin`
+directamente, el ROOT a través del sidecar `.npy` de `dose_loader`), de modo
+que pedir una lámina o una región de interés solo lee del disco las páginas
+que la contienen. Pensado para estudiar los cubos de heterogeneidad de
+6×6×6 cm sin cargar volúmenes enteros en RAM."""
+
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from dose_loader import bin_centers, load_histogram
+from score_reader import is_score_binary, open_score_binary, read_binary_header
+from tiled import TILE_VOXELS, TiledArray
+
+AXES = {"x": 0, "y": 1, "z": 2}
+VOLUME_HIST = "h30"
+
+
+class DoseVolume:
+    """Volumen (nx, ny, nz) con bordes en mm; las lecturas se hacen bajo demanda."""
+
+    def __init__(self, values: np.ndarray, edges: Sequence[np.ndarray], name: str = ""):
+        if values.ndim != 3 or len(edges) != 3:
+            raise ValueError("DoseVolume necesita un array 3D y tres ejes de bordes")
+        self.values = values
+        self.edges = tuple(np.asarray(e) for e in edges)
+        self.name = name
+
+    @classmethod
+    def open(cls, path: str, hist_name: str = VOLUME_HIST) -> "DoseVolume":
+        """Abre un `.bin` del writer o el histograma 3D de un archivo ROOT."""
+        if is_score_binary(path):
+            dump = open_score_binary(path)
+            header, _ = read_binary_header(path)
+            half_widths = [float(h) for h in header["halfwidth"].split()]
+            edges = [np.linspace(-h, h, n + 1) for h, n in zip(half_widths, dump.values.shape)]
+            return cls(dump.values, edges, dump.scorer_name)
+        hist = load_histogram(path, hist_name)
+        return cls(hist.values, hist.edges, hist.name)
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self.values.shape
+
+    def centers(self, axis: str) -> np.ndarray:
+        return bin_centers(self.edges[AXES[axis]])
+
+    def index_range(self, axis: str, lo_mm: Optional[float], hi_mm: Optional[float]) -> slice:
+        """Rango de índices de los vóxeles que solapan [lo_mm, hi_mm] en el eje dado."""
+        edges = self.edges[AXES[axis]]
+        start = 0 if lo_mm is None else max(int(np.searchsorted(edges, lo_mm, side="right")) - 1, 0)
+        stop = len(edges) - 1 if hi_mm is None else int(np.searchsorted(edges, hi_mm, side="left"))
+        return slice(start, max(stop, start))
+
+    def slab(self, axis: str, position_mm: float) -> np.ndarray:
+        """Lámina 2D que contiene `position_mm` (p. ej. `slab("z", 0.0)` para el plano XY)."""
+        index = AXES[axis]
+        edges = self.edges[index]
+        i = int(np.clip(np.searchsorted(edges, position_mm, side="right") - 1, 0, len(edges) - 2))
+        selector = [slice(None)] * 3
+        selector[index] = i
+        return np.array(self.values[tuple(selector)])
+
+    def region(
+        self,
+        x_mm: Tuple[Optional[float], Optional[float]] = (None, None),
+        y_mm: Tuple[Optional[float], Optional[float]] = (None, None),
+        z_mm: Tuple[Optional[float], Optional[float]] = (None, None),
+    ) -> "DoseVolume":
+        """Sub-volumen en memoria con los vóxeles que solapan la caja pedida (mm)."""
+        slices = tuple(
+            self.index_range(axis, *limits) for axis, limits in zip("xyz", (x_mm, y_mm, z_mm))
+        )
+        values = np.array(self.values[slices])
+        edges = [e[s.start : s.stop + 1] for e, s in zip(self.edges, slices)]
+        return DoseVolume(values, edges, self.name)
+
+    def box(self, center_mm: Sequence[float], size_mm: Sequence[float]) -> "DoseVolume":
+        """Región cúbica/rectangular centrada (p. ej. la heterogeneidad de 60 mm en x=40)."""
+        limits = [(c - s / 2.0, c + s / 2.0) for c, s in zip(center_mm, size_mm)]
+        return self.region(*limits)
+
+    def tiled(self, tile_voxels: int = TILE_VOXELS, max_workers: Optional[int] = None) -> TiledArray:
+        """Vista por tiles del volumen para conversiones y reducciones fuera de memoria."""
+        return TiledArray(self.values, tile_voxels, max_workers)
+
+    def projection_xy(self) -> np.ndarray:
+        """Suma sobre z, equivalente al `h20` que escribe el writer (leída tile a tile)."""
+        return self.tiled().sum(axis=2)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Histogramas dosis-volumen (diferencial y acumulado) por región en una pasada.
+
+Cada vóxel con etiqueta de región ≥ 0 (`MeshIndex.region`, capas, o
+cualquier array de enteros de la misma forma) cae en el bin (región, dosis)
+`etiqueta * n_bins + bin`; todas las regiones salen de un único
+`np.bincount` por bloque. Los volúmenes 3D se recorren en bloques de filas
+del eje 0 (`chunk_voxels` vóxeles), así que un `.bin` o un sidecar `.npy`
+mapeado en memoria nunca se lee entero.
+
+`convert(valores, selector)` permite pasar edep y convertir cada bloque al
+vuelo, p. ej. con `analyze_ir192_overview.edep_to_dose` y el trozo
+`density_map[selector]` del mapa de densidades."""
+
+from typing import Callable, Iterator, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from mesh_index import check_labels
+from tiled import TILE_VOXELS, iter_tiles
+
+DOSE_BINS = 1000
+CHUNK_VOXELS = TILE_VOXELS
+
+Convert = Callable[[np.ndarray, Tuple[slice, ...]], np.ndarray]
+
+
+class DVH(NamedTuple):
+    """Volumen (cm³) por región y bin de dosis; `dose_edges` en las unidades de la dosis."""
+
+    dose_edges: np.ndarray
+    differential: np.ndarray
+    voxel_volume_cm3: float
+    names: Tuple[str, ...]
+
+    @property
+    def total_volume(self) -> np.ndarray:
+        return self.differential.sum(axis=1)
+
+    def cumulative(self, relative: bool = True) -> np.ndarray:
+        """V(D ≥ dose_edges[i]) por región, en % del volumen de la región o en cm³."""
+        cumulative = np.cumsum(self.differential[:, ::-1], axis=1)[:, ::-1]
+        if not relative:
+            return cumulative
+        total = self.total_volume[:, None]
+        percent = np.zeros_like(cumulative)
+        np.divide(100.0 * cumulative, total, out=percent, where=total > 0)
+        return percent
+
+    def dose_at_volume(self, percent: float) -> np.ndarray:
+        """D_x: dosis mínima que recibe el x % más irradiado de cada región."""
+        covered = (self.cumulative() >= percent).sum(axis=1)
+        return self.dose_edges[np.maximum(covered - 1, 0)]
+
+    def volume_at_dose(self, dose: float, relative: bool = True) -> np.ndarray:
+        """V_d: volumen de cada región con dosis ≥ `dose`."""
+        i = int(np.clip(np.searchsorted(self.dose_edges, dose, side="right") - 1, 0, len(self.dose_edges) - 2))
+        return self.cumulative(relative)[:, i]
+
+
+def _dose_chunks(
+    values: np.ndarray, convert: Optional[Convert], chunk_voxels: int
+) -> Iterator[Tuple[Tuple[slice, ...], np.ndarray]]:
+    for selector in iter_tiles(values.shape, chunk_voxels):
+        chunk = np.asarray(values[selector], dtype=np.float64)
+        yield selector, convert(chunk, selector) if convert is not None else chunk
+
+
+def max_dose(values: np.ndarray, convert: Optional[Convert] = None, chunk_voxels: int = CHUNK_VOXELS) -> float:
+    """Dosis máxima recorriendo el volumen por bloques."""
+    return max((float(dose.max()) for _, dose in _dose_chunks(values, convert, chunk_voxels)), default=0.0)
+
+
+def compute_dvh(
+    values: np.ndarray,
+    labels: np.ndarray,
+    n_labels: Optional[int] = None,
+    dose_edges: Optional[np.ndarray] = None,
+    names: Optional[Sequence[str]] = None,
+    voxel_volume_cm3: float = 1.0,
+    convert: Optional[Convert] = None,
+    chunk_voxels: int = CHUNK_VOXELS,
+) -> DVH:
+    """DVH diferencial de todas las regiones.
+
+    Sin `dose_edges` se usan `DOSE_BINS` bins uniformes entre 0 y la dosis
+    máxima (una pasada previa por bloques). Las dosis por encima del último
+    borde van al último bin y las negativas al primero. Los vóxeles con
+    etiqueta -1 no cuentan; cualquier otra fuera de 0..n_labels-1 lanza
+    ValueError."""
+    if labels.shape != values.shape:
+        raise ValueError(f"Etiquetas {labels.shape} y valores {values.shape} no coinciden")
+    if n_labels is None:
+        n_labels = len(names) if names is not None else int(np.max(labels)) + 1
+    if dose_edges is None:
+        top = max_dose(values, convert, chunk_voxels)
+        dose_edges = np.linspace(0.0, top if top > 0 else 1.0, DOSE_BINS + 1)
+    dose_edges = np.asarray(dose_edges, dtype=np.float64)
+    n_bins = len(dose_edges) - 1
+
+    counts = np.zeros(n_labels * n_bins, dtype=np.int64)
+    for selector, dose in _dose_chunks(values, convert, chunk_voxels):
+        chunk_labels = np.asarray(labels[selector]).ravel()
+        # Por bloque, antes del bincount: una etiqueta ≥ n_labels alargaría `counts`
+        check_labels(chunk_labels, n_labels)
+        selected = chunk_labels >= 0
+        bins = np.clip(np.searchsorted(dose_edges, dose.ravel()[selected], side="right") - 1, 0, n_bins - 1)
+        counts += np.bincount(
+            chunk_labels[selected].astype(np.int64) * n_bins + bins, minlength=n_labels * n_bins
+        )
+    if names is None:
+        names = tuple(str(label) for label in range(n_labels))
+    differential = counts.reshape(n_labels, n_bins) * voxel_volume_cm3
+    return DVH(dose_edges, differential, float(voxel_volume_cm3), tuple(names))
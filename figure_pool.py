@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Render en paralelo de figuras independientes (procesos, backend Agg).
+
+Las figuras de 300 DPI con varios paneles tardan mucho más en dibujarse que
+en calcularse. Matplotlib no libera el GIL, así que cada figura va a un
+proceso distinto. Para no recargar ni reconvertir los datos en cada figura,
+el proceso principal carga los mapas una vez y los copia a bloques de
+`multiprocessing.shared_memory`. Los workers los adjuntan en su initializer
+como arrays de solo lectura, sin copiarlos ni serializarlos.
+
+Una tarea es un callable serializable que recibe el diccionario de mapas,
+p. ej. `functools.partial(render, base_path, "figura1")`. Cada una devuelve
+su tiempo y el PID del worker; si una falla, se informa y el resto sigue.
+
+    with SharedMaps(mapas) as shared:
+        timings, errors = render_figures(tareas, shared)"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+MAX_RENDER_WORKERS = 4
+RENDER_BACKEND = "Agg"
+
+Maps = Mapping[str, np.ndarray]
+FigureTask = Callable[[Maps], object]
+
+
+class SharedArray(NamedTuple):
+    """Descriptor serializable de un array en memoria compartida."""
+
+    block: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+class RenderTiming(NamedTuple):
+    figure: str
+    seconds: float
+    pid: int
+
+
+def map_key(filename: str, hist_name: str) -> str:
+    """Clave de un mapa cargado tal cual (`load_data`)."""
+    return f"{filename}:{hist_name}"
+
+
+def aligned_key(filenames: Sequence[str], hist_name: str) -> str:
+    """Clave de la pila (k, nx, ny) de mapas alineados (`load_aligned`); los bordes van en `<clave>:x` / `:y`."""
+    return f"{'|'.join(filenames)}:{hist_name}"
+
+
+class SharedMaps:
+    """Copia un diccionario de arrays a memoria compartida; los bloques se liberan al salir.
+
+    `maps` son vistas de solo lectura sobre los bloques para usarlas en este proceso."""
+
+    def __init__(self, arrays: Maps):
+        self.blocks: List[shared_memory.SharedMemory] = []
+        self.specs: Dict[str, SharedArray] = {}
+        self.maps: Dict[str, np.ndarray] = {}
+        try:
+            for key, array in arrays.items():
+                array = np.ascontiguousarray(array)
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                self.blocks.append(block)
+                view = np.ndarray(array.shape, array.dtype, buffer=block.buf)
+                view[...] = array
+                view.flags.writeable = False
+                self.maps[key] = view
+                self.specs[key] = SharedArray(block.name, array.shape, array.dtype.str)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        self.maps = {}
+        for block in self.blocks:
+            block.unlink()
+            try:
+                block.close()
+            except BufferError:
+                pass  # aún quedan vistas vivas; el bloque ya no tiene nombre y se libera con ellas
+        self.blocks = []
+
+    def __enter__(self) -> "SharedMaps":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def attach(specs: Mapping[str, SharedArray]) -> Tuple[Dict[str, np.ndarray], List[shared_memory.SharedMemory]]:
+    """Vistas de solo lectura sobre los bloques; hay que conservar los bloques mientras se usen."""
+    blocks, maps = [], {}
+    for key, spec in specs.items():
+        block = shared_memory.SharedMemory(name=spec.block)
+        blocks.append(block)
+        view = np.ndarray(spec.shape, np.dtype(spec.dtype), buffer=block.buf)
+        view.flags.writeable = False
+        maps[key] = view
+    return maps, blocks
+
+
+_worker_maps: Optional[Dict[str, np.ndarray]] = None
+_worker_blocks: List[shared_memory.SharedMemory] = []
+
+
+def _init_worker(specs: Mapping[str, SharedArray]) -> None:
+    import matplotlib.pyplot as plt
+
+    global _worker_maps, _worker_blocks
+    plt.switch_backend(RENDER_BACKEND)
+    _worker_maps, _worker_blocks = attach(specs)
+
+
+def _timed(name: str, task: FigureTask, maps: Maps) -> RenderTiming:
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    try:
+        task(maps)
+    finally:
+        plt.close("all")
+    return RenderTiming(name, time.perf_counter() - start, os.getpid())
+
+
+def _render(name: str, task: FigureTask) -> RenderTiming:
+    return _timed(name, task, _worker_maps)
+
+
+def render_figures(
+    tasks: Mapping[str, FigureTask], shared: SharedMaps, max_workers: Optional[int] = None
+) -> Tuple[Dict[str, RenderTiming], Dict[str, Exception]]:
+    """Ejecuta cada tarea en un worker con los mapas de `shared`; devuelve (tiempos, errores) por figura.
+
+    Con un solo worker todo se dibuja en este proceso sobre los mismos mapas compartidos."""
+    workers = max_workers or min(len(tasks), MAX_RENDER_WORKERS, os.cpu_count() or 1)
+    timings: Dict[str, RenderTiming] = {}
+    errors: Dict[str, Exception] = {}
+    if workers <= 1:
+        for name, task in tasks.items():
+            try:
+                timings[name] = _timed(name, task, shared.maps)
+            except Exception as exc:
+                errors[name] = exc
+        return timings, errors
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared.specs,)) as pool:
+        futures = {pool.submit(_render, name, task): name for name, task in tasks.items()}
+        for future in as_completed(futures):
+            try:
+                timings[futures[future]] = future.result()
+            except Exception as exc:
+                errors[futures[future]] = exc
+    return timings, errors
+
+
+def print_timings(timings: Mapping[str, RenderTiming], errors: Mapping[str, Exception], wall_seconds: float) -> None:
+    for timing in sorted(timings.values(), key=lambda t: t.seconds, reverse=True):
+        print(f"  ⏱ {timing.figure}: {timing.seconds:.1f} s (pid {timing.pid})")
+    for name, exc in errors.items():
+        print(f"  ⚠️ {name}: {exc}")
+    total = sum(t.seconds for t in timings.values())
+    print(f"  Render: {wall_seconds:.1f} s de reloj para {total:.1f} s de figuras")
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Índice gamma (diferencia de dosis / distancia de acuerdo) entre dos mapas 2D o 3D.
+
+Para cada vóxel de referencia por encima del umbral de dosis baja,
+
+    Γ² = min_k ( |Δr_k|² / DTA² + (D_eval(r + Δr_k) - D_ref(r))² / ΔD² )
+
+donde Δr_k recorre los desplazamientos enteros de la ventana de búsqueda
+(`search_mm`, por defecto `MAX_GAMMA` × DTA). Los desplazamientos se
+ordenan por distancia y se evalúan por lotes, cada lote como un único array
+(lote, tile) contra el tile de referencia; en cuanto la distancia del lote
+supera el Γ² máximo del tile ya ningún desplazamiento puede mejorar y se
+termina. Los tiles (bloques de filas del eje 0, con un halo del tamaño de la
+ventana) se reparten en un pool de procesos.
+
+La búsqueda es a resolución de vóxel: con las mallas de 1 mm de las macros
+y DTA de 2-3 mm es suficiente; para DTA del orden del bin conviene una
+malla más fina. Los mapas se llevan a su rejilla común con `grid_align`."""
+
+import argparse
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dose_loader import DEFAULT_HIST, load_histogram
+from grid_align import align_maps
+
+DOSE_PERCENT = 3.0
+DTA_MM = 3.0
+CUTOFF_PERCENT = 10.0
+MAX_GAMMA = 2.0  # la ventana de búsqueda por defecto es MAX_GAMMA × DTA
+TILE_ROWS = 32
+OFFSET_BATCH = 16
+MAX_GAMMA_WORKERS = 8
+
+
+class GammaResult(NamedTuple):
+    """Mapa gamma (NaN fuera de los vóxeles evaluados) y tasa de paso (Γ ≤ 1)."""
+
+    gamma: np.ndarray
+    evaluated: np.ndarray
+    pass_rate: float
+    dose_percent: float
+    dta_mm: float
+    local: bool
+
+    @property
+    def n_evaluated(self) -> int:
+        return int(self.evaluated.sum())
+
+
+def search_offsets(
+    spacing_mm: Sequence[float], search_mm: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Desplazamientos enteros (K, ndim) dentro de la esfera de búsqueda y su distancia² en mm².
+
+    Ordenados por distancia creciente; el primero es el desplazamiento nulo."""
+    spacing = np.asarray(spacing_mm, dtype=np.float64)
+    reach = [int(math.floor(search_mm / step)) for step in spacing]
+    grids = np.meshgrid(*[np.arange(-n, n + 1) for n in reach], indexing="ij")
+    offsets = np.stack([grid.ravel() for grid in grids], axis=1)
+    dist2 = ((offsets * spacing) ** 2).sum(axis=1)
+    inside = dist2 <= search_mm * search_mm * (1.0 + 1e-12)
+    order = np.argsort(dist2[inside], kind="stable")
+    return offsets[inside][order], dist2[inside][order]
+
+
+def _gamma_tile(
+    reference: np.ndarray,
+    evaluated: np.ndarray,
+    selected: np.ndarray,
+    dose_tolerance: np.ndarray,
+    offsets: np.ndarray,
+    dist2: np.ndarray,
+    dta_mm: float,
+    halo: Sequence[int],
+) -> np.ndarray:
+    """Γ² de un tile. `evaluated` trae `halo` vóxeles extra por cada lado (inf fuera del mapa)."""
+    gamma2 = np.full(reference.shape, np.inf)
+    if not selected.any():
+        return gamma2
+    ref = reference[selected]
+    inv_dose2 = 1.0 / np.square(dose_tolerance[selected] if np.ndim(dose_tolerance) else dose_tolerance)
+    best = np.full(ref.shape, np.inf)
+    distance_term = dist2 / (dta_mm * dta_mm)
+    shape = reference.shape
+
+    for start in range(0, len(offsets), OFFSET_BATCH):
+        # Los desplazamientos están ordenados: si la distancia ya supera el peor Γ², se termina
+        if distance_term[start] >= best.max():
+            break
+        batch = offsets[start : start + OFFSET_BATCH]
+        shifted = np.stack([
+            evaluated[tuple(slice(h + o, h + o + n) for h, o, n in zip(halo, offset, shape))][selected]
+            for offset in batch
+        ])
+        candidates = distance_term[start : start + len(batch), None] + np.square(shifted - ref) * inv_dose2
+        np.minimum(best, candidates.min(axis=0), out=best)
+    gamma2[selected] = best
+    return gamma2
+
+
+def _tile_task(args: tuple) -> Tuple[int, np.ndarray]:
+    row, *rest = args
+    return row, _gamma_tile(*rest)
+
+
+def gamma_index(
+    reference: np.ndarray,
+    evaluated: np.ndarray,
+    spacing_mm: Sequence[float],
+    dose_percent: float = DOSE_PERCENT,
+    dta_mm: float = DTA_MM,
+    cutoff_percent: float = CUTOFF_PERCENT,
+    local: bool = False,
+    search_mm: Optional[float] = None,
+    tile_rows: int = TILE_ROWS,
+    max_workers: Optional[int] = None,
+) -> GammaResult:
+    """Gamma de `evaluated` respecto a `reference` (mismos bordes, 2D o 3D).
+
+    Criterio global (ΔD = % del máximo de la referencia) o local (% de la
+    dosis de cada vóxel). Solo se evalúan los vóxeles con dosis de referencia
+    ≥ `cutoff_percent` % del máximo. Los valores por encima de
+    `search_mm / dta_mm` son cotas inferiores (no se busca más lejos)."""
+    reference = np.asarray(reference, dtype=np.float64)
+    evaluated = np.asarray(evaluated, dtype=np.float64)
+    if reference.shape != evaluated.shape:
+        raise ValueError(f"Formas distintas: {reference.shape} y {evaluated.shape}")
+    if len(spacing_mm) != reference.ndim:
+        raise ValueError("Se necesita un paso por eje")
+    if search_mm is None:
+        search_mm = MAX_GAMMA * dta_mm
+
+    ref_max = float(reference.max())
+    if ref_max <= 0:
+        raise ValueError("La referencia no tiene dosis")
+    selected = reference >= cutoff_percent / 100.0 * ref_max
+    if local:
+        dose_tolerance = dose_percent / 100.0 * reference
+    else:
+        dose_tolerance = np.float64(dose_percent / 100.0 * ref_max)
+
+    offsets, dist2 = search_offsets(spacing_mm, search_mm)
+    halo = tuple(int(np.abs(offsets[:, axis]).max()) for axis in range(reference.ndim))
+    padded = np.pad(evaluated, [(h, h) for h in halo], mode="constant", constant_values=np.inf)
+
+    tasks: List[tuple] = []
+    for row in range(0, reference.shape[0], tile_rows):
+        rows = slice(row, row + tile_rows)
+        n_rows = len(range(*rows.indices(reference.shape[0])))
+        tasks.append((
+            row,
+            reference[rows],
+            padded[row : row + n_rows + 2 * halo[0]],
+            selected[rows],
+            dose_tolerance[rows] if local else dose_tolerance,
+            offsets,
+            dist2,
+            dta_mm,
+            halo,
+        ))
+
+    gamma2 = np.empty(reference.shape)
+    workers = max_workers or min(len(tasks), MAX_GAMMA_WORKERS)
+    if workers <= 1:
+        results = map(_tile_task, tasks)
+        for row, tile in results:
+            gamma2[row : row + len(tile)] = tile
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for row, tile in pool.map(_tile_task, tasks):
+                gamma2[row : row + len(tile)] = tile
+
+    gamma = np.sqrt(gamma2)
+    gamma[~selected] = np.nan
+    n_selected = int(selected.sum())
+    pass_rate = float((gamma[selected] <= 1.0).sum()) / n_selected if n_selected else float("nan")
+    return GammaResult(gamma, selected, pass_rate, dose_percent, dta_mm, local)
+
+
+def gamma_from_files(
+    reference_path: str, evaluated_path: str, hist_name: str = DEFAULT_HIST, **kwargs
+) -> Tuple[GammaResult, List[np.ndarray]]:
+    """Gamma entre dos archivos ROOT del writer; devuelve también los bordes comunes."""
+    reference = load_histogram(reference_path, hist_name)
+    evaluated = load_histogram(evaluated_path, hist_name)
+    (ref_values, eval_values), edges = align_maps(
+        [(reference.values, reference.edges), (evaluated.values, evaluated.edges)]
+    )
+    spacing = [float(axis_edges[1] - axis_edges[0]) for axis_edges in edges]
+    return gamma_index(ref_values, eval_values, spacing, **kwargs), edges
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Índice gamma entre dos mapas h20")
+    parser.add_argument("reference", help="archivo ROOT de referencia (p. ej. agua)")
+    parser.add_argument("evaluated", help="archivo ROOT a evaluar")
+    parser.add_argument("--hist", default=DEFAULT_HIST)
+    parser.add_argument("--dose", type=float, default=DOSE_PERCENT, help="criterio de dosis (%%)")
+    parser.add_argument("--dta", type=float, default=DTA_MM, help="distancia de acuerdo (mm)")
+    parser.add_argument("--cutoff", type=float, default=CUTOFF_PERCENT, help="umbral de dosis baja (%%)")
+    parser.add_argument("--local", action="store_true", help="normalización local en lugar de global")
+    parser.add_argument("--workers", type=int, help="procesos (por defecto hasta %d)" % MAX_GAMMA_WORKERS)
+    parser.add_argument("-o", "--output", help="guardar el mapa gamma en .npy")
+    args = parser.parse_args()
+
+    result, _ = gamma_from_files(
+        args.reference,
+        args.evaluated,
+        args.hist,
+        dose_percent=args.dose,
+        dta_mm=args.dta,
+        cutoff_percent=args.cutoff,
+        local=args.local,
+        max_workers=args.workers,
+    )
+    mode = "local" if result.local else "global"
+    print(f"Gamma {result.dose_percent:g}%/{result.dta_mm:g} mm ({mode}), umbral {args.cutoff:g}%")
+    print(f"  Vóxeles evaluados: {result.n_evaluated}")
+    print(f"  Tasa de paso (Γ ≤ 1): {100.0 * result.pass_rate:.2f}%")
+    print(f"  Γ medio: {np.nanmean(result.gamma):.3f}   Γ máx: {np.nanmax(result.gamma):.3f}")
+    if args.output:
+        np.save(args.output, result.gamma)
+        print(f"Mapa gamma guardado en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Alineado exacto de mapas con rejillas distintas (recorte y rebin conservativo).
+
+Sustituye a `scipy.ndimage.zoom`, que interpolaba el mapa entero y
+suavizaba el ruido Monte Carlo. Dos rejillas uniformes solo se consideran
+compatibles si sus bordes coinciden: mismo paso con desplazamiento entero
+(recorte, que devuelve una vista) o un paso múltiplo entero del otro (rebin
+sumando bloques de k×k bins, que conserva la energía total). Cualquier otro
+caso lanza `GridMismatchError` en lugar de resamplear."""
+
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+EDGE_TOLERANCE = 1e-6  # fracción del paso
+
+
+class GridMismatchError(ValueError):
+    """Las rejillas no se pueden alinear sin interpolar."""
+
+
+def _uniform_step(edges: np.ndarray) -> float:
+    steps = np.diff(edges)
+    step = steps.mean()
+    if not np.allclose(steps, step, rtol=0.0, atol=EDGE_TOLERANCE * abs(step)):
+        raise GridMismatchError("Solo se alinean rejillas de paso uniforme")
+    return float(step)
+
+
+def _as_integer(value: float, what: str) -> int:
+    rounded = int(round(value))
+    if abs(value - rounded) > EDGE_TOLERANCE * max(1.0, abs(value)):
+        raise GridMismatchError(f"{what} no es entero ({value:.6g})")
+    return rounded
+
+
+def axis_plan(source_edges: np.ndarray, target_edges: np.ndarray) -> Tuple[int, int, int]:
+    """(primer bin, nº de bins destino, factor) para pasar de un eje al otro."""
+    source_edges = np.asarray(source_edges, dtype=np.float64)
+    target_edges = np.asarray(target_edges, dtype=np.float64)
+    source_step = _uniform_step(source_edges)
+    target_step = _uniform_step(target_edges)
+
+    if target_step < source_step * (1.0 - EDGE_TOLERANCE):
+        raise GridMismatchError(
+            f"La rejilla destino ({target_step:g} mm) es más fina que la original ({source_step:g} mm)"
+        )
+    factor = _as_integer(target_step / source_step, "El cociente de pasos")
+    start = _as_integer((target_edges[0] - source_edges[0]) / source_step, "El desplazamiento entre bordes")
+    count = len(target_edges) - 1
+    if start < 0 or start + count * factor > len(source_edges) - 1:
+        raise GridMismatchError("La rejilla destino se sale del rango de la original")
+    return start, count, factor
+
+
+def align_to(
+    values: np.ndarray, edges: Sequence[np.ndarray], target_edges: Sequence[np.ndarray]
+) -> np.ndarray:
+    """Lleva `values` a la rejilla `target_edges` sin interpolar.
+
+    Si todos los ejes tienen factor 1 el resultado es una vista (recorte);
+    si no, cada bloque de bins se suma (rebin conservativo)."""
+    if len(edges) != values.ndim or len(target_edges) != values.ndim:
+        raise GridMismatchError("Número de ejes inconsistente")
+    plans = [axis_plan(source, target) for source, target in zip(edges, target_edges)]
+
+    cropped = values[tuple(slice(start, start + count * factor) for start, count, factor in plans)]
+    if all(factor == 1 for _, _, factor in plans):
+        return cropped
+    # (n0, k0, n1, k1, ...) y suma sobre los ejes de bloque
+    blocked_shape = [size for _, count, factor in plans for size in (count, factor)]
+    return cropped.reshape(blocked_shape).sum(axis=tuple(range(1, 2 * values.ndim, 2)))
+
+
+def common_edges(edge_sets: Sequence[Sequence[np.ndarray]]) -> List[np.ndarray]:
+    """Rejilla común: la del mapa más grueso, recortada al solape de todos los rangos."""
+    common = []
+    for axis_edges in zip(*edge_sets):
+        axis_edges = [np.asarray(edges, dtype=np.float64) for edges in axis_edges]
+        coarsest = max(axis_edges, key=_uniform_step)
+        step = _uniform_step(coarsest)
+        lo = max(edges[0] for edges in axis_edges)
+        hi = min(edges[-1] for edges in axis_edges)
+        tolerance = EDGE_TOLERANCE * step
+        selected = coarsest[(coarsest >= lo - tolerance) & (coarsest <= hi + tolerance)]
+        if len(selected) < 2:
+            raise GridMismatchError("Las rejillas no se solapan")
+        common.append(selected)
+    return common
+
+
+def align_maps(
+    maps: Sequence[Tuple[np.ndarray, Sequence[np.ndarray]]]
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Alinea varios (valores, bordes) en su rejilla común; devuelve (mapas, bordes)."""
+    target = common_edges([edges for _, edges in maps])
+    return [align_to(values, edges, target) for values, edges in maps], target
@@ -0,0 +1,75 @@
+//
+// ********************************************************************
+// * License and Disclaimer                                           *
+// *                                                                  *
+// * The  Geant4 software  is  copyright of the Copyright Holders  of *
+// * the Geant4 Collaboration.  It is provided  under  the terms  and *
+// * conditions of the Geant4 Software License,  included in the file *
+// * LICENSE and available at  http://cern.ch/geant4/license .  These *
+// * include a list of copyright holders.                             *
+// *                                                                  *
+// * Neither the authors of this software system, nor their employing *
+// * institutes,nor the agencies providing financial support for this *
+// * work  make  any representation or  warranty, express or implied, *
+// * regarding  this  software system or assume any liability for its *
+// * use.  Please see the license in the file  LICENSE  and URL above *
+// * for the full disclaimer and the limitation of liability.         *
+// *                                                                  *
+// * This  code  implementation is the result of  the  scientific and *
+// * technical work of the GEANT4 collaboration.                      *
+// * By using,  copying,  modifying or  distributing the software (or *
+// * any work based  on the software)  you  agree  to acknowledge its *
+// * use  in  resulting  scientific  publications,  and indicate your *
+// * acceptance of all terms of the Geant4 Software license.          *
+// ********************************************************************
+//
+//
+//
+//
+#ifndef BrachyConvergenceControl_h
+#define BrachyConvergenceControl_h 1
+
+#include "G4ThreeVector.hh"
+#include "G4SystemOfUnits.hh"
+#include "globals.hh"
+
+class BrachyRunAction;
+class G4VScoringMesh;
+
+// Convergence-driven run: /run/beamOn is split into batches and, after
+// each batch, the relative statistical uncertainty of a scorer of a
+// scoring mesh is evaluated for the voxels whose centre lies inside a box
+// region (by default a 2 mm box around the 1 cm reference point). The run stops as soon as the worst voxel of
+// the region reaches the target or the event budget is spent.
+// Master thread only.
+class BrachyConvergenceControl
+{
+public:
+  explicit BrachyConvergenceControl(BrachyRunAction* runAction);
+  ~BrachyConvergenceControl() = default;
+
+  void SetMeshName(const G4String& name) { fMeshName = name; }
+  void SetScorerName(const G4String& name) { fScorerName = name; }
+  void SetTargetUncertainty(G4double value) { fTargetUncertainty = value; }
+  void SetRegionCenter(const G4ThreeVector& center) { fRegionCenter = center; }
+  void SetRegionHalfSize(const G4ThreeVector& halfSize) { fRegionHalfSize = halfSize; }
+
+  // Runs batches of batchEvents until convergence or maxEvents in total
+  void BeamOn(G4int maxEvents, G4int batchEvents);
+
+  // Largest relative uncertainty (1 sigma of the mean per event) among
+  // the region voxels after numberOfEvents events; negative if it cannot
+  // be evaluated yet, DBL_MAX if a region voxel has no deposit
+  G4double EvaluateRegionUncertainty(G4double numberOfEvents) const;
+
+private:
+  G4VScoringMesh* FindMesh() const;
+
+  BrachyRunAction* fRunAction = nullptr;
+  G4String fMeshName = "";
+  G4String fScorerName = "eDep";
+  G4double fTargetUncertainty = 0.01;
+  G4ThreeVector fRegionCenter = G4ThreeVector(10.*CLHEP::mm, 0., 0.);
+  G4ThreeVector fRegionHalfSize = G4ThreeVector(1.*CLHEP::mm, 1.*CLHEP::mm, 1.*CLHEP::mm);
+};
+#endif
@@ -67,6 +67,15 @@ public:
   void SetHeterogeneityPosition(const G4ThreeVector& position);
   G4bool IsHeterogeneityEnabled() const { return fHeterogeneityEnabled; }
 
+  // Current configuration, exported with the run output (provenance)
+  G4String GetSourceName() const;
+  G4Material* GetPhantomMaterial() const;
+  G4ThreeVector GetPhantomHalfSize() const
+  { return G4ThreeVector(fPhantomSizeX, fPhantomSizeY, fPhantomSizeZ); }
+  G4Material* GetHeterogeneityMaterial() const;
+  G4ThreeVector GetHeterogeneityHalfLengths() const { return fHeterogeneityHalfLengths; }
+  G4ThreeVector GetHeterogeneityPosition() const { return fHeterogeneityPosition; }
+
 private:
   BrachyFactory* fFactory;
   BrachyDetectorMessenger* fDetectorMessenger;   
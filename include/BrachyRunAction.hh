@@ -31,23 +31,67 @@
 
 #include "G4UserRunAction.hh"
 #include "G4RunManager.hh"
+#include "G4Timer.hh"
 #include "globals.hh"
 
+#include <vector>
+
+class BrachyConvergenceControl;
 class BrachyRunMessenger;
 class G4Run;
 
 class BrachyRunAction : public G4UserRunAction
 {
 public:
-  explicit BrachyRunAction()=default;
-  ~BrachyRunAction() override =default;
+  explicit BrachyRunAction();
+  ~BrachyRunAction() override;
 
 public:
   void BeginOfRunAction(const G4Run*) override;
   void EndOfRunAction(const G4Run*) override;
 
+  // One ROOT file per run: the master keeps the file open at the end of
+  // the run so that /score/dumpAllQuantitiesToFile adds the scorers to it
+  void SetSingleOutputFile(G4bool value) { fSingleOutputFile = value; }
+  G4bool IsSingleOutputFile() const { return fSingleOutputFile; }
+
+  BrachyConvergenceControl* GetConvergenceControl() const { return fConvergenceControl; }
+
+  // Convergence-controlled runs are split into batches (one G4Run each):
+  // the batches after the first continue the output file opened by the
+  // first one, which is closed by CloseBatchedOutput() at the end
+  static void SetBatchState(G4bool batched, G4bool continued)
+  { fgBatchedRun = batched; fgContinuedBatch = continued; }
+  void CloseBatchedOutput();
+
+  // Events accumulated in the scoring meshes (they are not reset between
+  // runs), used by the score writer to export the number of events
+  static G4double GetScoredEvents() { return fgScoredEvents; }
+  static void ResetScoredEvents() { fgScoredEvents = 0.; }
+
+  // Provenance sidecar: <file>.json next to each ROOT file with the
+  // configuration of the last run (events, threads, source, materials,
+  // heterogeneity, scoring meshes, timing) and the histograms the file
+  // holds, each as HistogramEntry(name, {lo, hi, nbins, ...per axis})
+  static void WriteProvenance(const G4String& rootFileName,
+                              const std::vector<G4String>& histograms);
+  static G4String HistogramEntry(const G4String& name,
+                                 const std::vector<G4double>& axes);
+
 private:
   void ConfigureDoseFilters() const;
+  void RecordProvenance(const G4Run*);
+
+  BrachyRunMessenger* fRunMessenger = nullptr;
+  BrachyConvergenceControl* fConvergenceControl = nullptr;
+  G4bool fSingleOutputFile = false;
+  G4String fOutputFileName;
+  G4Timer fTimer;
+
+  static G4bool fgBatchedRun;
+  static G4bool fgContinuedBatch;
+  static G4double fgScoredEvents;
+  static G4String fgProvenance;
 };
 #endif
 
@@ -0,0 +1,70 @@
+//
+// ********************************************************************
+// * License and Disclaimer                                           *
+// *                                                                  *
+// * The  Geant4 software  is  copyright of the Copyright Holders  of *
+// * the Geant4 Collaboration.  It is provided  under  the terms  and *
+// * conditions of the Geant4 Software License,  included in the file *
+// * LICENSE and available at  http://cern.ch/geant4/license .  These *
+// * include a list of copyright holders.                             *
+// *                                                                  *
+// * Neither the authors of this software system, nor their employing *
+// * institutes,nor the agencies providing financial support for this *
+// * work  make  any representation or  warranty, express or implied, *
+// * regarding  this  software system or assume any liability for its *
+// * use.  Please see the license in the file  LICENSE  and URL above *
+// * for the full disclaimer and the limitation of liability.         *
+// *                                                                  *
+// * This  code  implementation is the result of  the  scientific and *
+// * technical work of the GEANT4 collaboration.                      *
+// * By using,  copying,  modifying or  distributing the software (or *
+// * any work based  on the software)  you  agree  to acknowledge its *
+// * use  in  resulting  scientific  publications,  and indicate your *
+// * acceptance of all terms of the Geant4 Software license.          *
+// ********************************************************************
+//
+//
+//
+#ifndef BrachyRunMessenger_h
+#define BrachyRunMessenger_h 1
+
+#include "G4UImessenger.hh"
+#include "globals.hh"
+
+class BrachyRunAction;
+class G4UIcommand;
+class G4UIdirectory;
+class G4UIcmdWithABool;
+class G4UIcmdWithADouble;
+class G4UIcmdWithAString;
+class G4UIcmdWith3VectorAndUnit;
+
+// Commands controlling the run output:
+// /brachy/output/singleFile true  -> one ROOT file per run holding the
+//                                    spectrum (h10) and every scorer dumped
+//                                    with /score/dumpAllQuantitiesToFile
+// and the convergence-controlled runs (BrachyConvergenceControl):
+// /brachy/convergence/{mesh,scorer,target,regionCenter,regionHalfSize}
+// /brachy/convergence/beamOn <maxEvents> <batchEvents>
+class BrachyRunMessenger: public G4UImessenger
+{
+public:
+  explicit BrachyRunMessenger(BrachyRunAction* );
+  ~BrachyRunMessenger() override;
+
+  void SetNewValue(G4UIcommand*, G4String) override;
+
+private:
+  BrachyRunAction*      fRunAction;
+  G4UIdirectory*        fBrachyDir;
+  G4UIdirectory*        fOutputDir;
+  G4UIcmdWithABool*     fSingleFileCmd;
+  G4UIdirectory*        fConvergenceDir;
+  G4UIcmdWithAString*   fMeshCmd;
+  G4UIcmdWithAString*   fScorerCmd;
+  G4UIcmdWithADouble*   fTargetCmd;
+  G4UIcmdWith3VectorAndUnit* fRegionCenterCmd;
+  G4UIcmdWith3VectorAndUnit* fRegionHalfSizeCmd;
+  G4UIcommand*          fBeamOnCmd;
+};
+#endif
@@ -29,6 +29,7 @@
 
 #include "globals.hh"
 #include "G4VScoreWriter.hh"
+#include <vector>
 /*
 // Code developed by:
 // S.Guatelli, susanna@uow.edu.au
@@ -46,6 +47,15 @@ public:
   void DumpQuantityToFile(const G4String & psName, 
                           const G4String & fileName, 
                           const G4String & option) override;
+  // store all the quantities of the mesh into a single ROOT file
+  void DumpAllQuantitiesToFile(const G4String & fileName, 
+                               const G4String & option) override;
+
+private:
+  // true while DumpAllQuantitiesToFile owns the ROOT file
+  G4bool fSingleRootFile = false;
+  // histograms of the current ROOT file, for its provenance sidecar
+  std::vector<G4String> fFileHistograms;
 };
 #endif
 
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Suma de las salidas de varios jobs de un mismo escenario (equivalente a `hadd`).
+
+Cada job de una campaña escribe su propio `brachytherapy_<ts>.root`. Este
+script suma `h20`, `h2_eDepPrimary` y `h2_eDepSecondary` (y, si están, los
+momentos `_sumwx2`/`_entries`/`_nevents` de la opción `stat`, que también
+son aditivos) sobre un acumulador en float64. Las lecturas van en un pool de
+hilos con un número acotado de archivos en vuelo, de modo que en memoria
+solo hay el acumulador y los mapas que se están leyendo, y el tiempo total
+lo marca el disco y no la suma.
+
+Todos los archivos deben tener exactamente el mismo binning que el primero;
+un archivo incompatible o ilegible se descarta entero y se informa. El
+número total de eventos se guarda en el sello JSON `<salida>.merge.json`
+junto con la lista de archivos sumados: por archivo se toma `events` de su
+sidecar de procedencia (`provenance`) o, si no lo tiene, la suma de
+`_nevents`. Si el primer job tiene sidecar, la salida recibe también el suyo
+(`<salida>.json`) con ese total en `events`, para que `load_provenance`, la
+normalización y el catálogo traten la suma como un run más."""
+
+import argparse
+import glob
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dose_loader import MAX_LOAD_WORKERS, RUN_FILE_HISTS, HistogramData, load_run_file
+from dose_uncertainty import ENTRIES_SUFFIX, EVENTS_SUFFIX, SUM_WX2_SUFFIX
+from provenance import load_provenance, provenance_path
+
+MERGE_HISTS = RUN_FILE_HISTS[:3]
+MOMENT_SUFFIXES = (SUM_WX2_SUFFIX, ENTRIES_SUFFIX, EVENTS_SUFFIX)
+
+
+class BinningMismatchError(ValueError):
+    """El archivo no tiene los mismos histogramas o bordes que el primero."""
+
+
+class MergeResult(NamedTuple):
+    """Histogramas sumados, archivos incluidos y eventos totales (None si algún archivo no los da)."""
+
+    hists: Dict[str, HistogramData]
+    paths: Tuple[str, ...]
+    n_events: Optional[float]
+
+
+def merge_names(hist_names: Sequence[str], include_moments: bool = True) -> Tuple[str, ...]:
+    if not include_moments:
+        return tuple(hist_names)
+    return tuple(hist_names) + tuple(name + suffix for name in hist_names for suffix in MOMENT_SUFFIXES)
+
+
+def file_events(hists: Dict[str, HistogramData]) -> Optional[float]:
+    """Eventos del run según el primer `<h>_nevents` (H1 llenado con peso N)."""
+    for name, hist in hists.items():
+        if name.endswith(EVENTS_SUFFIX):
+            return float(np.sum(hist.values))
+    return None
+
+
+def sidecar_events(path: str) -> Optional[float]:
+    """`events` del sidecar de procedencia del job (None sin sidecar o si no se puede leer)."""
+    try:
+        provenance = load_provenance(path)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if provenance is None or provenance.events is None:
+        return None
+    return float(provenance.events)
+
+
+class _Accumulator:
+    """Suma corriente; el primer archivo fija los histogramas y sus bordes."""
+
+    def __init__(self):
+        self.edges: Dict[str, Tuple[np.ndarray, ...]] = {}
+        self.sums: Dict[str, np.ndarray] = {}
+        self.paths: List[str] = []
+        self.n_events: Optional[float] = 0.0
+
+    def check(self, path: str, hists: Dict[str, HistogramData]) -> None:
+        if not self.sums:
+            return
+        if set(hists) != set(self.sums):
+            raise BinningMismatchError(
+                f"{path}: histogramas {sorted(hists)} distintos de los del primer archivo {sorted(self.sums)}"
+            )
+        for name, hist in hists.items():
+            if len(hist.edges) != len(self.edges[name]) or any(
+                not np.array_equal(a, b) for a, b in zip(hist.edges, self.edges[name])
+            ):
+                raise BinningMismatchError(f"{path}: el binning de {name} no coincide")
+
+    def add(self, path: str, hists: Dict[str, HistogramData], events: Optional[float] = None) -> None:
+        self.check(path, hists)
+        for name, hist in hists.items():
+            if name in self.sums:
+                self.sums[name] += hist.values
+            else:
+                self.sums[name] = np.array(hist.values, dtype=np.float64)
+                self.edges[name] = tuple(np.array(axis) for axis in hist.edges)
+        if events is None:
+            events = file_events(hists)
+        self.n_events = None if events is None or self.n_events is None else self.n_events + events
+        self.paths.append(path)
+
+
+def merge_files(
+    paths: Sequence[str],
+    hist_names: Sequence[str] = MERGE_HISTS,
+    include_moments: bool = True,
+    max_workers: Optional[int] = None,
+) -> Tuple[MergeResult, Dict[str, Exception]]:
+    """Suma los histogramas de `paths` leyendo como mucho `max_workers` archivos a la vez.
+
+    Los archivos se suman en el orden en que terminan de leerse (la suma es
+    la misma). Devuelve (resultado, errores por archivo)."""
+    names = merge_names(hist_names, include_moments)
+    workers = max_workers or min(len(paths), MAX_LOAD_WORKERS) or 1
+    accumulator = _Accumulator()
+    errors: Dict[str, Exception] = {}
+
+    def read(path: str) -> Tuple[Dict[str, HistogramData], Optional[float]]:
+        # Sin sidecar .npy ni caché: cada mapa se suelta en cuanto se ha sumado
+        return load_run_file(path, names, use_sidecar=False), sidecar_events(path)
+
+    pending = iter(paths)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+        for path in pending:
+            in_flight[pool.submit(read, path)] = path
+            if len(in_flight) >= workers:
+                break
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = in_flight.pop(future)
+                try:
+                    accumulator.add(path, *future.result())
+                except Exception as exc:
+                    errors[path] = exc
+                next_path = next(pending, None)
+                if next_path is not None:
+                    in_flight[pool.submit(read, next_path)] = next_path
+
+    hists = {
+        name: HistogramData(accumulator.sums[name], accumulator.edges[name], name)
+        for name in names
+        if name in accumulator.sums
+    }
+    n_events = accumulator.n_events if accumulator.paths else None
+    return MergeResult(hists, tuple(accumulator.paths), n_events), errors
+
+
+def write_provenance(path: str, result: MergeResult) -> Optional[str]:
+    """Sidecar de procedencia de la salida a partir del del primer job; None si ese job no tiene.
+
+    La configuración (fuente, fantoma, mallas) es la de la campaña; `events`
+    pasa a ser el total sumado, `histograms` describe lo que contiene la
+    salida y se quitan los tiempos, que eran los de un solo job."""
+    if not result.paths:
+        return None
+    try:
+        with open(provenance_path(result.paths[0])) as json_file:
+            data = json.load(json_file)
+    except (OSError, ValueError):
+        return None
+    data["events"] = result.n_events
+    data["histograms"] = [
+        {"name": name, "edges": [[float(axis[0]), float(axis[-1]), len(axis) - 1] for axis in hist.edges]}
+        for name, hist in result.hists.items()
+    ]
+    data["merged_from"] = [os.path.abspath(p) for p in result.paths]
+    for key in ("wall_time_s", "cpu_time_s"):
+        data.pop(key, None)
+    target = provenance_path(path)
+    with open(target, "w") as json_file:
+        json.dump(data, json_file, indent=2)
+    return target
+
+
+def write_merged(path: str, result: MergeResult) -> str:
+    """Escribe los histogramas sumados con uproot, el sello JSON y el sidecar de procedencia.
+
+    Devuelve la ruta del sello."""
+    import uproot
+
+    with uproot.recreate(path) as output:
+        for name, hist in result.hists.items():
+            output[name] = (hist.values,) + tuple(hist.edges)
+    stamp_path = f"{path}.merge.json"
+    with open(stamp_path, "w") as stamp_file:
+        json.dump(
+            {
+                "output": os.path.basename(path),
+                "n_files": len(result.paths),
+                "n_events": result.n_events,
+                "hists": list(result.hists),
+                "inputs": [os.path.abspath(p) for p in result.paths],
+            },
+            stamp_file,
+            indent=2,
+        )
+    write_provenance(path, result)
+    return stamp_path
+
+
+def expand_inputs(inputs: Sequence[str]) -> List[str]:
+    """Directorios (todos sus `.root`), patrones glob o archivos."""
+    files: List[str] = []
+    for item in inputs:
+        if os.path.isdir(item):
+            files.extend(sorted(glob.glob(os.path.join(item, "*.root"))))
+        elif any(ch in item for ch in "*?["):
+            files.extend(sorted(glob.glob(item)))
+        else:
+            files.append(item)
+    return files
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Suma de salidas ROOT de varios jobs (tipo hadd)")
+    parser.add_argument("-o", "--output", required=True, help="archivo ROOT de salida")
+    parser.add_argument("inputs", nargs="+", help="archivos, directorios o patrones")
+    parser.add_argument("--hists", nargs="+", default=list(MERGE_HISTS))
+    parser.add_argument("--no-moments", action="store_true", help="no sumar _sumwx2/_entries/_nevents")
+    parser.add_argument("--workers", type=int, help="lecturas simultáneas (por defecto hasta %d)" % MAX_LOAD_WORKERS)
+    args = parser.parse_args()
+
+    inputs = [path for path in expand_inputs(args.inputs) if os.path.abspath(path) != os.path.abspath(args.output)]
+    if not inputs:
+        print("❌ No hay archivos de entrada")
+        return
+    result, errors = merge_files(inputs, args.hists, not args.no_moments, args.workers)
+    for path, exc in errors.items():
+        print(f"⚠️ {os.path.basename(path)} descartado: {exc}")
+    if not result.paths:
+        print("❌ Ningún archivo sumado")
+        return
+    stamp_path = write_merged(args.output, result)
+    events = "desconocido" if result.n_events is None else f"{result.n_events:.0f}"
+    print(f"✅ {len(result.paths)}/{len(inputs)} archivos -> {args.output} ({', '.join(result.hists)})")
+    print(f"   Eventos totales: {events} (sello en {stamp_path})")
+
+
+if __name__ == "__main__":
+    main()
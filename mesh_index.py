@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Índice geométrico precalculado de una malla 2D (capas, ángulos, regiones).
+
+Para unos bordes dados y una caja de heterogeneidad, cada vóxel recibe
+etiquetas enteras: capa radial (`shell`), intervalo de ángulo polar
+(`angle`), dentro/fuera de la heterogeneidad (`region`) y si cae en la zona
+de exclusión de la fuente (`source`). Con ellas cualquier estadística
+regional es un `np.bincount` (sumas, medias) o un `reduceat` (máximos) en
+lugar de un `meshgrid` + máscara por figura y por caso.
+
+El índice solo depende de la geometría: se guarda en memoria y, si se
+indica `cache_dir`, en un `.npz` cuyo nombre es un hash de bordes y
+parámetros (por defecto en el `.npycache/` de los datos)."""
+
+import hashlib
+import os
+from functools import lru_cache
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dose_loader import SIDECAR_DIR, bin_centers, load_histogram
+
+SHELL_WIDTH_MM = 1.0
+ANGLE_BIN_DEG = 10.0
+SOURCE_EXCLUSION_MM = 2.0  # las figuras descartan ±2 mm alrededor de la fuente
+INDEX_VERSION = 1
+
+IGNORED_LABEL = -1  # vóxeles que no cuentan en ninguna etiqueta (fuente, fuera de rango)
+
+REGION_OUTSIDE = 0
+REGION_HETERO = 1
+REGION_NAMES = ("Agua exterior", "Heterogeneidad")
+
+
+class MeshIndex(NamedTuple):
+    """Etiquetas por vóxel (nx, ny); -1 en `shell` marca vóxeles fuera del radio máximo."""
+
+    x_edges: np.ndarray
+    y_edges: np.ndarray
+    shell: np.ndarray
+    angle: np.ndarray
+    region: np.ndarray
+    source: np.ndarray
+    shell_width_mm: float
+    angle_bin_deg: float
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.shell.shape
+
+    @property
+    def n_shells(self) -> int:
+        return int(self.shell.max()) + 1
+
+    @property
+    def n_angles(self) -> int:
+        return int(round(180.0 / self.angle_bin_deg))
+
+    @property
+    def inside_heterogeneity(self) -> np.ndarray:
+        return self.region == REGION_HETERO
+
+    def shell_edges_mm(self) -> np.ndarray:
+        return np.arange(self.n_shells + 1) * self.shell_width_mm
+
+    def labels(self, name: str, exclude_source: bool = True) -> np.ndarray:
+        """Copia de `shell`/`angle`/`region` con -1 en la zona de la fuente si se pide."""
+        labels = np.array(getattr(self, name), dtype=np.intp)
+        if exclude_source:
+            labels[self.source] = -1
+        return labels
+
+    def heterogeneity_bins(self) -> Optional[Tuple[int, int, int, int]]:
+        """(x0, y0, ancho, alto) en bins de la caja de heterogeneidad, para dibujarla."""
+        inside = self.inside_heterogeneity
+        if not inside.any():
+            return None
+        xs = np.flatnonzero(inside.any(axis=1))
+        ys = np.flatnonzero(inside.any(axis=0))
+        return int(xs[0]), int(ys[0]), int(xs[-1] - xs[0] + 1), int(ys[-1] - ys[0] + 1)
+
+
+def check_labels(labels: np.ndarray, n_labels: int) -> None:
+    """ValueError si alguna etiqueta es ≥ `n_labels` o negativa distinta de `IGNORED_LABEL`.
+
+    Sin esta comprobación `np.bincount(..., minlength=n_labels)` devolvería
+    un array más largo y el error saldría después, en un reshape."""
+    labels = np.asarray(labels)
+    if labels.size == 0:
+        return
+    top, bottom = labels.max(), labels.min()
+    if top >= n_labels:
+        raise ValueError(f"Etiqueta {int(top)} fuera de rango: se esperaban etiquetas menores que {n_labels}")
+    if bottom < IGNORED_LABEL:
+        raise ValueError(f"Etiqueta {int(bottom)} no válida: la única negativa admitida es {IGNORED_LABEL}")
+
+
+class RegionStats(NamedTuple):
+    """Suma, número de vóxeles, media y máximo por etiqueta (0 en etiquetas vacías)."""
+
+    sum: np.ndarray
+    count: np.ndarray
+    mean: np.ndarray
+    max: np.ndarray
+
+
+def build_index(
+    x_edges: np.ndarray,
+    y_edges: np.ndarray,
+    hetero_center_mm: Optional[Sequence[float]] = None,
+    hetero_size_mm: Optional[Sequence[float]] = None,
+    shell_width_mm: float = SHELL_WIDTH_MM,
+    max_radius_mm: Optional[float] = None,
+    angle_bin_deg: float = ANGLE_BIN_DEG,
+    angle_axis: int = 1,
+    source_exclusion_mm: float = SOURCE_EXCLUSION_MM,
+) -> MeshIndex:
+    """Calcula las etiquetas de una rejilla.
+
+    `shell` = floor(r / ancho) (la capa 3 es 3-4 mm); `angle` es el ángulo
+    polar respecto al eje `angle_axis` del mapa (0 = x, 1 = y) en intervalos
+    de `angle_bin_deg` entre 0 y 180°; la caja de heterogeneidad incluye los
+    vóxeles cuyo centro cae dentro (bordes incluidos)."""
+    x_edges = np.asarray(x_edges, dtype=np.float64)
+    y_edges = np.asarray(y_edges, dtype=np.float64)
+    xx, yy = np.meshgrid(bin_centers(x_edges), bin_centers(y_edges), indexing="ij")
+    radius = np.hypot(xx, yy)
+
+    shell = np.floor(radius / shell_width_mm).astype(np.int32)
+    if max_radius_mm is not None:
+        shell[radius >= max_radius_mm] = -1
+
+    along = xx if angle_axis == 0 else yy
+    cos_theta = np.clip(along / np.where(radius > 0, radius, 1.0), -1.0, 1.0)
+    n_angles = int(round(180.0 / angle_bin_deg))
+    angle = np.minimum(np.degrees(np.arccos(cos_theta)) // angle_bin_deg, n_angles - 1).astype(np.int16)
+
+    region = np.full(radius.shape, REGION_OUTSIDE, dtype=np.int8)
+    if hetero_center_mm is not None and hetero_size_mm is not None:
+        (cx, cy), (sx, sy) = hetero_center_mm, hetero_size_mm
+        inside = (np.abs(xx - cx) <= sx / 2.0) & (np.abs(yy - cy) <= sy / 2.0)
+        region[inside] = REGION_HETERO
+
+    source = radius < source_exclusion_mm
+    for array in (shell, angle, region, source):
+        array.flags.writeable = False
+    return MeshIndex(x_edges, y_edges, shell, angle, region, source, shell_width_mm, angle_bin_deg)
+
+
+def _index_key(x_edges: np.ndarray, y_edges: np.ndarray, params: tuple) -> str:
+    digest = hashlib.sha1()
+    digest.update(np.asarray(x_edges, dtype=np.float64).tobytes())
+    digest.update(np.asarray(y_edges, dtype=np.float64).tobytes())
+    digest.update(repr((INDEX_VERSION,) + params).encode())
+    return digest.hexdigest()[:16]
+
+
+@lru_cache(maxsize=16)
+def _cached_index(x_bytes: bytes, y_bytes: bytes, params: tuple, cache_dir: Optional[str]) -> MeshIndex:
+    x_edges, y_edges = np.frombuffer(x_bytes), np.frombuffer(y_bytes)
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, f"mesh_index_{_index_key(x_edges, y_edges, params)}.npz")
+        try:
+            with np.load(path) as stored:
+                arrays = [stored[name] for name in ("shell", "angle", "region", "source")]
+            for array in arrays:
+                array.flags.writeable = False
+            return MeshIndex(x_edges.copy(), y_edges.copy(), *arrays, params[2], params[4])
+        except (OSError, KeyError, ValueError):
+            pass
+
+    index = build_index(x_edges.copy(), y_edges.copy(), *params)
+    if path is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp{os.getpid()}.npz"
+            np.savez(tmp_path, shell=index.shell, angle=index.angle, region=index.region, source=index.source)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+    return index
+
+
+def mesh_index(
+    x_edges: np.ndarray,
+    y_edges: np.ndarray,
+    hetero_center_mm: Optional[Sequence[float]] = None,
+    hetero_size_mm: Optional[Sequence[float]] = None,
+    shell_width_mm: float = SHELL_WIDTH_MM,
+    max_radius_mm: Optional[float] = None,
+    angle_bin_deg: float = ANGLE_BIN_DEG,
+    angle_axis: int = 1,
+    source_exclusion_mm: float = SOURCE_EXCLUSION_MM,
+    cache_dir: Optional[str] = None,
+) -> MeshIndex:
+    """Como `build_index`, pero reutilizando el índice en memoria y en `cache_dir`."""
+    params = (
+        None if hetero_center_mm is None else tuple(float(v) for v in hetero_center_mm),
+        None if hetero_size_mm is None else tuple(float(v) for v in hetero_size_mm),
+        float(shell_width_mm),
+        None if max_radius_mm is None else float(max_radius_mm),
+        float(angle_bin_deg),
+        int(angle_axis),
+        float(source_exclusion_mm),
+    )
+    return _cached_index(
+        np.asarray(x_edges, dtype=np.float64).tobytes(),
+        np.asarray(y_edges, dtype=np.float64).tobytes(),
+        params,
+        None if cache_dir is None else os.path.abspath(cache_dir),
+    )
+
+
+def mesh_index_for(filepath: str, hist_name: str = "h20", **kwargs) -> MeshIndex:
+    """Índice de la rejilla de un archivo ROOT, guardado en su `.npycache/`."""
+    hist = load_histogram(filepath, hist_name)
+    kwargs.setdefault("cache_dir", os.path.join(os.path.dirname(os.path.abspath(filepath)), SIDECAR_DIR))
+    return mesh_index(hist.x_edges, hist.y_edges, **kwargs)
+
+
+def region_stats(
+    values: np.ndarray, labels: np.ndarray, n_labels: Optional[int] = None, positive_only: bool = False
+) -> RegionStats:
+    """Estadísticas por etiqueta en una pasada; las etiquetas `IGNORED_LABEL` se ignoran.
+
+    Sumas y cuentas con `np.bincount`; el máximo con `np.maximum.reduceat`
+    sobre los valores ordenados por etiqueta."""
+    labels = np.asarray(labels).ravel()
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if n_labels is None:
+        n_labels = int(labels.max()) + 1 if labels.size else 0
+    check_labels(labels, n_labels)
+    selected = labels >= 0
+    if positive_only:
+        selected &= values > 0
+    labels, values = labels[selected], values[selected]
+
+    sums = np.bincount(labels, weights=values, minlength=n_labels)
+    counts = np.bincount(labels, minlength=n_labels)
+    means = np.zeros(n_labels)
+    np.divide(sums, counts, out=means, where=counts > 0)
+
+    maxima = np.zeros(n_labels)
+    if labels.size:
+        order = np.argsort(labels, kind="stable")
+        starts = np.searchsorted(labels[order], np.arange(n_labels))
+        filled = counts > 0
+        maxima[filled] = np.maximum.reduceat(values[order], starts[filled])
+    return RegionStats(sums, counts, means, maxima)
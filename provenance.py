@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Lectura del sidecar de procedencia `<salida>.json` que escribe la simulación.
+
+Al cerrar cada archivo ROOT (`primary_<ts>.root`, `brachytherapy[_<scorer>]_<ts>.root`)
+`BrachyRunAction::WriteProvenance` deja al lado un JSON con la configuración
+del run: eventos acumulados en las mallas, hilos, fuente (`/source/switch`),
+material y densidad del fantoma, heterogeneidad (activada, material,
+densidad, tamaño y posición en mm), mallas de scoring (semianchuras, bins y
+scorers), tiempos de pared y de CPU y los histogramas que contiene el
+archivo con sus bordes.
+
+Con él los análisis convierten edep a dosis con la geometría y las
+densidades reales del run en lugar de constantes escritas a mano, y el
+catálogo indexa un archivo sin decodificar el ROOT. Los archivos antiguos
+no tienen sidecar: `load_provenance` devuelve None y cada script sigue con
+sus valores por defecto."""
+
+import json
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+Edges = Tuple[Tuple[float, float, int], ...]
+
+DEFAULT_SCORER = "eDep"
+
+
+class MeshInfo(NamedTuple):
+    """Malla de scoring: semianchuras (mm, como en /score/mesh/boxSize), bins y scorers."""
+
+    name: str
+    half_widths_mm: Tuple[float, float, float]
+    bins: Tuple[int, int, int]
+    scorers: Tuple[str, ...]
+
+    @property
+    def voxel_mm(self) -> Tuple[float, float, float]:
+        return tuple(2.0 * h / n for h, n in zip(self.half_widths_mm, self.bins))
+
+
+class DoseSetup(NamedTuple):
+    """Lo necesario para pasar el edep del plano XY (`h20`) de un run a Gy.
+
+    `thickness_mm` es el espesor en Z que suma el mapa 2D (toda la malla) y
+    `voxel_xy_mm` el lado del vóxel en XY (None: tomarlo de los bordes)."""
+
+    thickness_mm: float
+    voxel_xy_mm: Optional[float]
+    phantom_density: float
+    hetero_enabled: bool
+    hetero_density: float
+    hetero_center_mm: Tuple[float, float]
+    hetero_size_mm: Tuple[float, float]
+
+
+class RunProvenance(NamedTuple):
+    path: str
+    events: Optional[float]
+    threads: Optional[int]
+    source: Optional[str]
+    phantom_material: Optional[str]
+    phantom_density: Optional[float]
+    hetero_enabled: bool
+    hetero_material: Optional[str]
+    hetero_density: Optional[float]
+    hetero_size_mm: Optional[Tuple[float, float, float]]
+    hetero_position_mm: Optional[Tuple[float, float, float]]
+    meshes: Tuple[MeshInfo, ...]
+    histograms: Dict[str, Edges]
+    wall_time_s: Optional[float]
+    cpu_time_s: Optional[float]
+
+    def mesh(self, scorer: str = DEFAULT_SCORER) -> Optional[MeshInfo]:
+        """Malla que contiene `scorer` (o la primera si ninguna lo declara)."""
+        return next((m for m in self.meshes if scorer in m.scorers), self.meshes[0] if self.meshes else None)
+
+    def dose_setup(self, default: DoseSetup, scorer: str = DEFAULT_SCORER) -> DoseSetup:
+        """Geometría y densidades del run; lo que el sidecar no trae se toma de `default`."""
+        mesh = self.mesh(scorer)
+        thickness, voxel_xy = default.thickness_mm, default.voxel_xy_mm
+        if mesh is not None:
+            thickness = 2.0 * mesh.half_widths_mm[2]
+            voxel_xy = mesh.voxel_mm[0]
+        center, size = default.hetero_center_mm, default.hetero_size_mm
+        if self.hetero_position_mm is not None:
+            center = tuple(self.hetero_position_mm[:2])
+        if self.hetero_size_mm is not None:
+            size = tuple(self.hetero_size_mm[:2])
+        return DoseSetup(
+            thickness,
+            voxel_xy,
+            self.phantom_density or default.phantom_density,
+            self.hetero_enabled,
+            self.hetero_density or default.hetero_density,
+            center,
+            size,
+        )
+
+
+def provenance_path(root_path: str) -> str:
+    """`brachytherapy_<ts>.root` -> `brachytherapy_<ts>.json`."""
+    return os.path.splitext(root_path)[0] + ".json"
+
+
+def _vector(values) -> Optional[Tuple[float, ...]]:
+    return tuple(float(v) for v in values) if values is not None else None
+
+
+def parse_provenance(path: str, data: dict) -> RunProvenance:
+    phantom = data.get("phantom", {})
+    hetero = data.get("heterogeneity", {})
+    meshes = tuple(
+        MeshInfo(
+            mesh.get("name", ""),
+            _vector(mesh["half_widths_mm"]),
+            tuple(int(n) for n in mesh["bins"]),
+            tuple(mesh.get("scorers", ())),
+        )
+        for mesh in data.get("meshes", ())
+    )
+    histograms = {
+        hist["name"]: tuple((float(lo), float(hi), int(n)) for lo, hi, n in hist["edges"])
+        for hist in data.get("histograms", ())
+    }
+    return RunProvenance(
+        path,
+        data.get("events"),
+        data.get("threads"),
+        data.get("source"),
+        phantom.get("material"),
+        phantom.get("density_g_cm3"),
+        bool(hetero.get("enabled", False)),
+        hetero.get("material"),
+        hetero.get("density_g_cm3"),
+        _vector(hetero.get("size_mm")),
+        _vector(hetero.get("position_mm")),
+        meshes,
+        histograms,
+        data.get("wall_time_s"),
+        data.get("cpu_time_s"),
+    )
+
+
+def load_provenance(root_path: str) -> Optional[RunProvenance]:
+    """Sidecar de `root_path` ya interpretado, o None si el archivo no tiene."""
+    json_path = provenance_path(root_path)
+    if not os.path.exists(json_path):
+        return None
+    with open(json_path) as json_file:
+        return parse_provenance(json_path, json.load(json_file))
+
+
+def dose_setup(root_path: str, default: DoseSetup, scorer: str = DEFAULT_SCORER) -> DoseSetup:
+    """`DoseSetup` del sidecar de `root_path`, o `default` para archivos sin sidecar."""
+    provenance = load_provenance(root_path)
+    return provenance.dose_setup(default, scorer) if provenance is not None else default
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Energía primaria/secundaria por capas radiales para varios materiales.
+
+Regenera `100M_I125_pri-sec/regional_analysis_primary_secondary.csv` a
+partir de los mapas `h2_eDepPrimary` y `h2_eDepSecondary` de cada caso:
+suma, porcentaje y media por vóxel de cada capa (3-4 mm, 4-5 mm, …,
+60-70 mm). Las etiquetas de capa se calculan una vez por rejilla y cada
+caso se reduce con un único `np.bincount` sobre los dos mapas apilados; la
+lectura de los casos va en un pool de hilos.
+
+Cada caso es un archivo único por run (`/brachy/output/singleFile`) o un
+par (primarias, secundarias) de archivos ROOT del writer. Como el resto de
+scripts, los valores del mapa se escriben tal cual en la columna MeV."""
+
+import argparse
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Sequence, Tuple, Union
+
+import numpy as np
+
+from dose_loader import MAX_LOAD_WORKERS, bin_centers, load_histogram, load_run_file
+
+PRIMARY_HIST = "h2_eDepPrimary"
+SECONDARY_HIST = "h2_eDepSecondary"
+
+# Capas de 1 mm hasta 20 mm y más anchas después, como en el CSV original
+SHELL_EDGES_MM = tuple(range(3, 21)) + (25, 30, 40, 50, 60, 70)
+
+CSV_COLUMNS = (
+    "Material",
+    "Región",
+    "Primarias (MeV)",
+    "Secundarias (MeV)",
+    "Total (MeV)",
+    "Primarias %",
+    "Secundarias %",
+    "Media Primarias",
+    "Media Secundarias",
+)
+
+DATA_DIR = "/home/fer/fer/newbrachy/100M_I125_pri-sec"
+OUTPUT_FILE = "regional_analysis_primary_secondary.csv"
+CASES = [
+    ("Lung MIRD", "brachytherapy_homo_lung100m.root"),
+    ("Bone", "brachytherapy_homo_bone100m.root"),
+]
+
+CaseSource = Union[str, Tuple[str, str]]
+
+
+class ShellTable(NamedTuple):
+    """Sumas y número de vóxeles por capa de un caso."""
+
+    material: str
+    shell_edges_mm: Tuple[float, ...]
+    primary: np.ndarray
+    secondary: np.ndarray
+    voxels: np.ndarray
+
+    @property
+    def total(self) -> np.ndarray:
+        return self.primary + self.secondary
+
+    def percentages(self) -> Tuple[np.ndarray, np.ndarray]:
+        total = self.total
+        primary = np.zeros_like(total)
+        secondary = np.zeros_like(total)
+        np.divide(100.0 * self.primary, total, out=primary, where=total > 0)
+        np.divide(100.0 * self.secondary, total, out=secondary, where=total > 0)
+        return primary, secondary
+
+    def means(self) -> Tuple[np.ndarray, np.ndarray]:
+        primary = np.zeros_like(self.primary)
+        secondary = np.zeros_like(self.secondary)
+        np.divide(self.primary, self.voxels, out=primary, where=self.voxels > 0)
+        np.divide(self.secondary, self.voxels, out=secondary, where=self.voxels > 0)
+        return primary, secondary
+
+
+@lru_cache(maxsize=8)
+def _shell_labels(x_edges: bytes, y_edges: bytes, shell_edges: Tuple[float, ...]) -> np.ndarray:
+    xx, yy = np.meshgrid(
+        bin_centers(np.frombuffer(x_edges)), bin_centers(np.frombuffer(y_edges)), indexing="ij"
+    )
+    # Capa i = [edges[i], edges[i+1]); -1 fuera de todas
+    labels = np.digitize(np.hypot(xx, yy), shell_edges) - 1
+    labels[labels >= len(shell_edges) - 1] = -1
+    labels.flags.writeable = False
+    return labels
+
+
+def shell_labels(
+    x_edges: np.ndarray, y_edges: np.ndarray, shell_edges_mm: Sequence[float] = SHELL_EDGES_MM
+) -> np.ndarray:
+    """Capa radial de cada vóxel (según su centro) para unos bordes de capa arbitrarios."""
+    return _shell_labels(
+        np.asarray(x_edges, dtype=np.float64).tobytes(),
+        np.asarray(y_edges, dtype=np.float64).tobytes(),
+        tuple(float(edge) for edge in shell_edges_mm),
+    )
+
+
+def shell_sums(
+    material: str,
+    primary: np.ndarray,
+    secondary: np.ndarray,
+    x_edges: np.ndarray,
+    y_edges: np.ndarray,
+    shell_edges_mm: Sequence[float] = SHELL_EDGES_MM,
+) -> ShellTable:
+    """Sumas de primarias y secundarias y número de vóxeles por capa en una pasada."""
+    if primary.shape != secondary.shape:
+        raise ValueError(f"{material}: primarias {primary.shape} y secundarias {secondary.shape} no coinciden")
+    labels = shell_labels(x_edges, y_edges, shell_edges_mm)
+    if labels.shape != primary.shape:
+        raise ValueError(f"{material}: mapa {primary.shape} incompatible con los bordes {labels.shape}")
+
+    n_shells = len(shell_edges_mm) - 1
+    selected = labels >= 0
+    shell = labels[selected]
+    # Primarias en las etiquetas [0, n) y secundarias en [n, 2n): un solo bincount
+    stacked_labels = np.concatenate((shell, shell + n_shells))
+    stacked_values = np.concatenate((np.asarray(primary)[selected], np.asarray(secondary)[selected]))
+    sums = np.bincount(stacked_labels, weights=stacked_values, minlength=2 * n_shells)
+    voxels = np.bincount(shell, minlength=n_shells)
+    return ShellTable(
+        material, tuple(shell_edges_mm), sums[:n_shells], sums[n_shells:], voxels
+    )
+
+
+def load_case(source: CaseSource):
+    """(primarias, secundarias) de un archivo único por run o de un par de archivos."""
+    if isinstance(source, str):
+        hists = load_run_file(source, (PRIMARY_HIST, SECONDARY_HIST))
+        missing = [name for name in (PRIMARY_HIST, SECONDARY_HIST) if name not in hists]
+        if missing:
+            raise KeyError(f"Falta {', '.join(missing)} en {source}")
+        return hists[PRIMARY_HIST], hists[SECONDARY_HIST]
+    primary_path, secondary_path = source
+    return load_histogram(primary_path, PRIMARY_HIST), load_histogram(secondary_path, SECONDARY_HIST)
+
+
+def analyze_cases(
+    cases: Sequence[Tuple[str, CaseSource]],
+    shell_edges_mm: Sequence[float] = SHELL_EDGES_MM,
+    max_workers: int = None,
+) -> Tuple[List[ShellTable], Dict[str, Exception]]:
+    """Procesa todos los casos en paralelo; devuelve las tablas en el orden de `cases`.
+
+    Un caso fallido no detiene al resto: se devuelve en el diccionario de errores."""
+    if not cases:
+        return [], {}
+
+    def task(case: Tuple[str, CaseSource]) -> ShellTable:
+        material, source = case
+        primary, secondary = load_case(source)
+        return shell_sums(
+            material, primary.values, secondary.values, primary.x_edges, primary.y_edges, shell_edges_mm
+        )
+
+    tables: List[ShellTable] = []
+    errors: Dict[str, Exception] = {}
+    workers = max_workers or min(len(cases), MAX_LOAD_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(case[0], pool.submit(task, case)) for case in cases]
+        for material, future in futures:
+            try:
+                tables.append(future.result())
+            except Exception as exc:
+                errors[material] = exc
+    return tables, errors
+
+
+def table_rows(table: ShellTable) -> List[List[str]]:
+    """Filas del CSV (mismo formato numérico que el archivo original)."""
+    primary_pct, secondary_pct = table.percentages()
+    primary_mean, secondary_mean = table.means()
+    edges = table.shell_edges_mm
+    return [
+        [
+            table.material,
+            f"{edges[i]:g}-{edges[i + 1]:g} mm",
+            f"{table.primary[i]:.2e}",
+            f"{table.secondary[i]:.2e}",
+            f"{table.total[i]:.2e}",
+            f"{primary_pct[i]:.2f}",
+            f"{secondary_pct[i]:.2f}",
+            f"{primary_mean[i]:.2e}",
+            f"{secondary_mean[i]:.2e}",
+        ]
+        for i in range(len(edges) - 1)
+    ]
+
+
+def write_csv(path: str, tables: Sequence[ShellTable]) -> None:
+    with open(path, "w", newline="") as output:
+        writer = csv.writer(output)
+        writer.writerow(CSV_COLUMNS)
+        for table in tables:
+            writer.writerows(table_rows(table))
+
+
+def parse_case(text: str) -> Tuple[str, CaseSource]:
+    """`Material=archivo.root` o `Material=primarias.root,secundarias.root`."""
+    material, _, files = text.partition("=")
+    if not files:
+        raise argparse.ArgumentTypeError(f"Caso sin archivo: {text}")
+    paths = files.split(",")
+    if len(paths) == 1:
+        return material, paths[0]
+    if len(paths) == 2:
+        return material, (paths[0], paths[1])
+    raise argparse.ArgumentTypeError(f"Se esperaban uno o dos archivos en {text}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Análisis regional primarias/secundarias por capas")
+    parser.add_argument("cases", nargs="*", type=parse_case, help="Material=archivo[,archivo_secundarias]")
+    parser.add_argument("-o", "--output", default=os.path.join(DATA_DIR, OUTPUT_FILE))
+    args = parser.parse_args()
+
+    cases = args.cases or [(material, os.path.join(DATA_DIR, filename)) for material, filename in CASES]
+    tables, errors = analyze_cases(cases)
+    for material, exc in errors.items():
+        print(f"⚠️ Error en {material}: {exc}")
+    if not tables:
+        print("❌ Ningún caso procesado")
+        return
+    write_csv(args.output, tables)
+    print(f"✅ {len(tables)} casos, {len(SHELL_EDGES_MM) - 1} capas -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""Catálogo SQLite de las salidas de simulación (`brachytherapy_<ts>.root`, …).
+
+`scan` recorre directorios de resultados y, para cada `.root` nuevo o
+modificado (tamaño/mtime distintos de lo guardado), anota sus histogramas
+(forma y bordes), el número de eventos (`<h>_nevents` de la opción `stat`)
+y metadatos de escenario deducidos de la ruta: escenario (TG186, I125,
+IR192), material, fantoma homogéneo/heterogéneo y etiqueta de eventos
+(`100M`). Si el ROOT tiene sidecar de procedencia (`<salida>.json`, ver
+`provenance.py`) histogramas y eventos se toman de él sin decodificar el
+ROOT, y se añaden la fuente, los materiales, la heterogeneidad y los hilos
+del run. Los archivos sin cambios (ni en el ROOT ni en su sidecar) no se
+vuelven a abrir y los que han desaparecido se eliminan del índice. Las lecturas van en un pool de hilos;
+las escrituras en SQLite, en el hilo principal.
+
+Después los análisis piden archivos por contenido en lugar de por nombre:
+
+    catalog = RunCatalog("run_catalog.sqlite")
+    catalog.query(hist="h2_eDepSecondary", scenario="TG186", material="bone")"""
+
+import argparse
+import fnmatch
+import json
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dose_loader import MAX_LOAD_WORKERS
+from dose_uncertainty import EVENTS_SUFFIX
+from provenance import RunProvenance, load_provenance, provenance_path
+
+CATALOG_FILE = "run_catalog.sqlite"
+SCHEMA_VERSION = 1
+FILE_RE = re.compile(r"^(?P<prefix>.+?)(?:_(?P<timestamp>\d{8}_\d{6}))?\.root$")
+
+SCENARIOS = ("TG186", "I125", "IR192")
+MATERIALS = ("water", "bone", "lung", "tissue", "air")
+PHANTOMS = (("hetero", "heterogeneous"), ("homo", "homogeneous"))
+EVENTS_RE = re.compile(r"(?<!\d)(\d+)m(?![a-z])")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    prefix TEXT,
+    timestamp TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    n_events REAL,
+    scanned_at REAL NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS hists (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    shape TEXT NOT NULL,
+    edges TEXT NOT NULL,
+    PRIMARY KEY (path, name)
+);
+CREATE TABLE IF NOT EXISTS metadata (
+    path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (path, key, value)
+);
+CREATE INDEX IF NOT EXISTS metadata_key_value ON metadata (key, value);
+CREATE INDEX IF NOT EXISTS hists_name ON hists (name);
+CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+"""
+
+
+class HistInfo(NamedTuple):
+    """Forma y bordes (mín, máx, nº de bins por eje) de un histograma."""
+
+    name: str
+    shape: Tuple[int, ...]
+    edges: Tuple[Tuple[float, float, int], ...]
+
+
+class FileRecord(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
+    hists: Tuple[HistInfo, ...]
+    n_events: Optional[float]
+    metadata: Dict[str, Tuple[str, ...]]
+    error: Optional[str] = None
+
+
+class CatalogEntry(NamedTuple):
+    path: str
+    timestamp: Optional[str]
+    n_events: Optional[float]
+    hists: Tuple[str, ...]
+    metadata: Dict[str, Tuple[str, ...]]
+
+
+class ScanReport(NamedTuple):
+    added: int
+    updated: int
+    unchanged: int
+    removed: int
+    errors: Dict[str, str]
+
+
+def path_metadata(path: str) -> Dict[str, Tuple[str, ...]]:
+    """Metadatos de escenario deducidos del nombre del archivo y de sus dos directorios padre."""
+    parts = os.path.abspath(path).split(os.sep)[-3:]
+    text = "/".join(parts).lower()
+    metadata: Dict[str, Tuple[str, ...]] = {}
+    scenarios = tuple(s for s in SCENARIOS if s.lower() in text.replace("-", ""))
+    materials = tuple(m for m in MATERIALS if m in text)
+    phantom = next((label for token, label in PHANTOMS if token in text), None)
+    events = EVENTS_RE.findall(text)
+    match = FILE_RE.match(parts[-1])
+    if scenarios:
+        metadata["scenario"] = scenarios
+    if materials:
+        metadata["material"] = materials
+    if phantom:
+        metadata["phantom"] = (phantom,)
+    if events:
+        metadata["events_label"] = (f"{events[-1]}M",)
+    if match:
+        metadata["kind"] = (match["prefix"],)
+    return metadata
+
+
+def provenance_metadata(provenance: RunProvenance) -> Dict[str, Tuple[str, ...]]:
+    """Metadatos del run según su sidecar; `phantom` sustituye al deducido de la ruta."""
+    metadata: Dict[str, Tuple[str, ...]] = {
+        "phantom": ("heterogeneous" if provenance.hetero_enabled else "homogeneous",)
+    }
+    if provenance.source:
+        metadata["source"] = (provenance.source,)
+    if provenance.phantom_material:
+        metadata["phantom_material"] = (provenance.phantom_material,)
+    if provenance.threads:
+        metadata["threads"] = (str(provenance.threads),)
+    if provenance.hetero_enabled:
+        if provenance.hetero_material:
+            metadata["hetero_material"] = (provenance.hetero_material,)
+        for key, vector in (("hetero_size_mm", provenance.hetero_size_mm),
+                            ("hetero_position_mm", provenance.hetero_position_mm)):
+            if vector is not None:
+                metadata[key] = (",".join(f"{v:g}" for v in vector),)
+    return metadata
+
+
+def file_stamp(path: str) -> Tuple[int, int]:
+    """(tamaño, mtime) del ROOT; el mtime es el más reciente entre el ROOT y su sidecar."""
+    stat = os.stat(path)
+    try:
+        sidecar_mtime = os.stat(provenance_path(path)).st_mtime_ns
+    except OSError:
+        sidecar_mtime = 0
+    return stat.st_size, max(stat.st_mtime_ns, sidecar_mtime)
+
+
+def read_record(path: str) -> FileRecord:
+    """Extrae histogramas, eventos y metadatos del sidecar o, si no lo hay, abriendo el ROOT una vez
+    (sin leer los valores 2D/3D)."""
+    import uproot
+
+    size, mtime_ns = file_stamp(path)
+    metadata = path_metadata(path)
+    hists: List[HistInfo] = []
+    n_events = None
+    try:
+        provenance = load_provenance(path)
+    except (OSError, ValueError, KeyError, TypeError):
+        provenance = None  # sidecar ilegible: se indexa desde el ROOT
+    if provenance is not None:
+        metadata.update(provenance_metadata(provenance))
+        n_events = provenance.events
+    if provenance is not None and provenance.histograms:
+        hists = [HistInfo(name, tuple(n for _, _, n in edges), edges) for name, edges in provenance.histograms.items()]
+    else:
+        try:
+            with uproot.open(path) as root_file:
+                for key, classname in root_file.classnames(recursive=False).items():
+                    if not classname.startswith(("TH1", "TH2", "TH3")):
+                        continue
+                    name = key.split(";")[0]
+                    hist = root_file[key]
+                    axes = tuple(hist.axes)
+                    edges = tuple((float(a.edges()[0]), float(a.edges()[-1]), len(a.edges()) - 1) for a in axes)
+                    hists.append(HistInfo(name, tuple(n for _, _, n in edges), edges))
+                    if name.endswith(EVENTS_SUFFIX) and n_events is None:
+                        n_events = float(np.sum(hist.values()))
+        except Exception as exc:
+            return FileRecord(path, size, mtime_ns, (), None, metadata, str(exc))
+    scorers = tuple(sorted({h.name.split("_", 1)[1] for h in hists if h.name.startswith(("h2_", "h3_"))}))
+    if scorers:
+        metadata["scorer"] = scorers
+    return FileRecord(path, size, mtime_ns, tuple(hists), n_events, metadata)
+
+
+class RunCatalog:
+    """Índice SQLite de archivos de salida; `scan` lo actualiza y `query` lo consulta."""
+
+    def __init__(self, db_path: str = CATALOG_FILE):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "RunCatalog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _stored_stamps(self, directories: Sequence[str]) -> Dict[str, Tuple[int, int]]:
+        stamps = {}
+        for directory in directories:
+            prefix = directory.rstrip(os.sep) + os.sep
+            rows = self.connection.execute(
+                "SELECT path, size, mtime_ns FROM files WHERE directory = ? OR substr(directory, 1, ?) = ?",
+                (directory, len(prefix), prefix),
+            )
+            stamps.update({path: (size, mtime_ns) for path, size, mtime_ns in rows})
+        return stamps
+
+    def _store(self, record: FileRecord) -> None:
+        match = FILE_RE.match(os.path.basename(record.path))
+        self.connection.execute("DELETE FROM files WHERE path = ?", (record.path,))
+        self.connection.execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                record.path,
+                os.path.dirname(record.path),
+                match["prefix"] if match else None,
+                match["timestamp"] if match else None,
+                record.size,
+                record.mtime_ns,
+                record.n_events,
+                time.time(),
+                record.error,
+            ),
+        )
+        self.connection.executemany(
+            "INSERT INTO hists VALUES (?, ?, ?, ?)",
+            [(record.path, h.name, json.dumps(h.shape), json.dumps(h.edges)) for h in record.hists],
+        )
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO metadata VALUES (?, ?, ?)",
+            [(record.path, key, value) for key, values in record.metadata.items() for value in values],
+        )
+
+    def scan(
+        self, directories: Iterable[str], pattern: str = "*.root", max_workers: Optional[int] = None
+    ) -> ScanReport:
+        """Indexa los archivos nuevos o modificados bajo `directories` (recursivo)."""
+        directories = [os.path.abspath(d) for d in directories]
+        found: Dict[str, Tuple[int, int]] = {}
+        for directory in directories:
+            for root, dirnames, filenames in os.walk(directory):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                for filename in fnmatch.filter(filenames, pattern):
+                    path = os.path.join(root, filename)
+                    found[path] = file_stamp(path)
+
+        stored = self._stored_stamps(directories)
+        changed = [path for path, stamp in found.items() if stored.get(path) != stamp]
+        removed = [path for path in stored if path not in found]
+        errors: Dict[str, str] = {}
+
+        with self.connection:
+            self.connection.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in removed])
+            if changed:
+                workers = max_workers or min(len(changed), MAX_LOAD_WORKERS)
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    for record in pool.map(read_record, changed):
+                        if record.error:
+                            errors[record.path] = record.error
+                        self._store(record)
+        added = sum(1 for path in changed if path not in stored)
+        return ScanReport(added, len(changed) - added, len(found) - len(changed), len(removed), errors)
+
+    def _entry(self, path: str, timestamp: Optional[str], n_events: Optional[float]) -> CatalogEntry:
+        hists = tuple(row[0] for row in self.connection.execute(
+            "SELECT name FROM hists WHERE path = ? ORDER BY name", (path,)))
+        metadata: Dict[str, List[str]] = {}
+        for key, value in self.connection.execute(
+            "SELECT key, value FROM metadata WHERE path = ? ORDER BY key, value", (path,)
+        ):
+            metadata.setdefault(key, []).append(value)
+        return CatalogEntry(path, timestamp, n_events, hists, {k: tuple(v) for k, v in metadata.items()})
+
+    def query(
+        self, hist: Optional[str] = None, directory: Optional[str] = None, **metadata: object
+    ) -> List[CatalogEntry]:
+        """Archivos sin error que contienen `hist` y cumplen todos los metadatos (sin distinguir mayúsculas).
+
+        Ordenados por sello de tiempo, del más antiguo al más reciente."""
+        sql = ["SELECT path, timestamp, n_events FROM files WHERE error IS NULL"]
+        params: List[object] = []
+        if hist is not None:
+            sql.append("AND path IN (SELECT path FROM hists WHERE name = ?)")
+            params.append(hist)
+        if directory is not None:
+            sql.append("AND directory = ?")
+            params.append(os.path.abspath(directory))
+        for key, value in metadata.items():
+            sql.append("AND path IN (SELECT path FROM metadata WHERE key = ? AND lower(value) = lower(?))")
+            params.extend((key, str(value)))
+        sql.append("ORDER BY timestamp, path")
+        rows = self.connection.execute(" ".join(sql), params).fetchall()
+        return [self._entry(*row) for row in rows]
+
+    def latest(self, hist: Optional[str] = None, **metadata: object) -> Optional[str]:
+        """Ruta del archivo más reciente que cumple la consulta."""
+        entries = self.query(hist, **metadata)
+        return entries[-1].path if entries else None
+
+    def hist_info(self, path: str, name: str) -> Optional[HistInfo]:
+        row = self.connection.execute(
+            "SELECT shape, edges FROM hists WHERE path = ? AND name = ?", (os.path.abspath(path), name)
+        ).fetchone()
+        if row is None:
+            return None
+        return HistInfo(name, tuple(json.loads(row[0])), tuple(tuple(e) for e in json.loads(row[1])))
+
+
+def parse_filter(text: str) -> Tuple[str, str]:
+    key, _, value = text.partition("=")
+    if not value:
+        raise argparse.ArgumentTypeError(f"Filtro sin valor: {text} (se espera clave=valor)")
+    return key, value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Catálogo SQLite de salidas de simulación")
+    parser.add_argument("--db", default=CATALOG_FILE, help="archivo SQLite del catálogo")
+    commands = parser.add_subparsers(dest="command", required=True)
+    scan_parser = commands.add_parser("scan", help="indexar directorios (solo archivos nuevos o modificados)")
+    scan_parser.add_argument("directories", nargs="+")
+    scan_parser.add_argument("--pattern", default="*.root")
+    query_parser = commands.add_parser("query", help="buscar archivos por histograma y metadatos")
+    query_parser.add_argument("filters", nargs="*", type=parse_filter, help="clave=valor (p. ej. material=bone)")
+    query_parser.add_argument("--hist")
+    args = parser.parse_args()
+
+    with RunCatalog(args.db) as catalog:
+        if args.command == "scan":
+            report = catalog.scan(args.directories, args.pattern)
+            print(f"✅ {report.added} nuevos, {report.updated} actualizados, "
+                  f"{report.unchanged} sin cambios, {report.removed} eliminados -> {args.db}")
+            for path, error in report.errors.items():
+                print(f"⚠️ {path}: {error}")
+            return
+        for entry in catalog.query(args.hist, **dict(args.filters)):
+            events = "?" if entry.n_events is None else f"{entry.n_events:.0f}"
+            tags = " ".join(f"{k}={','.join(v)}" for k, v in entry.metadata.items())
+            print(f"{entry.path}  eventos={events}  [{', '.join(entry.hists)}]  {tags}")
+
+
+if __name__ == "__main__":
+    main()
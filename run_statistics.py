@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Incertidumbre a partir de runs independientes repetidos (batch means y bootstrap).
+
+Varios `brachytherapy_<YYYYMMDD_HHMMSS>.root` del mismo escenario (misma
+macro, semillas distintas) son lotes independientes: la media por vóxel de
+los B mapas y su error estándar s/√B dan la incertidumbre sin necesitar la
+opción `stat` del writer. Para magnitudes derivadas no lineales (cocientes
+por capas, g(r) de TG-43) se usa bootstrap: se remuestrean los B runs con
+reemplazo, se promedia y se recalcula la magnitud; el intervalo es el de
+percentiles. Los remuestreos se reparten por bloques en un pool de
+procesos; cada proceso recibe la pila de mapas una sola vez (initializer).
+
+Los runs se agrupan por directorio y prefijo (lo que precede al sello de
+tiempo), p. ej. `brachytherapy_eDepPrimary_<ts>.root` y
+`brachytherapy_<ts>.root` son grupos distintos."""
+
+import argparse
+import glob
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dose_loader import DEFAULT_HIST, load_many
+from regional_pri_sec import PRIMARY_HIST, SECONDARY_HIST, SHELL_EDGES_MM, shell_labels
+from tg43 import tg43_parameters
+
+TIMESTAMP_RE = re.compile(r"^(?P<prefix>.+?)_(?P<timestamp>\d{8}_\d{6})\.root$")
+N_RESAMPLES = 1000
+CONFIDENCE = 0.95
+RESAMPLES_PER_TASK = 50
+MAX_BOOTSTRAP_WORKERS = 8
+REPORT_RADII_MM = (5.0, 10.0, 20.0, 30.0, 50.0)
+
+Statistic = Callable[[np.ndarray], np.ndarray]
+
+
+class BatchStack(NamedTuple):
+    """Mapas de B runs (B, H, nx, ny) para H histogramas y los bordes comunes."""
+
+    paths: Tuple[str, ...]
+    hist_names: Tuple[str, ...]
+    maps: np.ndarray
+    x_edges: np.ndarray
+    y_edges: np.ndarray
+
+    @property
+    def n_batches(self) -> int:
+        return self.maps.shape[0]
+
+
+class BatchMeans(NamedTuple):
+    """Media por vóxel, error estándar de la media y error relativo (NaN sin dosis)."""
+
+    mean: np.ndarray
+    std_error: np.ndarray
+    relative: np.ndarray
+    n_batches: int
+
+
+class BootstrapResult(NamedTuple):
+    """Estimación con la muestra completa, intervalo de percentiles y desviación bootstrap."""
+
+    estimate: np.ndarray
+    low: np.ndarray
+    high: np.ndarray
+    std: np.ndarray
+    confidence: float
+    n_resamples: int
+
+
+def group_runs(paths: Sequence[str]) -> Dict[Tuple[str, str], List[str]]:
+    """Agrupa archivos con sello de tiempo por (directorio, prefijo), ordenados por fecha."""
+    groups: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+    for path in paths:
+        match = TIMESTAMP_RE.match(os.path.basename(path))
+        if match:
+            groups[(os.path.dirname(os.path.abspath(path)), match["prefix"])].append(path)
+    return {key: sorted(files, key=lambda p: TIMESTAMP_RE.match(os.path.basename(p))["timestamp"])
+            for key, files in sorted(groups.items())}
+
+
+def load_batches(
+    paths: Sequence[str], hist_names: Sequence[str] = (DEFAULT_HIST,), max_workers: Optional[int] = None
+) -> Tuple[BatchStack, Dict[str, Exception]]:
+    """Carga los H histogramas de cada run en paralelo y los apila; los runs fallidos se devuelven aparte."""
+    maps: Dict[str, list] = {}
+    errors: Dict[str, Exception] = {}
+    edges = None
+    for h, hist_name in enumerate(hist_names):
+        hists, failed = load_many({path: path for path in paths}, hist_name, max_workers=max_workers)
+        errors.update(failed)
+        for path, hist in hists.items():
+            # load_many aplica el fallback h20 -> h10: un run sin el histograma pedido no se mezcla
+            if hist.name != hist_name:
+                errors[path] = KeyError(f"{path}: no tiene {hist_name} (solo {hist.name})")
+                continue
+            if edges is None:
+                edges = hist.edges
+            elif len(hist.edges) != len(edges) or any(
+                a.shape != b.shape or not np.allclose(a, b) for a, b in zip(hist.edges, edges)
+            ):
+                errors[path] = ValueError(f"{path}: binning de {hist_name} distinto del resto de runs")
+                continue
+            maps.setdefault(path, [None] * len(hist_names))[h] = hist.values
+    good = tuple(path for path in paths if path in maps and path not in errors)
+    if len(good) < 2:
+        raise ValueError(f"Se necesitan al menos 2 runs válidos (hay {len(good)})")
+    stack = np.stack([np.stack(maps[path]) for path in good]).astype(np.float64, copy=False)
+    return BatchStack(good, tuple(hist_names), stack, edges[0], edges[1]), errors
+
+
+def batch_means(maps: np.ndarray) -> BatchMeans:
+    """Media y error estándar por vóxel a lo largo del eje de runs (eje 0)."""
+    n_batches = maps.shape[0]
+    mean = maps.mean(axis=0)
+    std_error = maps.std(axis=0, ddof=1) / np.sqrt(n_batches)
+    relative = np.full(mean.shape, np.nan)
+    np.divide(std_error, mean, out=relative, where=mean > 0)
+    return BatchMeans(mean, std_error, relative, n_batches)
+
+
+class ShellRatio:
+    """Cociente por capa entre dos histogramas del run (por defecto secundarias / primarias)."""
+
+    def __init__(self, x_edges, y_edges, numerator: int = 1, denominator: int = 0,
+                 shell_edges_mm: Sequence[float] = SHELL_EDGES_MM):
+        self.labels = np.asarray(shell_labels(x_edges, y_edges, shell_edges_mm))
+        self.n_shells = len(shell_edges_mm) - 1
+        self.numerator, self.denominator = numerator, denominator
+
+    def __call__(self, mean_maps: np.ndarray) -> np.ndarray:
+        selected = self.labels >= 0
+        shells = self.labels[selected]
+        sums = [np.bincount(shells, weights=mean_maps[h][selected], minlength=self.n_shells)
+                for h in (self.numerator, self.denominator)]
+        ratio = np.full(self.n_shells, np.nan)
+        np.divide(sums[0], sums[1], out=ratio, where=sums[1] > 0)
+        return ratio
+
+
+class RadialDose:
+    """g(r) de TG-43 del primer histograma en los radios pedidos."""
+
+    def __init__(self, x_edges, y_edges, radii_mm: Sequence[float] = REPORT_RADII_MM, **tg43_options):
+        self.x_edges, self.y_edges = np.asarray(x_edges), np.asarray(y_edges)
+        self.radii_mm = np.asarray(radii_mm, dtype=np.float64)
+        self.options = tg43_options
+
+    def __call__(self, mean_maps: np.ndarray) -> np.ndarray:
+        result = tg43_parameters(mean_maps[0], self.x_edges, self.y_edges, **self.options)
+        return np.interp(self.radii_mm, result.radii_mm, result.radial_dose)
+
+
+_worker_maps: Optional[np.ndarray] = None
+_worker_statistic: Optional[Statistic] = None
+
+
+def _init_worker(maps: np.ndarray, statistic: Statistic) -> None:
+    global _worker_maps, _worker_statistic
+    _worker_maps, _worker_statistic = maps, statistic
+
+
+def _resample_block(seed: np.random.SeedSequence, n_resamples: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    n_batches = _worker_maps.shape[0]
+    results = []
+    for _ in range(n_resamples):
+        # Contar repeticiones y ponderar evita copiar B mapas por remuestreo
+        weights = np.bincount(rng.integers(0, n_batches, n_batches), minlength=n_batches) / n_batches
+        results.append(_worker_statistic(np.tensordot(weights, _worker_maps, axes=1)))
+    return np.array(results)
+
+
+def bootstrap(
+    maps: np.ndarray,
+    statistic: Statistic,
+    n_resamples: int = N_RESAMPLES,
+    confidence: float = CONFIDENCE,
+    seed: int = 0,
+    max_workers: Optional[int] = None,
+) -> BootstrapResult:
+    """Intervalo bootstrap de `statistic(media de los runs)`.
+
+    `statistic` debe poder enviarse a otro proceso (función de módulo o
+    instancia de `ShellRatio`/`RadialDose`). El resultado es reproducible
+    para una misma `seed` con independencia del número de procesos."""
+    blocks = [min(RESAMPLES_PER_TASK, n_resamples - start) for start in range(0, n_resamples, RESAMPLES_PER_TASK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+    workers = max_workers or min(len(blocks), MAX_BOOTSTRAP_WORKERS, os.cpu_count() or 1)
+    if workers <= 1:
+        _init_worker(maps, statistic)
+        samples = [_resample_block(s, n) for s, n in zip(seeds, blocks)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(maps, statistic)) as pool:
+            samples = list(pool.map(_resample_block, seeds, blocks))
+    samples = np.concatenate(samples)
+    alpha = 0.5 * (1.0 - confidence)
+    low, high = np.nanpercentile(samples, [100.0 * alpha, 100.0 * (1.0 - alpha)], axis=0)
+    return BootstrapResult(
+        statistic(maps.mean(axis=0)), low, high, np.nanstd(samples, axis=0, ddof=1), confidence, n_resamples
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Batch means y bootstrap sobre runs repetidos")
+    parser.add_argument("paths", nargs="+", help="archivos o directorios con brachytherapy_<ts>.root")
+    parser.add_argument("--hist", default=DEFAULT_HIST)
+    parser.add_argument("--statistic", choices=("radial", "shells"), default="radial",
+                        help="g(r) de TG-43 o secundarias/primarias por capa")
+    parser.add_argument("--resamples", type=int, default=N_RESAMPLES)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    files: List[str] = []
+    for path in args.paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.root"))) if os.path.isdir(path) else [path])
+    hist_names = (PRIMARY_HIST, SECONDARY_HIST) if args.statistic == "shells" else (args.hist,)
+
+    for (directory, prefix), runs in group_runs(files).items():
+        print(f"\n{directory}/{prefix}_*: {len(runs)} runs")
+        if len(runs) < 2:
+            print("  (se necesitan al menos 2 runs)")
+            continue
+        try:
+            stack, errors = load_batches(runs, hist_names)
+        except (KeyError, ValueError) as exc:
+            print(f"  ⚠️ {exc}")
+            continue
+        for path, exc in errors.items():
+            print(f"  ⚠️ {os.path.basename(path)}: {exc}")
+
+        means = batch_means(stack.maps[:, 0])
+        high_dose = means.mean >= 0.1 * means.mean.max()
+        print(f"  Error relativo por vóxel (dosis ≥ 10% del máx.): mediana "
+              f"{100 * np.nanmedian(means.relative[high_dose]):.2f}%, máx {100 * np.nanmax(means.relative[high_dose]):.2f}%")
+
+        if args.statistic == "shells":
+            statistic = ShellRatio(stack.x_edges, stack.y_edges)
+            labels = [f"{a:g}-{b:g} mm" for a, b in zip(SHELL_EDGES_MM[:-1], SHELL_EDGES_MM[1:])]
+            title = "Secundarias/Primarias"
+        else:
+            statistic = RadialDose(stack.x_edges, stack.y_edges)
+            labels = [f"r = {r / 10:g} cm" for r in statistic.radii_mm]
+            title = "g(r)"
+        result = bootstrap(stack.maps, statistic, args.resamples, seed=args.seed, max_workers=args.workers)
+        print(f"  {title} (IC {100 * result.confidence:g}%, {result.n_resamples} remuestreos):")
+        for label, value, low, high in zip(labels, result.estimate, result.low, result.high):
+            print(f"    {label:>12s}: {value:.5f}  [{low:.5f}, {high:.5f}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""Lectores de los volcados de BrachyUserScoreWriter (ASCII `.out` y binario `.bin`).
+
+`/score/dumpQuantityToFile` escribe una línea `x y z valor` por vóxel con
+valor (mm, mm, mm, keV) y 16 dígitos de precisión, precedida de las
+cabeceras `# mesh name:` y `# primitive scorer name:`. En mallas 3D estos
+archivos ocupan cientos de MB, así que se leen por bloques de tamaño fijo,
+se parsean con NumPy y se vuelcan en una rejilla preasignada. No necesita
+ROOT ni uproot.
+
+Con la opción `binary` el writer escribe en su lugar un `.bin`: cabecera
+corta (malla, scorer, forma, semianchos) y un bloque contiguo de float64 en
+orden C, que aquí se mapea en memoria sin copias (`open_score_binary`).
+
+Con la opción `stat` ambos formatos llevan además `sum_wx2` (keV²), el
+número de entradas por vóxel y el número de eventos del run; se devuelven
+en los campos opcionales de `ScoreDump` (ver `dose_uncertainty`)."""
+
+import os
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+CHUNK_BYTES = 32 * 1024 * 1024
+BINARY_MAGIC = b"\x93BRSCORE"
+BINARY_PREAMBLE = 12
+HEADER_KEYS = {
+    "mesh name": "mesh_name",
+    "primitive scorer name": "scorer_name",
+    "number of events": "n_events",
+}
+COORD_COLUMNS = 3
+DEFAULT_COLUMNS = ("x", "y", "z", "sum_wx")
+
+
+class ScoreDump(NamedTuple):
+    """Rejilla (nx, ny, nz) en keV y centros de vóxel de cada eje en mm.
+
+    `sum_wx2`, `entries` y `n_events` solo se rellenan con la opción `stat`."""
+
+    mesh_name: str
+    scorer_name: str
+    values: np.ndarray
+    x_centers: np.ndarray
+    y_centers: np.ndarray
+    z_centers: np.ndarray
+    sum_wx2: Optional[np.ndarray] = None
+    entries: Optional[np.ndarray] = None
+    n_events: Optional[float] = None
+
+    @property
+    def centers(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.x_centers, self.y_centers, self.z_centers
+
+
+def read_header(path: str) -> Tuple[Dict[str, str], int]:
+    """Devuelve las cabeceras `# clave: valor` y el byte donde empiezan los datos."""
+    header: Dict[str, str] = {}
+    offset = 0
+    with open(path, "rb") as dump:
+        for raw_line in dump:
+            if not raw_line.startswith(b"#"):
+                break
+            offset += len(raw_line)
+            key, _, value = raw_line[1:].decode("ascii", "replace").partition(":")
+            key = key.strip()
+            header[HEADER_KEYS.get(key, key)] = value.strip()
+    return header, offset
+
+
+def iter_chunks(
+    path: str, offset: int = 0, chunk_bytes: int = CHUNK_BYTES, n_columns: int = len(DEFAULT_COLUMNS)
+) -> Iterator[np.ndarray]:
+    """Itera bloques (n, n_columns) de filas `x y z valor ...` cortando siempre en fin de línea."""
+    with open(path, "rb") as dump:
+        dump.seek(offset)
+        remainder = b""
+        while True:
+            block = dump.read(chunk_bytes)
+            if not block:
+                break
+            block = remainder + block
+            cut = block.rfind(b"\n") + 1
+            remainder = block[cut:]
+            if cut:
+                yield _parse_rows(block[:cut], path, n_columns)
+        if remainder.strip():
+            yield _parse_rows(remainder, path, n_columns)
+
+
+def _parse_rows(block: bytes, path: str, n_columns: int) -> np.ndarray:
+    # Conversión estricta: un token corrupto lanza en lugar de cortar el bloque en silencio
+    try:
+        numbers = np.array(block.split(), dtype=np.float64)
+    except ValueError as exc:
+        raise ValueError(f"Formato inesperado en {path}: {exc}") from exc
+    if numbers.size % n_columns:
+        raise ValueError(f"Formato inesperado en {path}: se esperaban {n_columns} columnas por fila")
+    return numbers.reshape(-1, n_columns)
+
+
+def _axis_centers(coords: np.ndarray, n_bins: Optional[int] = None) -> np.ndarray:
+    """Reconstruye los centros de un eje de la malla a partir de las coordenadas vistas.
+
+    El writer coloca los centros simétricos respecto al origen,
+    c_i = (2i - n + 1) * w / 2, así que los vóxeles vacíos de los bordes
+    también se recuperan a partir del paso y del extremo más alejado."""
+    coords = np.unique(coords)
+    steps = np.diff(coords)
+    if steps.size:
+        step = steps.min()
+    elif n_bins in (None, 1):
+        return coords
+    else:
+        raise ValueError("No se puede deducir el ancho de vóxel con una sola coordenada")
+    if n_bins is None:
+        half_extent = np.abs(coords).max()
+        n_bins = int(round(2.0 * half_extent / step)) + 1
+    return (np.arange(n_bins) - 0.5 * (n_bins - 1)) * step
+
+
+def read_score_dump(
+    path: str,
+    shape: Optional[Tuple[int, int, int]] = None,
+    chunk_bytes: int = CHUNK_BYTES,
+    dtype: type = np.float64,
+) -> ScoreDump:
+    """Lee un volcado `.out` completo en una rejilla (nx, ny, nz).
+
+    Primera pasada: coordenadas únicas por eje para deducir la forma (o usar
+    `shape` si se conoce). Segunda pasada: cada bloque se coloca en la
+    rejilla preasignada con índices vectorizados. Los vóxeles que no
+    aparecen en el archivo (sin depósito) quedan a cero."""
+    header, offset = read_header(path)
+    columns = tuple(header["columns"].split()) if "columns" in header else DEFAULT_COLUMNS
+    n_columns = len(columns)
+
+    seen = [np.empty(0), np.empty(0), np.empty(0)]
+    for rows in iter_chunks(path, offset, chunk_bytes, n_columns):
+        for axis in range(3):
+            seen[axis] = np.union1d(seen[axis], rows[:, axis])
+    if seen[0].size == 0:
+        raise ValueError(f"{path} no contiene vóxeles")
+
+    centers = [
+        _axis_centers(seen[axis], None if shape is None else shape[axis])
+        for axis in range(3)
+    ]
+    grid_shape = tuple(len(c) for c in centers)
+    arrays = {name: np.zeros(grid_shape, dtype=dtype) for name in columns[COORD_COLUMNS:]}
+    origins = [c[0] for c in centers]
+    steps = [c[1] - c[0] if len(c) > 1 else 1.0 for c in centers]
+
+    for rows in iter_chunks(path, offset, chunk_bytes, n_columns):
+        index = tuple(
+            np.rint((rows[:, axis] - origins[axis]) / steps[axis]).astype(np.intp)
+            for axis in range(3)
+        )
+        for column, name in enumerate(columns[COORD_COLUMNS:], start=COORD_COLUMNS):
+            arrays[name][index] = rows[:, column]
+
+    n_events = float(header["n_events"]) if "n_events" in header else None
+    return ScoreDump(
+        header.get("mesh_name", ""),
+        header.get("scorer_name", os.path.basename(path)),
+        arrays["sum_wx"],
+        *centers,
+        sum_wx2=arrays.get("sum_wx2"),
+        entries=arrays.get("entries"),
+        n_events=n_events,
+    )
+
+
+def symmetric_centers(n_bins: int, half_width: float) -> np.ndarray:
+    """Centros c_i = (2i - n + 1) * w / 2 con w = 2 * semiancho / n (como el writer)."""
+    width = 2.0 * half_width / n_bins
+    return (np.arange(n_bins) - 0.5 * (n_bins - 1)) * width
+
+
+def is_score_binary(path: str) -> bool:
+    with open(path, "rb") as dump:
+        return dump.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def read_binary_header(path: str) -> Tuple[Dict[str, str], int]:
+    """Devuelve la cabecera del `.bin` como {clave: texto} y el offset de los datos."""
+    with open(path, "rb") as dump:
+        preamble = dump.read(BINARY_PREAMBLE)
+        if preamble[: len(BINARY_MAGIC)] != BINARY_MAGIC:
+            raise ValueError(f"{path} no es un volcado binario de BrachyUserScoreWriter")
+        major = preamble[8]
+        if major != 1:
+            raise ValueError(f"Versión de formato binario no soportada ({major}) en {path}")
+        header_len = int.from_bytes(preamble[10:12], "little")
+        text = dump.read(header_len).decode("ascii")
+    header: Dict[str, str] = {}
+    for line in text.splitlines():
+        key, _, value = line.strip().partition(" ")
+        if key:
+            header[key] = value.strip()
+    return header, BINARY_PREAMBLE + header_len
+
+
+def open_score_binary(path: str) -> ScoreDump:
+    """Mapea en memoria un volcado `.bin` (valores en keV, solo lectura, sin copias).
+
+    Los `.bin` anteriores a la opción `stat` no traen la clave `arrays` y
+    contienen solo `sum_wx`."""
+    header, offset = read_binary_header(path)
+    shape = tuple(int(n) for n in header["shape"].split())
+    half_widths = [float(h) for h in header["halfwidth"].split()]
+    names = header.get("arrays", "sum_wx").split()
+    blocks = np.memmap(
+        path, dtype=np.dtype(header["dtype"]), mode="r", offset=offset, shape=(len(names),) + shape
+    )
+    arrays = dict(zip(names, blocks))
+    centers = [symmetric_centers(n, h) for n, h in zip(shape, half_widths)]
+    n_events = float(header["nevents"]) if "nevents" in header else None
+    return ScoreDump(
+        header.get("mesh", ""),
+        header.get("scorer", ""),
+        arrays["sum_wx"],
+        *centers,
+        sum_wx2=arrays.get("sum_wx2"),
+        entries=arrays.get("entries"),
+        n_events=n_events,
+    )
+
+
+def load_score(path: str, **kwargs) -> ScoreDump:
+    """Abre un volcado del writer sea ASCII (`.out`) o binario (`.bin`)."""
+    if is_score_binary(path):
+        return open_score_binary(path)
+    return read_score_dump(path, **kwargs)
@@ -0,0 +1,165 @@
+//
+// ********************************************************************
+// * License and Disclaimer                                           *
+// *                                                                  *
+// * The  Geant4 software  is  copyright of the Copyright Holders  of *
+// * the Geant4 Collaboration.  It is provided  under  the terms  and *
+// * conditions of the Geant4 Software License,  included in the file *
+// * LICENSE and available at  http://cern.ch/geant4/license .  These *
+// * include a list of copyright holders.                             *
+// *                                                                  *
+// * Neither the authors of this software system, nor their employing *
+// * institutes,nor the agencies providing financial support for this *
+// * work  make  any representation or  warranty, express or implied, *
+// * regarding  this  software system or assume any liability for its *
+// * use.  Please see the license in the file  LICENSE  and URL above *
+// * for the full disclaimer and the limitation of liability.         *
+// *                                                                  *
+// * This  code  implementation is the result of  the  scientific and *
+// * technical work of the GEANT4 collaboration.                      *
+// * By using,  copying,  modifying or  distributing the software (or *
+// * any work based  on the software)  you  agree  to acknowledge its *
+// * use  in  resulting  scientific  publications,  and indicate your *
+// * acceptance of all terms of the Geant4 Software license.          *
+// ********************************************************************
+//
+//
+//
+//
+//    ***************************************
+//    *                                     *
+//    *    BrachyConvergenceControl.cc      *
+//    *                                     *
+//    ***************************************
+//
+//
+#include "BrachyConvergenceControl.hh"
+#include "BrachyRunAction.hh"
+#include "G4RunManager.hh"
+#include "G4ScoringManager.hh"
+#include "G4VScoringMesh.hh"
+#include "G4THitsMap.hh"
+#include "G4StatDouble.hh"
+#include "G4ios.hh"
+
+#include <algorithm>
+#include <cfloat>
+#include <cmath>
+
+BrachyConvergenceControl::BrachyConvergenceControl(BrachyRunAction* runAction)
+: fRunAction(runAction)
+{}
+
+G4VScoringMesh* BrachyConvergenceControl::FindMesh() const
+{
+  auto scoringManager = G4ScoringManager::GetScoringManagerIfExist();
+  if (!scoringManager) return nullptr;
+  if (!fMeshName.empty()) return scoringManager -> FindMesh(fMeshName);
+  // Without an explicit name, the first (usually the only) mesh
+  return scoringManager -> GetNumberOfMesh() > 0 ? scoringManager -> GetMesh(0) : nullptr;
+}
+
+void BrachyConvergenceControl::BeamOn(G4int maxEvents, G4int batchEvents)
+{
+  if (maxEvents <= 0 || batchEvents <= 0) {
+    G4cerr << "BrachyConvergenceControl: the event budget and the batch size must be positive"
+           << G4endl;
+    return;
+  }
+  if (!FindMesh()) {
+    G4cerr << "BrachyConvergenceControl: scoring mesh " << fMeshName
+           << " not found, define it with /score/create before the run" << G4endl;
+    return;
+  }
+
+  // Scoring meshes accumulate over runs: start from empty meshes so that
+  // the event count used for the uncertainty matches the scores
+  auto scoringManager = G4ScoringManager::GetScoringManagerIfExist();
+  for (size_t iMesh = 0; iMesh < scoringManager -> GetNumberOfMesh(); ++iMesh)
+    scoringManager -> GetMesh(iMesh) -> ResetScore();
+  BrachyRunAction::ResetScoredEvents();
+
+  G4cout << "### Convergence run: target " << fTargetUncertainty*100. << " % on "
+         << fScorerName << " in the box centred at " << fRegionCenter/CLHEP::mm
+         << " mm (half size " << fRegionHalfSize/CLHEP::mm << " mm), at most "
+         << maxEvents << " events in batches of " << batchEvents << G4endl;
+
+  auto runManager = G4RunManager::GetRunManager();
+  G4int processedEvents = 0;
+  G4int batch = 0;
+  G4double uncertainty = -1.;
+  while (processedEvents < maxEvents) {
+    const G4int eventsInBatch = std::min(batchEvents, maxEvents - processedEvents);
+    BrachyRunAction::SetBatchState(true, batch > 0);
+    runManager -> BeamOn(eventsInBatch);
+    processedEvents += eventsInBatch;
+    ++batch;
+
+    uncertainty = EvaluateRegionUncertainty(BrachyRunAction::GetScoredEvents());
+    G4cout << "### Batch " << batch << ": " << processedEvents << " events, ";
+    if (uncertainty < 0.) G4cout << "uncertainty not available" << G4endl;
+    else if (uncertainty == DBL_MAX) G4cout << "region voxels without deposit" << G4endl;
+    else G4cout << "max relative uncertainty " << uncertainty*100. << " %" << G4endl;
+
+    if (uncertainty >= 0. && uncertainty <= fTargetUncertainty) break;
+  }
+
+  BrachyRunAction::SetBatchState(false, false);
+  fRunAction -> CloseBatchedOutput();
+
+  if (uncertainty >= 0. && uncertainty <= fTargetUncertainty)
+    G4cout << "### Convergence reached after " << processedEvents << " events" << G4endl;
+  else
+    G4cout << "### Event budget spent (" << processedEvents
+           << " events) before reaching the target uncertainty" << G4endl;
+}
+
+G4double BrachyConvergenceControl::EvaluateRegionUncertainty(G4double numberOfEvents) const
+{
+  G4VScoringMesh* mesh = FindMesh();
+  if (!mesh || numberOfEvents < 2.) return -1.;
+
+  auto scoreMap = mesh -> GetScoreMap();
+  auto msMapItr = scoreMap.find(fScorerName);
+  if (msMapItr == scoreMap.end()) {
+    G4cerr << "BrachyConvergenceControl: scorer " << fScorerName << " not found" << G4endl;
+    return -1.;
+  }
+  auto score = msMapItr -> second -> GetMap();
+
+  G4int nSegments[3];
+  mesh -> GetNumberOfSegments(nSegments);
+  const G4ThreeVector halfWidth = mesh -> GetSize();
+  const G4ThreeVector translation = mesh -> GetTranslation();
+
+  // Index range of the voxels whose centre lies inside the region, per axis
+  G4int first[3], last[3];
+  for (G4int axis = 0; axis < 3; ++axis) {
+    const G4double width = 2.*halfWidth[axis]/nSegments[axis];
+    const G4double origin = translation[axis] - halfWidth[axis];
+    const G4double lo = fRegionCenter[axis] - fRegionHalfSize[axis];
+    const G4double hi = fRegionCenter[axis] + fRegionHalfSize[axis];
+    first[axis] = std::max(0, (G4int)std::ceil((lo - origin)/width - 0.5));
+    last[axis] = std::min(nSegments[axis] - 1, (G4int)std::floor((hi - origin)/width - 0.5));
+    if (first[axis] > last[axis]) {
+      G4cerr << "BrachyConvergenceControl: no voxel centre inside the region" << G4endl;
+      return -1.;
+    }
+  }
+
+  // Relative uncertainty of the mean deposit per event (events without
+  // deposit count as zeros), as in dose_uncertainty.py
+  const G4double correction = std::sqrt(numberOfEvents/(numberOfEvents - 1.));
+  G4double worst = 0.;
+  for (G4int ix = first[0]; ix <= last[0]; ++ix)
+    for (G4int iy = first[1]; iy <= last[1]; ++iy)
+      for (G4int iz = first[2]; iz <= last[2]; ++iz) {
+        const G4int idx = (ix*nSegments[1] + iy)*nSegments[2] + iz;
+        auto entry = score -> find(idx);
+        if (entry == score -> end() || entry -> second -> sum_wx() <= 0.) return DBL_MAX;
+        const G4double sum = entry -> second -> sum_wx();
+        const G4double spread = std::max(entry -> second -> sum_wx2() - sum*sum/numberOfEvents, 0.);
+        worst = std::max(worst, std::sqrt(spread)/sum*correction);
+      }
+  return worst;
+}
@@ -178,6 +178,29 @@ void BrachyDetectorConstruction::SelectBrachytherapicSeed(G4String val)
  G4cout << "Now the brachy source is " << val << G4endl;
 }
 
+G4String BrachyDetectorConstruction::GetSourceName() const
+{
+  // Same mapping as SwitchBrachytherapicSeed (Flexi is the default source)
+  switch(fDetectorChoice)
+  {
+   case 1: return "Iodine";
+   case 2: return "Leipzig";
+   case 3: return "TG186";
+   case 5: return "Oncura";
+   default: return "Flexi";
+  }
+}
+
+G4Material* BrachyDetectorConstruction::GetPhantomMaterial() const
+{
+  return fPhantomLog ? fPhantomLog -> GetMaterial() : nullptr;
+}
+
+G4Material* BrachyDetectorConstruction::GetHeterogeneityMaterial() const
+{
+  return G4NistManager::Instance() -> FindOrBuildMaterial(fHeterogeneityMaterialName);
+}
+
 void BrachyDetectorConstruction::ConstructPhantom()
 {
   // Model the water phantom 
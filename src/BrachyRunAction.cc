@@ -41,6 +41,9 @@
 //
 
 #include "BrachyRunAction.hh"
+#include "BrachyConvergenceControl.hh"
+#include "BrachyDetectorConstruction.hh"
+#include "BrachyRunMessenger.hh"
 #include "G4AnalysisManager.hh"
 #include "G4Run.hh"
 #include "G4RunManager.hh"
@@ -51,11 +54,13 @@
 #include "G4VScoringMesh.hh"
 #include "G4MultiFunctionalDetector.hh"
 #include "G4VPrimitiveScorer.hh"
+#include "G4Material.hh"
 #include "globals.hh"
 
 #include "BrachyParentFilter.hh"
 
 #include <ctime>
+#include <fstream>
 #include <iomanip>
 #include <sstream>
 
@@ -68,6 +73,48 @@ namespace {
     oss << std::put_time(&tm, "%Y%m%d_%H%M%S");
     return oss.str();
   }
+
+  G4String Quote(const G4String& text) {
+    G4String quoted = "\"";
+    for (char c : text) {
+      if (c == '"' || c == '\\') quoted += '\\';
+      quoted += c;
+    }
+    return quoted + "\"";
+  }
+
+  G4String JsonVector(const G4ThreeVector& v, G4double unit) {
+    std::ostringstream oss;
+    oss << std::setprecision(10) << "[" << v.x()/unit << ", " << v.y()/unit
+        << ", " << v.z()/unit << "]";
+    return oss.str();
+  }
+
+  G4String JsonMaterial(const G4Material* material) {
+    std::ostringstream oss;
+    oss << std::setprecision(10) << "\"material\": "
+        << Quote(material ? material -> GetName() : G4String(""))
+        << ", \"density_g_cm3\": "
+        << (material ? material -> GetDensity()/(g/cm3) : 0.);
+    return oss.str();
+  }
+}
+
+G4bool BrachyRunAction::fgBatchedRun = false;
+G4bool BrachyRunAction::fgContinuedBatch = false;
+G4double BrachyRunAction::fgScoredEvents = 0.;
+G4String BrachyRunAction::fgProvenance;
+
+BrachyRunAction::BrachyRunAction()
+{
+  fConvergenceControl = new BrachyConvergenceControl(this);
+  fRunMessenger = new BrachyRunMessenger(this);
+}
+
+BrachyRunAction::~BrachyRunAction()
+{
+  delete fRunMessenger;
+  delete fConvergenceControl;
 }
 
 void BrachyRunAction::BeginOfRunAction(const G4Run* aRun)
@@ -76,23 +123,44 @@ G4cout << "### Run " << aRun -> GetRunID() << " start." << G4endl;
 
 auto analysisManager = G4AnalysisManager::Instance();
 
+// Later batches of a convergence-controlled run keep the file opened by
+// the master in the first batch and the histograms already booked
+const G4bool continuedBatch = fgBatchedRun && fgContinuedBatch;
+
+// Wall/CPU time of the whole run (all the batches) for the provenance
+if (IsMaster() && !continuedBatch) fTimer.Start();
+
+if (!continuedBatch || !IsMaster()) {
+// A single-file run left open by a previous run without any
+// /score/dumpAllQuantitiesToFile: flush it before starting a new one
+if (fSingleOutputFile && analysisManager -> IsOpenFile()) {
+  analysisManager -> Write();
+  analysisManager -> CloseFile();
+  WriteProvenance(fOutputFileName, {HistogramEntry("h10", {0., 800., 800})});
+}
+
 // Generate filename with timestamp
 G4String timestamp = GetTimestampString();
-G4String fileName = "primary_" + timestamp + ".root";
+G4String fileName = (fSingleOutputFile ? "brachytherapy_" : "primary_")
+                    + timestamp + ".root";
 
 G4bool fileOpen = analysisManager -> OpenFile(fileName);
+fOutputFileName = fileName;
 
 if (! fileOpen) {
     G4cerr << "\n---> The ROOT output file has not been opened "
            << analysisManager->GetFileName() << G4endl;
   }
-  
+}
+
+if (!continuedBatch) {
 G4cout << "Using " << analysisManager->GetType() << G4endl;
 analysisManager -> SetVerboseLevel(1);
 
 // Create histogram with the energy spectrum of the photons emitted by the
 // radionucldie
 analysisManager -> CreateH1("h10","energy spectrum", 800, 0., 800.);
+}
 
 ConfigureDoseFilters();
 }
@@ -103,8 +171,136 @@ G4cout << "number of events = " << aRun->GetNumberOfEvent() << G4endl;
  
 // save histograms in primary.root
 auto analysisManager = G4AnalysisManager::Instance();
+
+if (IsMaster()) {
+  fgScoredEvents += aRun->GetNumberOfEvent();
+  fTimer.Stop();
+  RecordProvenance(aRun);
+}
+
+// Batches of a convergence-controlled run: the master file stays open
+// until BrachyConvergenceControl decides to stop
+if (fgBatchedRun && IsMaster()) return;
+
+// In single-file mode the master leaves the file open (and h10 filled):
+// BrachyUserScoreWriter::DumpAllQuantitiesToFile adds the scorers, writes
+// and closes it. Workers still write, which merges h10 into the master.
+if (fSingleOutputFile && IsMaster()) return;
+
 analysisManager -> Write();
 analysisManager -> CloseFile();
+
+if (IsMaster())
+  WriteProvenance(fOutputFileName, {HistogramEntry("h10", {0., 800., 800})});
+}
+
+void BrachyRunAction::CloseBatchedOutput()
+{
+  // In single-file mode the file stays open for /score/dumpAllQuantitiesToFile
+  if (fSingleOutputFile) return;
+
+  auto analysisManager = G4AnalysisManager::Instance();
+  analysisManager -> Write();
+  analysisManager -> CloseFile();
+  WriteProvenance(fOutputFileName, {HistogramEntry("h10", {0., 800., 800})});
+}
+
+void BrachyRunAction::RecordProvenance(const G4Run* aRun)
+{
+  auto runManager = G4RunManager::GetRunManager();
+  auto detector = dynamic_cast<const BrachyDetectorConstruction*>
+                  (runManager -> GetUserDetectorConstruction());
+
+  std::ostringstream json;
+  json << std::setprecision(10)
+       << "  \"run_id\": " << aRun -> GetRunID() << ",\n"
+       << "  \"events\": " << fgScoredEvents << ",\n"
+       << "  \"run_events\": " << aRun -> GetNumberOfEvent() << ",\n"
+       << "  \"threads\": " << runManager -> GetNumberOfThreads() << ",\n"
+       << "  \"wall_time_s\": " << fTimer.GetRealElapsed() << ",\n"
+       << "  \"cpu_time_s\": "
+       << fTimer.GetUserElapsed() + fTimer.GetSystemElapsed() << ",\n";
+
+  if (detector) {
+    json << "  \"source\": " << Quote(detector -> GetSourceName()) << ",\n"
+         << "  \"phantom\": {" << JsonMaterial(detector -> GetPhantomMaterial())
+         << ", \"half_size_mm\": " << JsonVector(detector -> GetPhantomHalfSize(), mm)
+         << "},\n"
+         << "  \"heterogeneity\": {\"enabled\": "
+         << (detector -> IsHeterogeneityEnabled() ? "true" : "false") << ", "
+         << JsonMaterial(detector -> GetHeterogeneityMaterial())
+         << ", \"size_mm\": "
+         << JsonVector(2. * detector -> GetHeterogeneityHalfLengths(), mm)
+         << ", \"position_mm\": "
+         << JsonVector(detector -> GetHeterogeneityPosition(), mm) << "},\n";
+  }
+
+  // Scoring meshes: half-widths as given to /score/mesh/boxSize
+  json << "  \"meshes\": [";
+  auto scoringManager = G4ScoringManager::GetScoringManagerIfExist();
+  const size_t meshCount = scoringManager ? scoringManager -> GetNumberOfMesh() : 0;
+  for (size_t iMesh = 0; iMesh < meshCount; ++iMesh) {
+    G4VScoringMesh* mesh = scoringManager -> GetMesh(iMesh);
+    G4int nSegments[3];
+    mesh -> GetNumberOfSegments(nSegments);
+    json << (iMesh ? "," : "") << "\n    {\"name\": " << Quote(mesh -> GetWorldName())
+         << ", \"half_widths_mm\": " << JsonVector(mesh -> GetSize(), mm)
+         << ", \"bins\": [" << nSegments[0] << ", " << nSegments[1] << ", "
+         << nSegments[2] << "], \"scorers\": [";
+    G4bool first = true;
+    for (const auto& scorer : mesh -> GetScoreMap()) {
+      json << (first ? "" : ", ") << Quote(scorer.first);
+      first = false;
+    }
+    json << "]}";
+  }
+  json << "\n  ]";
+
+  fgProvenance = json.str();
+}
+
+G4String BrachyRunAction::HistogramEntry(const G4String& name,
+                                         const std::vector<G4double>& axes)
+{
+  // axes: lo, hi, nbins for each axis (the edges of the catalog)
+  std::ostringstream entry;
+  entry << std::setprecision(10) << "{\"name\": " << Quote(name) << ", \"edges\": [";
+  for (size_t i = 0; i + 2 < axes.size(); i += 3)
+    entry << (i ? ", " : "") << "[" << axes[i] << ", " << axes[i + 1] << ", "
+          << static_cast<G4int>(axes[i + 2]) << "]";
+  entry << "]}";
+  return entry.str();
+}
+
+void BrachyRunAction::WriteProvenance(const G4String& rootFileName,
+                                      const std::vector<G4String>& histograms)
+{
+  // Nothing to describe before the first run
+  if (fgProvenance.empty() || rootFileName.empty()) return;
+
+  G4String jsonFileName = rootFileName;
+  const G4String extension = ".root";
+  if (jsonFileName.size() > extension.size()
+      && jsonFileName.compare(jsonFileName.size() - extension.size(),
+                              extension.size(), extension) == 0)
+    jsonFileName.erase(jsonFileName.size() - extension.size());
+  jsonFileName += ".json";
+
+  std::ofstream ofile(jsonFileName);
+  if (!ofile) {
+    G4cerr << "\n---> The provenance file has not been written "
+           << jsonFileName << G4endl;
+    return;
+  }
+  ofile << "{\n"
+        << "  \"file\": " << Quote(rootFileName) << ",\n"
+        << "  \"written\": " << Quote(GetTimestampString()) << ",\n"
+        << fgProvenance << ",\n"
+        << "  \"histograms\": [";
+  for (size_t i = 0; i < histograms.size(); ++i)
+    ofile << (i ? "," : "") << "\n    " << histograms[i];
+  ofile << "\n  ]\n}\n";
+  G4cout << "Provenance written to " << jsonFileName << G4endl;
 }
 
 void BrachyRunAction::ConfigureDoseFilters() const
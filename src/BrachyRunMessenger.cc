@@ -0,0 +1,164 @@
+//
+// ********************************************************************
+// * License and Disclaimer                                           *
+// *                                                                  *
+// * The  Geant4 software  is  copyright of the Copyright Holders  of *
+// * the Geant4 Collaboration.  It is provided  under  the terms  and *
+// * conditions of the Geant4 Software License,  included in the file *
+// * LICENSE and available at  http://cern.ch/geant4/license .  These *
+// * include a list of copyright holders.                             *
+// *                                                                  *
+// * Neither the authors of this software system, nor their employing *
+// * institutes,nor the agencies providing financial support for this *
+// * work  make  any representation or  warranty, express or implied, *
+// * regarding  this  software system or assume any liability for its *
+// * use.  Please see the license in the file  LICENSE  and URL above *
+// * for the full disclaimer and the limitation of liability.         *
+// *                                                                  *
+// * This  code  implementation is the result of  the  scientific and *
+// * technical work of the GEANT4 collaboration.                      *
+// * By using,  copying,  modifying or  distributing the software (or *
+// * any work based  on the software)  you  agree  to acknowledge its *
+// * use  in  resulting  scientific  publications,  and indicate your *
+// * acceptance of all terms of the Geant4 Software license.          *
+// ********************************************************************
+//
+//
+//
+// --------------------------------------------------------------
+//                 GEANT 4 - Brachytherapy example
+// --------------------------------------------------------------
+//
+//    *******************************
+//    *                             *
+//    *    BrachyRunMessenger.cc    *
+//    *                             *
+//    *******************************
+//
+//
+#include "BrachyRunMessenger.hh"
+#include "BrachyRunAction.hh"
+#include "BrachyConvergenceControl.hh"
+#include "G4UIdirectory.hh"
+#include "G4UIcommand.hh"
+#include "G4UIparameter.hh"
+#include "G4UIcmdWithABool.hh"
+#include "G4UIcmdWithADouble.hh"
+#include "G4UIcmdWithAString.hh"
+#include "G4UIcmdWith3VectorAndUnit.hh"
+
+#include <sstream>
+
+BrachyRunMessenger::BrachyRunMessenger(BrachyRunAction* runAction)
+:G4UImessenger(),
+ fRunAction(runAction), fBrachyDir(nullptr), fOutputDir(nullptr),
+ fSingleFileCmd(nullptr), fConvergenceDir(nullptr), fMeshCmd(nullptr),
+ fScorerCmd(nullptr), fTargetCmd(nullptr), fRegionCenterCmd(nullptr),
+ fRegionHalfSizeCmd(nullptr), fBeamOnCmd(nullptr)
+{
+  fBrachyDir = new G4UIdirectory("/brachy/");
+  fBrachyDir -> SetGuidance("Brachytherapy example run control.");
+
+  fOutputDir = new G4UIdirectory("/brachy/output/");
+  fOutputDir -> SetGuidance("Control of the ROOT output files.");
+
+  fSingleFileCmd = new G4UIcmdWithABool("/brachy/output/singleFile", this);
+  fSingleFileCmd -> SetGuidance("Write one ROOT file per run (brachytherapy_<timestamp>.root)");
+  fSingleFileCmd -> SetGuidance("holding h10 and all the scorers dumped afterwards with");
+  fSingleFileCmd -> SetGuidance("/score/dumpAllQuantitiesToFile, instead of primary_<timestamp>.root");
+  fSingleFileCmd -> SetGuidance("plus one ROOT file per /score/dumpQuantityToFile call.");
+  fSingleFileCmd -> SetParameterName("singleFile", true);
+  fSingleFileCmd -> SetDefaultValue(true);
+  fSingleFileCmd -> AvailableForStates(G4State_PreInit, G4State_Idle);
+
+  // Convergence-controlled runs are driven by the master only: none of
+  // these commands is broadcast to the worker threads
+  fConvergenceDir = new G4UIdirectory("/brachy/convergence/");
+  fConvergenceDir -> SetGuidance("Runs stopped on a target statistical uncertainty.");
+
+  fMeshCmd = new G4UIcmdWithAString("/brachy/convergence/mesh", this);
+  fMeshCmd -> SetGuidance("Scoring mesh checked after each batch (default: the first mesh).");
+  fMeshCmd -> SetParameterName("mesh", false);
+  fMeshCmd -> AvailableForStates(G4State_PreInit, G4State_Idle);
+  fMeshCmd -> SetToBeBroadcasted(false);
+
+  fScorerCmd = new G4UIcmdWithAString("/brachy/convergence/scorer", this);
+  fScorerCmd -> SetGuidance("Primitive scorer of the mesh checked after each batch.");
+  fScorerCmd -> SetParameterName("scorer", true);
+  fScorerCmd -> SetDefaultValue("eDep");
+  fScorerCmd -> AvailableForStates(G4State_PreInit, G4State_Idle);
+  fScorerCmd -> SetToBeBroadcasted(false);
+
+  fTargetCmd = new G4UIcmdWithADouble("/brachy/convergence/target", this);
+  fTargetCmd -> SetGuidance("Target relative uncertainty (e.g. 0.01 for 1 %) of the worst");
+  fTargetCmd -> SetGuidance("voxel of the region.");
+  fTargetCmd -> SetParameterName("target", false);
+  fTargetCmd -> SetRange("target > 0.");
+  fTargetCmd -> AvailableForStates(G4State_PreInit, G4State_Idle);
+  fTargetCmd -> SetToBeBroadcasted(false);
+
+  fRegionCenterCmd = new G4UIcmdWith3VectorAndUnit("/brachy/convergence/regionCenter", this);
+  fRegionCenterCmd -> SetGuidance("Centre of the region (default: 1 cm reference point).");
+  fRegionCenterCmd -> SetParameterName("x", "y", "z", false);
+  fRegionCenterCmd -> SetDefaultUnit("mm");
+  fRegionCenterCmd -> AvailableForStates(G4State_PreInit, G4State_Idle);
+  fRegionCenterCmd -> SetToBeBroadcasted(false);
+
+  fRegionHalfSizeCmd = new G4UIcmdWith3VectorAndUnit("/brachy/convergence/regionHalfSize", this);
+  fRegionHalfSizeCmd -> SetGuidance("Half size of the region: voxels whose centre lies inside");
+  fRegionHalfSizeCmd -> SetGuidance("are checked (e.g. 3 3 3 cm for the heterogeneity cube).");
+  fRegionHalfSizeCmd -> SetParameterName("dx", "dy", "dz", false);
+  fRegionHalfSizeCmd -> SetDefaultUnit("mm");
+  fRegionHalfSizeCmd -> AvailableForStates(G4State_PreInit, G4State_Idle);
+  fRegionHalfSizeCmd -> SetToBeBroadcasted(false);
+
+  fBeamOnCmd = new G4UIcommand("/brachy/convergence/beamOn", this);
+  fBeamOnCmd -> SetGuidance("Run batches of batchEvents events until the target uncertainty");
+  fBeamOnCmd -> SetGuidance("is reached in the region or maxEvents events have been run.");
+  auto maxEventsParam = new G4UIparameter("maxEvents", 'i', false);
+  maxEventsParam -> SetParameterRange("maxEvents > 0");
+  fBeamOnCmd -> SetParameter(maxEventsParam);
+  auto batchEventsParam = new G4UIparameter("batchEvents", 'i', false);
+  batchEventsParam -> SetParameterRange("batchEvents > 0");
+  fBeamOnCmd -> SetParameter(batchEventsParam);
+  fBeamOnCmd -> AvailableForStates(G4State_Idle);
+  fBeamOnCmd -> SetToBeBroadcasted(false);
+}
+
+BrachyRunMessenger::~BrachyRunMessenger()
+{
+  delete fBeamOnCmd;
+  delete fRegionHalfSizeCmd;
+  delete fRegionCenterCmd;
+  delete fTargetCmd;
+  delete fScorerCmd;
+  delete fMeshCmd;
+  delete fConvergenceDir;
+  delete fSingleFileCmd;
+  delete fOutputDir;
+  delete fBrachyDir;
+}
+
+void BrachyRunMessenger::SetNewValue(G4UIcommand* command, G4String newValue)
+{
+  if (command == fSingleFileCmd)
+   { fRunAction -> SetSingleOutputFile(fSingleFileCmd -> GetNewBoolValue(newValue)); }
+
+  auto convergence = fRunAction -> GetConvergenceControl();
+
+  if (command == fMeshCmd) convergence -> SetMeshName(newValue);
+  if (command == fScorerCmd) convergence -> SetScorerName(newValue);
+  if (command == fTargetCmd)
+   { convergence -> SetTargetUncertainty(fTargetCmd -> GetNewDoubleValue(newValue)); }
+  if (command == fRegionCenterCmd)
+   { convergence -> SetRegionCenter(fRegionCenterCmd -> GetNew3VectorValue(newValue)); }
+  if (command == fRegionHalfSizeCmd)
+   { convergence -> SetRegionHalfSize(fRegionHalfSizeCmd -> GetNew3VectorValue(newValue)); }
+
+  if (command == fBeamOnCmd) {
+    G4int maxEvents = 0, batchEvents = 0;
+    std::istringstream is(newValue);
+    is >> maxEvents >> batchEvents;
+    convergence -> BeamOn(maxEvents, batchEvents);
+  }
+}
@@ -38,11 +38,15 @@ Original code from geant4/examples/extended/runAndEvent/RE03, by M. Asai
 #include "G4VPrimitiveScorer.hh"
 #include "G4VScoringMesh.hh"
 #include "G4SystemOfUnits.hh" 
+#include "G4RunManager.hh"
+#include "G4Run.hh"
+#include "BrachyRunAction.hh"
 #include <map>
 #include <fstream>
 #include <ctime>
 #include <iomanip>
 #include <sstream>
+#include <vector>
 
 // Helper function to generate timestamp string
 static G4String GetTimestampString() {
@@ -52,6 +56,68 @@ static G4String GetTimestampString() {
   oss << std::put_time(&tm, "%Y%m%d_%H%M%S");
   return oss.str();
 }
+
+// Binary dump layout (option "binary"):
+//   8 bytes  magic "\x93BRSCORE"
+//   2 bytes  format version (major, minor)
+//   2 bytes  header length in bytes, little endian
+//   header   ASCII "key value" lines (mesh, scorer, shape nx ny nz,
+//            halfwidth hx hy hz in mm, unit, dtype, order, nevents,
+//            arrays), padded with spaces and terminated by '\n' so that
+//            the data start at a multiple of 64 bytes
+//   data     one block of nx*ny*nz doubles per name listed in "arrays",
+//            each in C order (x slowest, z fastest), i.e. the
+//            G4VScoreWriter::GetIndex() order: sum_wx (edep in keV) and,
+//            with the option "stat", sum_wx2 (keV^2) and entries
+static G4bool WriteBinaryDump(const G4String& fileName,
+                              const G4String& meshName,
+                              const G4String& psName,
+                              const G4int nSegments[3],
+                              const G4ThreeVector& halfWidth,
+                              G4double numberOfEvents,
+                              const std::vector<G4String>& arrayNames,
+                              const std::vector<std::vector<G4double>>& arrays)
+{
+  std::ofstream bfile(fileName, std::ios::binary);
+  if (!bfile) return false;
+
+  const G4int one = 1;
+  const G4bool littleEndian = *reinterpret_cast<const char*>(&one) == 1;
+
+  std::ostringstream header;
+  header << std::setprecision(16)
+         << "mesh " << meshName << "\n"
+         << "scorer " << psName << "\n"
+         << "shape " << nSegments[0] << " " << nSegments[1] << " " << nSegments[2] << "\n"
+         << "halfwidth " << halfWidth.x()/mm << " " << halfWidth.y()/mm << " "
+         << halfWidth.z()/mm << "\n"
+         << "unit keV\n"
+         << "dtype " << (littleEndian ? "<f8" : ">f8") << "\n"
+         << "order C\n"
+         << "nevents " << numberOfEvents << "\n"
+         << "arrays";
+  for (const auto& name : arrayNames) header << " " << name;
+  header << "\n";
+  std::string headerText = header.str();
+  const std::size_t preamble = 12;
+  const std::size_t padding = 64 - (preamble + headerText.size() + 1) % 64;
+  headerText.append(padding % 64, ' ');
+  headerText += '\n';
+
+  const std::size_t headerLength = headerText.size();
+  const char magic[8] = {'\x93', 'B', 'R', 'S', 'C', 'O', 'R', 'E'};
+  const char preambleTail[4] = {1, 0,
+                                static_cast<char>(headerLength & 0xFF),
+                                static_cast<char>((headerLength >> 8) & 0xFF)};
+  bfile.write(magic, sizeof(magic));
+  bfile.write(preambleTail, sizeof(preambleTail));
+  bfile.write(headerText.data(), headerLength);
+  for (const auto& values : arrays)
+    bfile.write(reinterpret_cast<const char*>(values.data()),
+                values.size() * sizeof(G4double));
+  return static_cast<G4bool>(bfile);
+}
+
 // The default output is
 // voxelX, voxelY, voxelZ, edep
 // The BrachyUserScoreWriter allows to change the format of the output file.
@@ -59,6 +125,17 @@ static G4String GetTimestampString() {
 // xx (mm)  yy(mm) zz(mm) edep(keV)
 // The same information is stored in a ntuple, in the 
 // brachytherapy.root file
+// With the option "binary" the ASCII file is replaced by a compact
+// binary dump (see WriteBinaryDump) that can be memory-mapped from Python.
+// With the option "stat" the second moment sum_wx2 (keV^2) and the number
+// of entries kept by G4StatDouble are exported too, together with the
+// number of events of the run, so that per-voxel statistical
+// uncertainties can be computed: extra ASCII columns, extra binary arrays
+// and the histograms <h2>_sumwx2, <h2>_entries and <h2>_nevents.
+// With the option "3d" the full mesh is also stored as a 3D histogram
+// (h30 for eDep, h3_<scorer> otherwise) next to the XY projection.
+// /score/dumpAllQuantitiesToFile stores every scorer of the mesh in one
+// ROOT file (see DumpAllQuantitiesToFile).
 
 BrachyUserScoreWriter::BrachyUserScoreWriter():
 G4VScoreWriter() 
@@ -85,6 +162,17 @@ std::transform(opt.begin(), opt.end(), opt.begin(), (int (*)(int))(tolower));
 
 // confirm the option
 if(opt.size() == 0) opt = "csv";
+G4bool binaryOutput = (opt.find("binary") != std::string::npos);
+G4bool volumeOutput = (opt.find("3d") != std::string::npos);
+G4bool statOutput = (opt.find("stat") != std::string::npos);
+
+// Number of events accumulated in the meshes (all the runs since the last
+// reset, e.g. every batch of a convergence-controlled run), needed to turn
+// sum_wx2 into a variance; the last run only as a fallback
+G4double numberOfEvents = BrachyRunAction::GetScoredEvents();
+auto runManager = G4RunManager::GetRunManager();
+if (numberOfEvents <= 0. && runManager && runManager -> GetCurrentRun())
+  numberOfEvents = runManager -> GetCurrentRun() -> GetNumberOfEvent();
 
 // Generate filename with timestamp
 G4String timestamp = GetTimestampString();
@@ -97,16 +185,21 @@ if (dotPos != std::string::npos) {
 } else {
   fileNameWithTimestamp = baseFileName + "_" + timestamp;
 }
-
-// open the file
-std::ofstream ofile(fileNameWithTimestamp);
-  
-if(!ofile) 
-{
-   G4cerr << "ERROR : DumpToFile : File open error -> " << fileName << G4endl;
-   return;
+if (binaryOutput) {
+  fileNameWithTimestamp = baseFileName.substr(0, dotPos) + "_" + timestamp + ".bin";
 }
+
+// open the file (the binary dump is written in one go at the end)
+std::ofstream ofile;
+if (!binaryOutput) {
+  ofile.open(fileNameWithTimestamp);
+  if(!ofile) 
+  {
+     G4cerr << "ERROR : DumpToFile : File open error -> " << fileName << G4endl;
+     return;
+  }
   ofile << "# mesh name: " << fScoringMesh->GetWorldName() << G4endl;
+}
 
 // retrieve the map
 MeshScoreMap fSMap = fScoringMesh -> GetScoreMap();
@@ -122,7 +215,13 @@ if(msMapItr == fSMap.end())
 
 auto score = msMapItr-> second-> GetMap(); 
   
-ofile << "# primitive scorer name: " << msMapItr -> first << G4endl;
+if (!binaryOutput) {
+  ofile << "# primitive scorer name: " << msMapItr -> first << G4endl;
+  if (statOutput) {
+    ofile << "# number of events: " << numberOfEvents << G4endl;
+    ofile << "# columns: x y z sum_wx sum_wx2 entries" << G4endl;
+  }
+}
 //
 // Write quantity in the ASCII output file and in brachytherapy.root
 //
@@ -137,6 +236,7 @@ if (psName != "eDep") {
 }
 rootFileName += "_" + timestamp + ".root";
 
+if (!fSingleRootFile) {
 G4bool fileOpen = analysisManager -> OpenFile(rootFileName);
  if (! fileOpen) {
     G4cerr << "\n---> The ROOT output file has not been opened "
@@ -146,6 +246,8 @@ G4bool fileOpen = analysisManager -> OpenFile(rootFileName);
 G4cout << "Using " << analysisManager -> GetType() << G4endl;
 analysisManager -> SetVerboseLevel(1);
 analysisManager -> SetActivation(true);
+fFileHistograms.clear();
+}
 
 // Create histogram specific to the requested scorer
 G4String histoName = (psName == "eDep") ? G4String("h20") : G4String("h2_" + psName);
@@ -177,51 +279,180 @@ G4cout << "  Y: " << numberOfBinsY << " bins from " << yMin << " to " << yMax <<
 G4int histo2= analysisManager-> CreateH2(histoName, histoTitle, 
                                           numberOfBinsX, xMin, xMax, 
                                           numberOfBinsY, yMin, yMax);
+fFileHistograms.push_back(BrachyRunAction::HistogramEntry(histoName,
+  {xMin, xMax, G4double(numberOfBinsX), yMin, yMax, G4double(numberOfBinsY)}));
+
+// Optional 3D histogram: bin edges match the mesh voxels exactly
+G4int histo3 = -1;
+if (volumeOutput) {
+  G4String histo3Name = (psName == "eDep") ? G4String("h30") : G4String("h3_" + psName);
+  G4String histo3Title = (psName == "eDep") ? G4String("edep3D") : G4String(psName + "_edep3D");
+  histo3 = analysisManager -> CreateH3(histo3Name, histo3Title,
+                                       numberOfBinsX, -halfWidthX, halfWidthX,
+                                       numberOfBinsY, -halfWidthY, halfWidthY,
+                                       fNMeshSegments[2], -meshSize.z(), meshSize.z());
+  G4cout << "  Z: " << fNMeshSegments[2] << " bins from " << -meshSize.z()
+         << " to " << meshSize.z() << " mm (" << histo3Name << ")" << G4endl;
+  fFileHistograms.push_back(BrachyRunAction::HistogramEntry(histo3Name,
+    {-halfWidthX, halfWidthX, G4double(numberOfBinsX),
+     -halfWidthY, halfWidthY, G4double(numberOfBinsY),
+     -meshSize.z(), meshSize.z(), G4double(fNMeshSegments[2])}));
+}
 
 // Histo 0 with the energy spectrum will not be saved 
-// in brachytherapy.root
-analysisManager->SetH1Activation(0, false);
+// in brachytherapy.root (DumpAllQuantitiesToFile decides for itself)
+if (!fSingleRootFile) analysisManager->SetH1Activation(0, false);
 analysisManager->SetH2Activation(histo2, true);
+if (volumeOutput) analysisManager->SetH3Activation(histo3, true);
+
+// Optional statistics histograms, same binning as the XY projection
+G4int histoSumWx2 = -1;
+G4int histoEntries = -1;
+if (statOutput) {
+  histoSumWx2 = analysisManager -> CreateH2(histoName + "_sumwx2", histoTitle + "_sumwx2",
+                                            numberOfBinsX, xMin, xMax,
+                                            numberOfBinsY, yMin, yMax);
+  histoEntries = analysisManager -> CreateH2(histoName + "_entries", histoTitle + "_entries",
+                                             numberOfBinsX, xMin, xMax,
+                                             numberOfBinsY, yMin, yMax);
+  G4int histoEvents = analysisManager -> CreateH1(histoName + "_nevents",
+                                                  "number of events", 1, 0., 1.);
+  analysisManager -> SetH2Activation(histoSumWx2, true);
+  analysisManager -> SetH2Activation(histoEntries, true);
+  analysisManager -> SetH1Activation(histoEvents, true);
+  analysisManager -> FillH1(histoEvents, 0.5, numberOfEvents);
+  for (const auto& suffix : {G4String("_sumwx2"), G4String("_entries")})
+    fFileHistograms.push_back(BrachyRunAction::HistogramEntry(histoName + suffix,
+      {xMin, xMax, G4double(numberOfBinsX), yMin, yMax, G4double(numberOfBinsY)}));
+  fFileHistograms.push_back(BrachyRunAction::HistogramEntry(histoName + "_nevents",
+                                                            {0., 1., 1.}));
+}
+
+std::vector<G4String> binaryNames = {"sum_wx"};
+if (statOutput) {
+  binaryNames.push_back("sum_wx2");
+  binaryNames.push_back("entries");
+}
+std::vector<std::vector<G4double>> binaryArrays;
+if (binaryOutput)
+  binaryArrays.assign(binaryNames.size(),
+                      std::vector<G4double>(static_cast<std::size_t>(numberOfBinsX)
+                                            * numberOfBinsY * fNMeshSegments[2], 0.));
   
-for(int x = 0; x < fNMeshSegments[0]; x++) {
-   for(int y = 0; y < fNMeshSegments[1]; y++) {
-     for(int z = 0; z < fNMeshSegments[2]; z++){
-        G4int numberOfVoxel_x = fNMeshSegments[0];
-        G4int numberOfVoxel_y = fNMeshSegments[1];
-        G4int numberOfVoxel_z = fNMeshSegments[2];
-        
-        // Calculate voxel widths from mesh size
-        G4ThreeVector meshSize = fScoringMesh->GetSize();
-        G4double voxelWidth_x = 2.0 * meshSize.x() / numberOfVoxel_x;
-        G4double voxelWidth_y = 2.0 * meshSize.y() / numberOfVoxel_y;
-        G4double voxelWidth_z = 2.0 * meshSize.z() / numberOfVoxel_z;
-        
-        G4double xx = ( - numberOfVoxel_x + 1+ 2*x )* voxelWidth_x/2;
-        G4double yy = ( - numberOfVoxel_y + 1+ 2*y )* voxelWidth_y/2;
-        G4double zz = ( - numberOfVoxel_z + 1+ 2*z )* voxelWidth_z/2;
-        G4int idx = GetIndex(x, y, z);
-        std::map<G4int, G4StatDouble*>::iterator value = score -> find(idx);
-        
-       if (value != score -> end()) 
-        {
-         // Print in the ASCII output file the information
- 
-         ofile << xx << "  " << yy << "  " << zz <<"  " 
-               <<(value->second->sum_wx())/keV << G4endl;
-        
-        // Save the same information in the ROOT output file
-        // Include all Z voxels (not just z=0)
-        G4double halfWidthZ = meshSize.z();
-        if(zz > -halfWidthZ && zz < halfWidthZ) 
-             analysisManager->FillH2(histo2, xx, yy, (value->second->sum_wx())/keV);
-}}}} 
-
-ofile << std::setprecision(6);
-
-// Close the output ASCII file
-ofile.close();
-
-// Close the output ROOT file
+// Mesh geometry, computed once for the whole export
+const G4int numberOfVoxel_x = fNMeshSegments[0];
+const G4int numberOfVoxel_y = fNMeshSegments[1];
+const G4int numberOfVoxel_z = fNMeshSegments[2];
+const G4double voxelWidth_x = 2.0 * meshSize.x() / numberOfVoxel_x;
+const G4double voxelWidth_y = 2.0 * meshSize.y() / numberOfVoxel_y;
+const G4double voxelWidth_z = 2.0 * meshSize.z() / numberOfVoxel_z;
+const G4double halfWidthZ = meshSize.z();
+
+// Visit only the voxels that received a deposit. The map is ordered by
+// GetIndex(x, y, z) = (x*ny + y)*nz + z, i.e. the same x, y, z order as a
+// full nested loop over the mesh, so the ASCII and ROOT output is unchanged.
+for (const auto& entry : *score) {
+   const G4int idx = entry.first;
+   const G4int x = idx / (numberOfVoxel_y * numberOfVoxel_z);
+   const G4int y = (idx / numberOfVoxel_z) % numberOfVoxel_y;
+   const G4int z = idx % numberOfVoxel_z;
+
+   G4double xx = ( - numberOfVoxel_x + 1+ 2*x )* voxelWidth_x/2;
+   G4double yy = ( - numberOfVoxel_y + 1+ 2*y )* voxelWidth_y/2;
+   G4double zz = ( - numberOfVoxel_z + 1+ 2*z )* voxelWidth_z/2;
+   G4double edep = (entry.second->sum_wx())/keV;
+   G4double edep2 = (entry.second->sum_wx2())/(keV*keV);
+   G4double entries = entry.second->n();
+
+   // Print in the ASCII output file the information
+   if (binaryOutput) {
+     binaryArrays[0][idx] = edep;
+     if (statOutput) {
+       binaryArrays[1][idx] = edep2;
+       binaryArrays[2][idx] = entries;
+     }
+   }
+   else {
+     ofile << xx << "  " << yy << "  " << zz <<"  " << edep;
+     if (statOutput) ofile << "  " << edep2 << "  " << entries;
+     ofile << "\n";
+   }
+
+   // Save the same information in the ROOT output file
+   // Include all Z voxels (not just z=0)
+   if(zz > -halfWidthZ && zz < halfWidthZ) {
+     analysisManager->FillH2(histo2, xx, yy, edep);
+     if (statOutput) {
+       analysisManager->FillH2(histoSumWx2, xx, yy, edep2);
+       analysisManager->FillH2(histoEntries, xx, yy, entries);
+     }
+   }
+   if (volumeOutput)
+     analysisManager->FillH3(histo3, xx, yy, zz, edep);
+}
+
+// Close the output ASCII file, or write the binary dump
+if (binaryOutput) {
+  if (!WriteBinaryDump(fileNameWithTimestamp, fScoringMesh->GetWorldName(),
+                       psName, fNMeshSegments, meshSize, numberOfEvents,
+                       binaryNames, binaryArrays))
+    G4cerr << "ERROR : DumpToFile : File write error -> "
+           << fileNameWithTimestamp << G4endl;
+} else {
+  ofile << std::setprecision(6);
+  ofile.close();
+}
+
+// Close the output ROOT file and describe it in <file>.json
+if (!fSingleRootFile) {
+  analysisManager -> Write();
+  analysisManager -> CloseFile();
+  BrachyRunAction::WriteProvenance(rootFileName, fFileHistograms);
+}
+}
+
+void BrachyUserScoreWriter::DumpAllQuantitiesToFile(const G4String & fileName, 
+                                                    const G4String & option) 
+{
+if(verboseLevel > 0) 
+  {G4cout << "BrachyUserScorer-defined DumpAllQuantitiesToFile() method is invoked."
+  << G4endl; 
+  }
+
+auto analysisManager = G4AnalysisManager::Instance();
+
+// Reuse the file that BrachyRunAction left open in single-file mode: it
+// already holds the merged energy spectrum h10. Otherwise open a new one.
+G4bool spectrumAvailable = analysisManager -> IsOpenFile();
+if (!spectrumAvailable) {
+  G4String rootFileName = "brachytherapy_" + GetTimestampString() + ".root";
+  if (! analysisManager -> OpenFile(rootFileName)) {
+    G4cerr << "\n---> The ROOT output file has not been opened "
+           << rootFileName << G4endl;
+    return;
+  }
+}
+G4cout << "Using " << analysisManager -> GetType() << G4endl;
+analysisManager -> SetVerboseLevel(1);
+analysisManager -> SetActivation(true);
+analysisManager -> SetH1Activation(0, spectrumAvailable);
+fFileHistograms.clear();
+if (spectrumAvailable)
+  fFileHistograms.push_back(BrachyRunAction::HistogramEntry("h10", {0., 800., 800.}));
+
+// One ASCII/binary dump per scorer (<name>_<scorer>_<timestamp>.<ext>),
+// all the histograms in the same ROOT file
+size_t dotPos = fileName.find_last_of(".");
+G4String stem = (dotPos != std::string::npos) ? G4String(fileName.substr(0, dotPos)) : fileName;
+G4String extension = (dotPos != std::string::npos) ? G4String(fileName.substr(dotPos)) : G4String("");
+
+fSingleRootFile = true;
+for (const auto& scorer : fScoringMesh -> GetScoreMap())
+  DumpQuantityToFile(scorer.first, stem + "_" + scorer.first + extension, option);
+fSingleRootFile = false;
+
+G4String rootFileName = analysisManager -> GetFileName();
 analysisManager -> Write();
 analysisManager -> CloseFile();
+BrachyRunAction::WriteProvenance(rootFileName, fFileHistograms);
 }
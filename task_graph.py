@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""Grafo de tareas incremental por hash de contenido para figuras y tablas.
+
+Cada tarea declara sus archivos de entrada, sus salidas, sus parámetros y
+las tareas de las que depende. Su clave es el SHA-256 de:
+- el contenido de las entradas;
+- los parámetros (JSON ordenado);
+- el código: el archivo fuente del módulo de la función, el de cada
+  módulo del repositorio que importa (directa o indirectamente:
+  `case_stack`, `dose_loader`, `figure_pool`...) y los argumentos de un
+  `functools.partial`;
+- las claves de sus dependencias y el contenido de sus salidas.
+
+Si la clave coincide con la del último run correcto y todas las salidas
+existen, la tarea se salta. Cambiar un parámetro o el script vuelve a
+ejecutar solo las tareas afectadas y las que dependen de ellas.
+
+El estado (claves por tarea y hashes de archivos por tamaño/mtime, para no
+releer un ROOT sin cambios) se guarda en `.taskgraph.<script>.json` en el
+directorio de salida, uno por script para que dos análisis que escriben en
+la misma carpeta no se pisen. Las tareas listas se ejecutan a la vez en un pool de
+procesos con backend Agg (matplotlib no admite hilos), o de hilos si se
+pide. Una tarea fallida no se registra, y sus dependientes no se
+ejecutan."""
+
+import contextlib
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+import types
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+CODE_ROOT = os.path.dirname(os.path.abspath(__file__))
+STATE_PREFIX = ".taskgraph"
+STATE_VERSION = 1
+HASH_CHUNK_BYTES = 1 << 20
+MAX_TASK_WORKERS = 4
+
+
+class Task(NamedTuple):
+    name: str
+    func: Callable[[], object]
+    inputs: tuple
+    outputs: tuple
+    params: dict
+    deps: tuple
+
+
+class GraphReport(NamedTuple):
+    """Tareas ejecutadas (con su tiempo), saltadas por estar al día y fallidas."""
+
+    ran: Dict[str, float]
+    skipped: List[str]
+    errors: Dict[str, Exception]
+
+
+class DependencyError(RuntimeError):
+    """Una dependencia de la tarea ha fallado en este run."""
+
+
+def _init_worker() -> None:
+    import matplotlib.pyplot as plt
+
+    plt.switch_backend("Agg")
+
+
+def _timed(func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def _repo_module(obj: object) -> Optional[types.ModuleType]:
+    """Módulo del repositorio al que pertenece `obj` (un módulo o algo importado de uno)."""
+    module = obj if isinstance(obj, types.ModuleType) else sys.modules.get(getattr(obj, "__module__", None) or "")
+    path = getattr(module, "__file__", None)
+    if path and os.path.abspath(path).startswith(CODE_ROOT + os.sep):
+        return module
+    return None
+
+
+def module_sources(module: types.ModuleType) -> List[str]:
+    """Archivos fuente de `module` y de los módulos del repositorio que importa, recursivamente.
+
+    Se siguen los nombres globales del módulo (`import x` y `from x import f`),
+    así que un cambio en `case_stack` invalida las figuras que lo usan."""
+    seen = {module.__name__: module}
+    pending = [module]
+    while pending:
+        for value in list(vars(pending.pop()).values()):
+            imported = _repo_module(value)
+            if imported is not None and imported.__name__ not in seen:
+                seen[imported.__name__] = imported
+                pending.append(imported)
+    return sorted(os.path.abspath(m.__file__) for m in seen.values() if getattr(m, "__file__", None))
+
+
+def state_path(directory: str, script: str) -> str:
+    """Archivo de estado del grafo de `script` (su `__file__`) en `directory`."""
+    stem = os.path.splitext(os.path.basename(script))[0]
+    return os.path.join(directory, f"{STATE_PREFIX}.{stem}.json")
+
+
+class TaskGraph:
+    """Tareas con entradas/salidas declaradas; `run` ejecuta solo las desactualizadas."""
+
+    def __init__(self, state_path: str):
+        self.state_path = state_path
+        self.tasks: Dict[str, Task] = {}
+        try:
+            with open(state_path) as state_file:
+                state = json.load(state_file)
+            if state.get("version") != STATE_VERSION:
+                raise ValueError(state_path)
+        except (OSError, ValueError):
+            state = {"version": STATE_VERSION, "tasks": {}, "files": {}}
+        self.state = state
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[], object],
+        inputs: Sequence[str] = (),
+        outputs: Sequence[str] = (),
+        params: Optional[dict] = None,
+        deps: Sequence[str] = (),
+    ) -> None:
+        unknown = [dep for dep in deps if dep not in self.tasks]
+        if unknown:
+            raise KeyError(f"{name}: dependencias no declaradas {unknown} (añadirlas antes)")
+        self.tasks[name] = Task(
+            name,
+            func,
+            tuple(os.path.abspath(p) for p in inputs),
+            tuple(os.path.abspath(p) for p in outputs),
+            dict(params or {}),
+            tuple(deps),
+        )
+
+    def file_digest(self, path: str) -> str:
+        """SHA-256 del contenido; se reutiliza el guardado si tamaño y mtime no han cambiado."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return "missing"
+        cached = self.state["files"].get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as handle:
+            for chunk in iter(lambda: handle.read(HASH_CHUNK_BYTES), b""):
+                digest.update(chunk)
+        self.state["files"][path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def _code_signature(self, func: Callable) -> List[str]:
+        signature = []
+        while isinstance(func, partial):
+            signature.append(repr(func.args) + repr(sorted(func.keywords.items())))
+            func = func.func
+        # Sin el módulo: `__main__` al ejecutar el script y su nombre al importarlo
+        signature.append(getattr(func, "__qualname__", repr(func)))
+        module = inspect.getmodule(func)
+        if module is None or not getattr(module, "__file__", None):
+            return signature  # función sin archivo fuente (builtin)
+        for path in module_sources(module):
+            # Rutas relativas a la raíz: el mismo código da la misma clave desde cualquier checkout
+            signature.append(f"{os.path.relpath(path, CODE_ROOT)}:{self.file_digest(path)}")
+        return signature
+
+    def task_key(self, name: str, dep_keys: Dict[str, str]) -> str:
+        task = self.tasks[name]
+        payload = {
+            "name": name,
+            "code": self._code_signature(task.func),
+            "params": json.dumps(task.params, sort_keys=True, default=repr),
+            "inputs": {path: self.file_digest(path) for path in task.inputs},
+            # Clave y salidas de cada dependencia: si una se vuelve a ejecutar (p. ej. porque
+            # faltaba su salida) y escribe otro contenido, sus dependientes cambian de clave
+            "deps": [
+                [dep_keys[dep], [self.file_digest(path) for path in self.tasks[dep].outputs]]
+                for dep in task.deps
+            ],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def keys(self) -> Dict[str, str]:
+        """Clave de contenido de cada tarea (las dependencias se declaran antes que sus dependientes)."""
+        keys: Dict[str, str] = {}
+        for name in self.tasks:
+            keys[name] = self.task_key(name, keys)
+        return keys
+
+    def outdated(self, name: str, key: str) -> bool:
+        """La clave no es la del último run correcto o falta alguna salida."""
+        return self.state["tasks"].get(name) != key or not all(
+            os.path.exists(path) for path in self.tasks[name].outputs
+        )
+
+    def stale(self, force: bool = False) -> List[str]:
+        """Tareas cuya clave cambió, nunca se ejecutaron bien o a las que les falta alguna salida."""
+        keys = self.keys()
+        return [name for name in self.tasks if force or self.outdated(name, keys[name])]
+
+    def record(self, name: str, key: Optional[str] = None) -> None:
+        """Marca `name` como al día (tras ejecutarla fuera de `run`, p. ej. en un pool propio)."""
+        self.state["tasks"][name] = key if key is not None else self.keys()[name]
+
+    def save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.state_path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp{os.getpid()}"
+        with open(tmp_path, "w") as state_file:
+            json.dump(self.state, state_file, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def run(self, max_workers: Optional[int] = None, force: bool = False, processes: bool = True) -> GraphReport:
+        """Ejecuta las tareas desactualizadas respetando dependencias, en paralelo las independientes.
+
+        Cada tarea se evalúa cuando sus dependencias ya se han ejecutado o
+        saltado: si una dependencia acaba de reescribir una salida que la
+        tarea lee, su clave ya lo refleja y se ejecuta en este mismo run."""
+        keys: Dict[str, str] = {}
+        pending = list(self.tasks)
+        settled = set()
+        skipped: List[str] = []
+        ran: Dict[str, float] = {}
+        errors: Dict[str, Exception] = {}
+        workers = max_workers or min(len(self.tasks), MAX_TASK_WORKERS, os.cpu_count() or 1) or 1
+
+        if processes and workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+        with executor:
+            running = {}
+            while pending or running:
+                # Orden de declaración: una tarea saltada desbloquea a sus dependientes en la misma pasada
+                for name in list(pending):
+                    deps = self.tasks[name].deps
+                    if any(dep in errors for dep in deps):
+                        errors[name] = DependencyError("falló una dependencia")
+                        pending.remove(name)
+                    elif all(dep in settled for dep in deps):
+                        pending.remove(name)
+                        keys[name] = self.task_key(name, keys)
+                        if force or self.outdated(name, keys[name]):
+                            running[executor.submit(_timed, self.tasks[name].func)] = name
+                        else:
+                            skipped.append(name)
+                            settled.add(name)
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        ran[name] = future.result()
+                    except Exception as exc:
+                        errors[name] = exc
+                        continue
+                    settled.add(name)
+                    self.record(name, keys[name])
+                    self.save()
+        return GraphReport(ran, skipped, errors)
+
+
+def print_report(report: GraphReport) -> None:
+    for name, seconds in report.ran.items():
+        print(f"  ▶ {name}: {seconds:.1f} s")
+    for name in report.skipped:
+        print(f"  ✓ {name}: al día (sin cambios)")
+    for name, exc in report.errors.items():
+        print(f"  ⚠️ {name}: {exc}")
+
+
+@contextlib.contextmanager
+def capture_table(path: str) -> Iterator[None]:
+    """Escribe en `path` lo que se imprime dentro del bloque (la salida "tabla" de una tarea).
+
+    Así las tablas no se mezclan con la salida de otras tareas en paralelo;
+    quien lanza el grafo las muestra al final con `print_table`, se hayan
+    recalculado o no."""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "w") as table_file, contextlib.redirect_stdout(table_file):
+        yield
+    os.replace(tmp_path, path)
+
+
+def print_table(path: str) -> None:
+    if os.path.exists(path):
+        with open(path) as table_file:
+            sys.stdout.write(table_file.read())
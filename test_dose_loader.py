@@ -0,0 +1,107 @@
+"""Comprobaciones de la caché en memoria y de los sidecars `.npycache` de dose_loader."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+import dose_loader
+from dose_loader import clear_cache, load_histogram, load_many, sidecar_paths
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_cache()
+    yield
+    clear_cache()
+
+
+def bump_mtime(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 1_000_000_000))
+
+
+@pytest.fixture
+def decoded(monkeypatch):
+    """Lista con cada decodificación con uproot que haga el loader durante el test."""
+    calls = []
+    real_decode = dose_loader._decode
+    monkeypatch.setattr(dose_loader, "_decode", lambda *args: calls.append(args) or real_decode(*args))
+    return calls
+
+
+def read_stamp(path, hist_name="h20"):
+    with open(sidecar_paths(path, hist_name)[2]) as stamp_file:
+        return json.load(stamp_file)
+
+
+def test_first_load_writes_sidecar_and_next_load_maps_it(tmp_path, write_run_file):
+    path = write_run_file(tmp_path / "run.root", {"h20": np.arange(12.0).reshape(4, 3)})
+
+    first = load_histogram(path)
+    assert load_histogram(path) is first  # misma entrada LRU
+    assert all(os.path.exists(p) for p in sidecar_paths(path, "h20"))
+    stamp = read_stamp(path)
+    assert (stamp["size"], stamp["mtime_ns"]) == (os.stat(path).st_size, os.stat(path).st_mtime_ns)
+
+    clear_cache()
+    mapped = load_histogram(path)
+    assert isinstance(mapped.values, np.memmap)
+    np.testing.assert_array_equal(mapped.values, first.values)
+    for axis, expected in zip(mapped.edges, first.edges):
+        np.testing.assert_array_equal(axis, expected)
+
+
+def test_modified_file_invalidates_memory_and_sidecar(tmp_path, write_run_file):
+    path = write_run_file(tmp_path / "run.root", {"h20": np.ones((4, 3))})
+    before = load_histogram(path)
+
+    # Otro contenido (y otro tamaño y mtime): ni la entrada LRU ni el sidecar valen
+    write_run_file(path, {"h20": np.full((8, 6), 5.0)})
+    bump_mtime(path)
+    after = load_histogram(path)
+    assert after is not before
+    assert after.values.shape == (8, 6)
+    np.testing.assert_array_equal(after.values, 5.0)
+    stamp = read_stamp(path)
+    assert (stamp["size"], stamp["mtime_ns"]) == (os.stat(path).st_size, os.stat(path).st_mtime_ns)
+
+
+def test_mtime_change_alone_invalidates(tmp_path, write_run_file, decoded):
+    path = write_run_file(tmp_path / "run.root", {"h20": np.ones((4, 3))})
+    before = load_histogram(path)
+    bump_mtime(path)
+    decoded.clear()
+
+    after = load_histogram(path)
+
+    assert after is not before
+    assert len(decoded) == 1  # el sello ya no coincide: se vuelve a decodificar
+    assert read_stamp(path)["mtime_ns"] == os.stat(path).st_mtime_ns
+
+
+def test_missing_stamp_forces_rebuild(tmp_path, write_run_file, decoded):
+    path = write_run_file(tmp_path / "run.root", {"h20": np.ones((4, 3))})
+    load_histogram(path)
+    os.remove(sidecar_paths(path, "h20")[2])
+    clear_cache()
+    decoded.clear()
+
+    rebuilt = load_histogram(path)
+
+    assert len(decoded) == 1
+    assert not isinstance(rebuilt.values, np.memmap)
+    assert os.path.exists(sidecar_paths(path, "h20")[2])
+
+
+def test_fallback_and_load_many(tmp_path, write_run_file):
+    with_h20 = write_run_file(tmp_path / "a.root", {"h20": np.ones((4, 3))})
+    only_h10 = write_run_file(tmp_path / "b.root", {"h10": np.ones(5)})
+    missing = str(tmp_path / "missing.root")
+
+    results, errors = load_many({"a": with_h20, "b": only_h10, "c": missing}, max_workers=2)
+
+    assert results["a"].name == "h20"
+    assert results["b"].name == "h10"  # fallback h20 -> h10
+    assert list(errors) == ["c"]
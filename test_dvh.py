@@ -0,0 +1,30 @@
+"""Comprobaciones del DVH por regiones de dvh con mapas sintéticos."""
+
+import numpy as np
+import pytest
+
+from dvh import compute_dvh
+
+
+def test_dvh_matches_per_region_histogram():
+    rng = np.random.default_rng(0)
+    values = rng.random((30, 20, 4)) * 10.0
+    labels = rng.integers(-1, 3, size=values.shape)
+    edges = np.linspace(0.0, 10.0, 11)
+
+    # Bloques pequeños: el resultado no depende del troceado
+    dvh = compute_dvh(values, labels, n_labels=3, dose_edges=edges, voxel_volume_cm3=0.5, chunk_voxels=100)
+
+    for label in range(3):
+        expected, _ = np.histogram(values[labels == label], bins=edges)
+        np.testing.assert_allclose(dvh.differential[label], 0.5 * expected)
+    assert dvh.total_volume.sum() == pytest.approx(0.5 * (labels >= 0).sum())
+    np.testing.assert_allclose(dvh.cumulative()[:, 0], 100.0)
+
+
+@pytest.mark.parametrize("bad", [3, -2])
+def test_out_of_range_label_is_named(bad):
+    labels = np.zeros((4, 4), dtype=int)
+    labels[2, 1] = bad
+    with pytest.raises(ValueError, match=f"Etiqueta {bad} "):
+        compute_dvh(np.ones((4, 4)), labels, names=("a", "b", "c"), dose_edges=np.linspace(0, 2, 5))
@@ -0,0 +1,87 @@
+"""Comprobaciones de gamma_index contra una búsqueda exhaustiva sobre mapas sintéticos."""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from gamma_index import gamma_index, search_offsets
+
+
+def brute_force_gamma(reference, evaluated, spacing, dose_percent, dta_mm, cutoff_percent, local, search_mm):
+    ref_max = reference.max()
+    gamma = np.full(reference.shape, np.nan)
+    reach = [int(search_mm // step) for step in spacing]
+    for voxel in itertools.product(*[range(n) for n in reference.shape]):
+        if reference[voxel] < cutoff_percent / 100.0 * ref_max:
+            continue
+        tolerance = dose_percent / 100.0 * (reference[voxel] if local else ref_max)
+        best = np.inf
+        for offset in itertools.product(*[range(-n, n + 1) for n in reach]):
+            target = tuple(v + o for v, o in zip(voxel, offset))
+            if any(t < 0 or t >= n for t, n in zip(target, reference.shape)):
+                continue
+            dist2 = sum((o * step) ** 2 for o, step in zip(offset, spacing))
+            if dist2 > search_mm**2 * (1 + 1e-12):
+                continue
+            best = min(best, dist2 / dta_mm**2 + (evaluated[target] - reference[voxel]) ** 2 / tolerance**2)
+        gamma[voxel] = np.sqrt(best)
+    return gamma
+
+
+def smooth_map(shape, seed):
+    rng = np.random.default_rng(seed)
+    grids = np.meshgrid(*[np.linspace(-1.0, 1.0, n) for n in shape], indexing="ij")
+    peak = np.exp(-sum(g**2 for g in grids) / 0.3)
+    return peak * (1.0 + 0.05 * rng.standard_normal(shape))
+
+
+@pytest.mark.parametrize("local", [False, True])
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_matches_brute_force_2d(local, max_workers):
+    reference = smooth_map((23, 19), 1)
+    evaluated = smooth_map((23, 19), 2)
+    spacing = (1.0, 1.5)
+    result = gamma_index(reference, evaluated, spacing, dose_percent=3.0, dta_mm=2.0, local=local,
+                         tile_rows=5, max_workers=max_workers)
+    expected = brute_force_gamma(reference, evaluated, spacing, 3.0, 2.0, 10.0, local, 4.0)
+
+    np.testing.assert_array_equal(result.evaluated, ~np.isnan(expected))
+    np.testing.assert_allclose(result.gamma, expected, rtol=1e-12, equal_nan=True)
+    assert result.pass_rate == pytest.approx(np.mean(expected[result.evaluated] <= 1.0))
+
+
+def test_matches_brute_force_3d():
+    reference = smooth_map((9, 8, 7), 3)
+    evaluated = smooth_map((9, 8, 7), 4)
+    result = gamma_index(reference, evaluated, (1.0, 1.0, 2.0), dta_mm=1.5, tile_rows=4, max_workers=1)
+    expected = brute_force_gamma(reference, evaluated, (1.0, 1.0, 2.0), 3.0, 1.5, 10.0, False, 3.0)
+    np.testing.assert_allclose(result.gamma, expected, rtol=1e-12, equal_nan=True)
+
+
+def test_identical_maps_pass_everywhere():
+    reference = smooth_map((16, 16), 5)
+    result = gamma_index(reference, reference, (1.0, 1.0), max_workers=1)
+    assert result.pass_rate == 1.0
+    assert np.nanmax(result.gamma) == 0.0
+
+
+def test_shift_within_dta_is_found():
+    # Un desplazamiento de 1 vóxel (1 mm) con DTA de 3 mm da Γ ≤ 1/3 lejos de los bordes
+    reference = smooth_map((30, 30), 6)
+    evaluated = np.roll(reference, 1, axis=0)
+    result = gamma_index(reference, evaluated, (1.0, 1.0), dose_percent=3.0, dta_mm=3.0, max_workers=1)
+    assert np.nanmax(result.gamma[1:-1, :]) <= 1.0 / 3.0 + 1e-12
+
+
+def test_search_offsets_sorted_and_inside_sphere():
+    offsets, dist2 = search_offsets((1.0, 2.0), 4.0)
+    assert tuple(offsets[0]) == (0, 0)
+    assert np.all(np.diff(dist2) >= 0)
+    assert dist2.max() <= 16.0
+    assert len(offsets) == sum(1 for i in range(-4, 5) for j in range(-2, 3) if i * i + 4 * j * j <= 16)
+
+
+def test_rejects_mismatched_shapes():
+    with pytest.raises(ValueError):
+        gamma_index(np.ones((4, 4)), np.ones((4, 5)), (1.0, 1.0))
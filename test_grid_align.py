@@ -0,0 +1,89 @@
+"""Comprobaciones del alineado exacto de grid_align (recorte y rebin conservativo)."""
+
+import numpy as np
+import pytest
+
+from grid_align import GridMismatchError, align_maps, align_to, axis_plan, common_edges
+
+
+def edges(lo, hi, n):
+    return np.linspace(lo, hi, n + 1)
+
+
+def test_axis_plan_crop_and_rebin():
+    source = edges(-10.0, 10.0, 20)  # paso 1 mm
+    assert axis_plan(source, source) == (0, 20, 1)
+    assert axis_plan(source, edges(-5.0, 5.0, 10)) == (5, 10, 1)
+    assert axis_plan(source, edges(-10.0, 10.0, 5)) == (0, 5, 4)
+    assert axis_plan(source, edges(-6.0, 6.0, 3)) == (4, 3, 4)
+
+
+def test_crop_is_an_exact_view():
+    values = np.arange(20 * 12, dtype=np.float64).reshape(20, 12)
+    source = [edges(-10.0, 10.0, 20), edges(-6.0, 6.0, 12)]
+    target = [edges(-3.0, 5.0, 8), edges(-6.0, 0.0, 6)]
+
+    cropped = align_to(values, source, target)
+
+    np.testing.assert_array_equal(cropped, values[7:15, 0:6])
+    assert np.shares_memory(cropped, values)
+
+
+def test_rebin_preserves_totals():
+    rng = np.random.default_rng(0)
+    values = rng.random((12, 8))
+    source = [edges(-6.0, 6.0, 12), edges(-4.0, 4.0, 8)]
+    target = [edges(-6.0, 6.0, 4), edges(-4.0, 4.0, 2)]  # bloques de 3×4 bins
+
+    rebinned = align_to(values, source, target)
+
+    assert rebinned.shape == (4, 2)
+    assert rebinned.sum() == pytest.approx(values.sum())
+    assert rebinned[1, 0] == pytest.approx(values[3:6, 0:4].sum())
+
+
+def test_rebin_after_crop_sums_only_the_overlap():
+    values = np.ones((10, 10))
+    source = [edges(-5.0, 5.0, 10)] * 2
+    target = [edges(-2.0, 2.0, 2)] * 2  # paso 2 mm sobre el centro
+
+    np.testing.assert_array_equal(align_to(values, source, target), np.full((2, 2), 4.0))
+
+
+@pytest.mark.parametrize(
+    "target",
+    [
+        edges(-10.0, 10.0, 40),  # más fina que la original
+        edges(-10.0, 10.0, 8),  # paso 2.5: no es múltiplo entero
+        edges(-9.5, 8.5, 18),  # desplazada medio bin
+        edges(-12.0, 8.0, 20),  # se sale del rango
+        np.array([-10.0, -9.0, -7.0, -6.0]),  # paso no uniforme
+    ],
+)
+def test_non_commensurate_edges_raise(target):
+    with pytest.raises(GridMismatchError):
+        axis_plan(edges(-10.0, 10.0, 20), target)
+
+
+def test_align_maps_uses_coarsest_grid_over_the_overlap():
+    fine = np.ones((20, 20))
+    fine_edges = [edges(-10.0, 10.0, 20)] * 2
+    coarse = np.full((5, 5), 7.0)
+    coarse_edges = [edges(-6.0, 4.0, 5)] * 2
+
+    (fine_aligned, coarse_aligned), target = align_maps([(fine, fine_edges), (coarse, coarse_edges)])
+
+    for axis in target:
+        np.testing.assert_allclose(axis, edges(-6.0, 4.0, 5))
+    np.testing.assert_array_equal(fine_aligned, np.full((5, 5), 4.0))  # 2×2 bins de 1 mm por bin
+    np.testing.assert_array_equal(coarse_aligned, coarse)
+
+
+def test_mismatched_maps_raise():
+    shifted = [edges(-9.5, 10.5, 20)] * 2
+    with pytest.raises(GridMismatchError):
+        align_maps([(np.ones((20, 20)), [edges(-10.0, 10.0, 20)] * 2), (np.ones((20, 20)), shifted)])
+    with pytest.raises(GridMismatchError):
+        common_edges([[edges(-10.0, -5.0, 5)], [edges(5.0, 10.0, 5)]])
+    with pytest.raises(GridMismatchError):
+        align_to(np.ones((4, 4)), [edges(0.0, 4.0, 4)], [edges(0.0, 4.0, 4)])
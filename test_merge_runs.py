@@ -0,0 +1,104 @@
+"""Comprobaciones de merge_runs con archivos ROOT sintéticos."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from dose_loader import load_run_file
+from merge_runs import BinningMismatchError, merge_files, write_merged
+from provenance import load_provenance, provenance_path
+
+HISTS = ("h20", "h2_eDepPrimary", "h2_eDepSecondary")
+
+
+def job_maps(seed, shape=(12, 10)):
+    rng = np.random.default_rng(seed)
+    return {name: rng.random(shape) for name in HISTS}
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_sum_matches_numpy(tmp_path, write_run_file, max_workers):
+    jobs = [job_maps(seed) for seed in range(5)]
+    paths = [
+        write_run_file(tmp_path / f"job{i}.root", maps, n_events=1000 * (i + 1))
+        for i, maps in enumerate(jobs)
+    ]
+
+    result, errors = merge_files(paths, max_workers=max_workers)
+
+    assert errors == {}
+    assert sorted(result.paths) == sorted(paths)
+    assert result.n_events == pytest.approx(15000.0)
+    for name in HISTS:
+        np.testing.assert_allclose(result.hists[name].values, sum(maps[name] for maps in jobs))
+        assert result.hists[name + "_nevents"].values.sum() == pytest.approx(15000.0)
+
+
+def test_mismatched_binning_is_skipped(tmp_path, write_run_file):
+    good = [write_run_file(tmp_path / f"job{i}.root", job_maps(i)) for i in range(2)]
+    coarse = write_run_file(tmp_path / "coarse.root", job_maps(9, shape=(6, 5)))
+    wide = write_run_file(tmp_path / "wide.root", job_maps(10), half_width_mm=20.0)
+
+    result, errors = merge_files(good + [coarse, wide], include_moments=False, max_workers=1)
+
+    assert result.paths == tuple(good)
+    assert set(errors) == {coarse, wide}
+    assert all(isinstance(exc, BinningMismatchError) for exc in errors.values())
+    assert result.n_events is None  # sin `_nevents` no se conocen los eventos
+
+
+def test_unreadable_file_is_reported(tmp_path, write_run_file):
+    good = write_run_file(tmp_path / "job.root", job_maps(0))
+    broken = tmp_path / "broken.root"
+    broken.write_bytes(b"not a root file")
+
+    result, errors = merge_files([good, str(broken)], include_moments=False)
+
+    assert result.paths == (good,)
+    assert list(errors) == [str(broken)]
+
+
+def test_written_file_round_trips(tmp_path, write_run_file):
+    jobs = [job_maps(seed) for seed in range(3)]
+    paths = [write_run_file(tmp_path / f"job{i}.root", maps, n_events=500) for i, maps in enumerate(jobs)]
+    result, _ = merge_files(paths)
+
+    output = tmp_path / "merged.root"
+    stamp_path = write_merged(str(output), result)
+
+    merged = load_run_file(str(output), HISTS, use_sidecar=False)
+    for name in HISTS:
+        np.testing.assert_allclose(merged[name].values, sum(maps[name] for maps in jobs))
+        for axis, expected in zip(merged[name].edges, result.hists[name].edges):
+            np.testing.assert_array_equal(axis, expected)
+    with open(stamp_path) as stamp_file:
+        stamp = json.load(stamp_file)
+    assert stamp["n_files"] == 3
+    assert stamp["n_events"] == pytest.approx(1500.0)
+
+
+def test_events_from_provenance_sidecars(tmp_path, write_run_file):
+    jobs = [job_maps(seed) for seed in range(3)]
+    paths = [write_run_file(tmp_path / f"job{i}.root", maps) for i, maps in enumerate(jobs)]  # sin _nevents
+    for i, path in enumerate(paths):
+        with open(provenance_path(path), "w") as json_file:
+            json.dump({"events": 1e6 * (i + 1), "source": "Flexi", "wall_time_s": 10.0}, json_file)
+
+    result, errors = merge_files(paths, include_moments=False)
+    assert errors == {}
+    assert result.n_events == pytest.approx(6e6)
+
+    output = tmp_path / "merged.root"
+    with open(write_merged(str(output), result)) as stamp_file:
+        assert json.load(stamp_file)["n_events"] == pytest.approx(6e6)
+    merged = load_provenance(str(output))
+    assert merged.events == pytest.approx(6e6)
+    assert merged.source == "Flexi"
+    assert merged.wall_time_s is None
+    assert merged.histograms["h20"] == ((-10.0, 10.0, 12), (-10.0, 10.0, 10))
+
+    # Un job sin sidecar ni _nevents: el total es desconocido
+    os.remove(provenance_path(paths[1]))
+    assert merge_files(paths, include_moments=False)[0].n_events is None
@@ -0,0 +1,37 @@
+"""Comprobaciones del índice geométrico y de las estadísticas por región de mesh_index."""
+
+import numpy as np
+import pytest
+
+from mesh_index import REGION_HETERO, build_index, region_stats
+
+
+def test_index_labels_and_heterogeneity_box():
+    edges = np.linspace(-10.0, 10.0, 21)
+    index = build_index(edges, edges, hetero_center_mm=(5.0, 0.0), hetero_size_mm=(4.0, 6.0))
+
+    assert index.heterogeneity_bins() == (13, 7, 4, 6)
+    assert index.region[14, 10] == REGION_HETERO
+    assert index.source.sum() == 12  # centros a menos de 2 mm del origen
+    assert (index.labels("region")[index.source] == -1).all()
+    outside = build_index(edges, edges, hetero_center_mm=(50.0, 0.0), hetero_size_mm=(4.0, 4.0))
+    assert outside.heterogeneity_bins() is None
+
+
+def test_region_stats():
+    values = np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    labels = np.array([[0, 1, -1], [1, 1, 0]])
+
+    stats = region_stats(values, labels, n_labels=3)
+
+    np.testing.assert_allclose(stats.sum, [7.0, 11.0, 0.0])
+    np.testing.assert_array_equal(stats.count, [2, 3, 0])
+    np.testing.assert_allclose(stats.mean, [3.5, 11.0 / 3.0, 0.0])
+    np.testing.assert_allclose(stats.max, [6.0, 5.0, 0.0])
+
+
+@pytest.mark.parametrize("bad", [2, -3])
+def test_out_of_range_label_is_named(bad):
+    labels = np.array([[0, 1], [bad, 1]])
+    with pytest.raises(ValueError, match=f"Etiqueta {bad} "):
+        region_stats(np.ones((2, 2)), labels, n_labels=2)
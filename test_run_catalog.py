@@ -0,0 +1,113 @@
+"""Comprobaciones del escaneo incremental de run_catalog con archivos ROOT sintéticos."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from run_catalog import RunCatalog, path_metadata
+
+pytest.importorskip("uproot")  # read_record lo importa aunque el archivo tenga sidecar
+
+
+def bump_mtime(path, seconds=10):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 1_000_000_000))
+
+
+@pytest.fixture
+def campaign(tmp_path, write_run_file):
+    """Dos escenarios con un archivo cada uno; devuelve (raíz, rutas)."""
+    hetero = tmp_path / "TG186_bone_hetero_100M"
+    homo = tmp_path / "IR192_water_homo"
+    hetero.mkdir()
+    homo.mkdir()
+    maps = {"h20": np.ones((8, 8)), "h2_eDepSecondary": np.ones((8, 8))}
+    paths = {
+        "hetero": write_run_file(hetero / "brachytherapy_20250101_120000.root", maps, n_events=100),
+        "homo": write_run_file(homo / "brachytherapy_20250102_120000.root", {"h20": np.ones((8, 8))}),
+    }
+    return tmp_path, paths
+
+
+def test_scan_is_incremental(tmp_path, campaign, write_run_file):
+    root, paths = campaign
+    with RunCatalog(str(tmp_path / "catalog.sqlite")) as catalog:
+        first = catalog.scan([str(root)], max_workers=2)
+        assert (first.added, first.updated, first.unchanged, first.removed) == (2, 0, 0, 0)
+        assert first.errors == {}
+
+        again = catalog.scan([str(root)])
+        assert (again.added, again.updated, again.unchanged, again.removed) == (0, 0, 2, 0)
+
+        write_run_file(paths["homo"], {"h20": np.ones((8, 8)), "h2_eDepPrimary": np.ones((8, 8))})
+        bump_mtime(paths["homo"])
+        os.remove(paths["hetero"])
+        changed = catalog.scan([str(root)])
+        assert (changed.added, changed.updated, changed.unchanged, changed.removed) == (0, 1, 0, 1)
+        assert [entry.path for entry in catalog.query(hist="h2_eDepPrimary")] == [paths["homo"]]
+        assert catalog.query(hist="h2_eDepSecondary") == []
+
+
+def test_query_by_content_and_path_metadata(tmp_path, campaign):
+    root, paths = campaign
+    with RunCatalog(str(tmp_path / "catalog.sqlite")) as catalog:
+        catalog.scan([str(root)])
+        (entry,) = catalog.query(hist="h2_eDepSecondary", scenario="tg186", material="bone")
+        assert entry.path == paths["hetero"]
+        assert entry.timestamp == "20250101_120000"
+        assert entry.n_events == pytest.approx(100.0)
+        assert entry.metadata["phantom"] == ("heterogeneous",)
+        assert entry.metadata["events_label"] == ("100M",)
+        assert catalog.latest("h20") == paths["homo"]
+        assert catalog.hist_info(paths["hetero"], "h20").edges == ((-10.0, 10.0, 8), (-10.0, 10.0, 8))
+
+
+def test_sidecar_replaces_root_decoding(tmp_path):
+    run_dir = tmp_path / "I125"
+    run_dir.mkdir()
+    root_path = run_dir / "brachytherapy_20250103_120000.root"
+    root_path.write_bytes(b"not a root file")  # con sidecar no hace falta abrirlo
+    sidecar = {
+        "events": 5e6,
+        "threads": 8,
+        "source": "Flexi",
+        "phantom": {"material": "G4_WATER"},
+        "heterogeneity": {"enabled": True, "material": "G4_BONE_CORTICAL_ICRP", "size_mm": [60, 60, 60],
+                          "position_mm": [40, 0, 0]},
+        "histograms": [{"name": "h20", "edges": [[-150, 150, 300], [-150, 150, 300]]}],
+    }
+    sidecar_path = run_dir / "brachytherapy_20250103_120000.json"
+    sidecar_path.write_text(json.dumps(sidecar))
+
+    with RunCatalog(str(tmp_path / "catalog.sqlite")) as catalog:
+        report = catalog.scan([str(tmp_path)])
+        assert report.errors == {}
+        (entry,) = catalog.query(hist="h20", source="flexi", hetero_material="G4_BONE_CORTICAL_ICRP")
+        assert entry.n_events == pytest.approx(5e6)
+        assert entry.metadata["hetero_position_mm"] == ("40,0,0",)
+
+        # Un cambio solo en el sidecar también vuelve a indexar el archivo
+        sidecar["events"] = 1e7
+        sidecar_path.write_text(json.dumps(sidecar))
+        bump_mtime(sidecar_path)
+        assert catalog.scan([str(tmp_path)]).updated == 1
+        assert catalog.query(hist="h20")[0].n_events == pytest.approx(1e7)
+
+
+def test_unreadable_root_is_recorded_as_error(tmp_path):
+    broken = tmp_path / "brachytherapy_20250104_120000.root"
+    broken.write_bytes(b"not a root file")
+    with RunCatalog(str(tmp_path / "catalog.sqlite")) as catalog:
+        report = catalog.scan([str(tmp_path)])
+        assert list(report.errors) == [str(broken)]
+        assert catalog.query() == []
+
+
+def test_path_metadata():
+    metadata = path_metadata("/data/100M_I125_pri-sec/brachytherapy_homo_lung100m.root")
+    assert metadata["scenario"] == ("I125",)
+    assert metadata["material"] == ("lung",)
+    assert metadata["phantom"] == ("homogeneous",)
+    assert metadata["events_label"] == ("100M",)
@@ -0,0 +1,40 @@
+"""Comprobaciones de la carga por lotes de run_statistics con archivos ROOT sintéticos."""
+
+import numpy as np
+import pytest
+
+from run_statistics import batch_means, load_batches
+
+
+def test_batches_stack_and_mean(tmp_path, write_run_file):
+    maps = [np.full((6, 4), value) for value in (1.0, 2.0, 3.0)]
+    paths = [write_run_file(tmp_path / f"run{i}.root", {"h20": values}) for i, values in enumerate(maps)]
+
+    stack, errors = load_batches(paths, max_workers=2)
+
+    assert errors == {}
+    assert stack.paths == tuple(paths)
+    assert stack.maps.shape == (3, 1, 6, 4)
+    means = batch_means(stack.maps)
+    np.testing.assert_allclose(means.mean, 2.0)
+    np.testing.assert_allclose(means.std_error, 1.0 / np.sqrt(3))
+
+
+def test_run_without_requested_histogram_is_not_mixed(tmp_path, write_run_file):
+    good = [write_run_file(tmp_path / f"run{i}.root", {"h20": np.ones((6, 4))}) for i in range(2)]
+    # Sin h20: load_histogram caería a h10, con otro binning (y otra magnitud)
+    only_h10 = write_run_file(tmp_path / "run_h10.root", {"h10": np.ones(7)})
+    coarse = write_run_file(tmp_path / "run_coarse.root", {"h20": np.ones((3, 2))})
+
+    stack, errors = load_batches(good + [only_h10, coarse])
+
+    assert stack.paths == tuple(good)
+    assert set(errors) == {only_h10, coarse}
+    assert isinstance(errors[only_h10], KeyError)
+    assert isinstance(errors[coarse], ValueError)
+
+
+def test_needs_two_valid_runs(tmp_path, write_run_file):
+    path = write_run_file(tmp_path / "run.root", {"h20": np.ones((6, 4))})
+    with pytest.raises(ValueError):
+        load_batches([path])
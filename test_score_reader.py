@@ -0,0 +1,40 @@
+"""Comprobaciones del lector por bloques de volcados ASCII de score_reader."""
+
+import numpy as np
+import pytest
+
+from score_reader import read_score_dump
+
+HEADER = "# mesh name: boxMesh\n# primitive scorer name: eDep\n"
+
+
+def write_dump(path, rows):
+    path.write_text(HEADER + "".join(" ".join(str(v) for v in row) + "\n" for row in rows))
+    return str(path)
+
+
+def test_chunks_fill_the_grid(tmp_path):
+    rows = [(x, y, z, 100 * x + 10 * y + z) for x in (-1.5, -0.5, 0.5, 1.5) for y in (-1, 1) for z in (0,)]
+    # Bloques de pocos bytes: las filas se cortan siempre en fin de línea
+    dump = read_score_dump(write_dump(tmp_path / "a.out", rows), chunk_bytes=16)
+
+    assert dump.mesh_name == "boxMesh"
+    assert dump.values.shape == (4, 2, 1)
+    np.testing.assert_allclose(dump.x_centers, [-1.5, -0.5, 0.5, 1.5])
+    np.testing.assert_allclose(dump.values[:, :, 0], [[100 * x + 10 * y for y in (-1, 1)]
+                                                      for x in (-1.5, -0.5, 0.5, 1.5)])
+
+
+def test_corrupt_token_raises(tmp_path):
+    # Antes del token roto hay 8 números: cortar ahí daría un múltiplo de 4 columnas
+    path = tmp_path / "a.out"
+    path.write_text(HEADER + "0 0 0 1\n0 1 0 2\nx 0 0 3\n1 1 0 4\n")
+    with pytest.raises(ValueError, match="Formato inesperado"):
+        read_score_dump(str(path))
+
+
+def test_wrong_column_count_raises(tmp_path):
+    path = tmp_path / "a.out"
+    path.write_text(HEADER + "0 0 0 1\n0 1 0\n")
+    with pytest.raises(ValueError):
+        read_score_dump(str(path))
@@ -0,0 +1,169 @@
+"""Comprobaciones de la detección de tareas desactualizadas de task_graph."""
+
+import importlib
+import os
+import sys
+from functools import partial
+
+import pytest
+
+import task_graph
+from task_graph import DependencyError, TaskGraph, capture_table, print_table, state_path
+
+
+def copy_upper(source, target):
+    with open(source) as src, open(target, "w") as dst:
+        dst.write(src.read().upper())
+
+
+def concat(target, *sources):
+    with open(target, "w") as dst:
+        for source in sources:
+            with open(source) as src:
+                dst.write(src.read())
+
+
+def fail():
+    raise RuntimeError("falla")
+
+
+def build(tmp_path, suffix="!", processes_safe=True):
+    """Grafo a -> b (b lee la salida de a); c es independiente y tiene un parámetro."""
+    graph = TaskGraph(state_path(str(tmp_path), __file__))
+    graph.add("a", partial(copy_upper, tmp_path / "in.txt", tmp_path / "a.txt"),
+              inputs=[tmp_path / "in.txt"], outputs=[tmp_path / "a.txt"])
+    graph.add("b", partial(concat, tmp_path / "b.txt", tmp_path / "a.txt"),
+              inputs=[tmp_path / "a.txt"], outputs=[tmp_path / "b.txt"], deps=["a"])
+    graph.add("c", partial(concat, tmp_path / "c.txt", tmp_path / "other.txt"),
+              inputs=[tmp_path / "other.txt"], outputs=[tmp_path / "c.txt"], params={"suffix": suffix})
+    return graph
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    (tmp_path / "in.txt").write_text("hola")
+    (tmp_path / "other.txt").write_text("otro")
+    return tmp_path
+
+
+def test_second_run_skips_everything(inputs):
+    first = build(inputs).run(processes=False)
+    assert set(first.ran) == {"a", "b", "c"}
+    assert (inputs / "b.txt").read_text() == "HOLA"
+
+    second = build(inputs).run(processes=False)
+    assert second.ran == {}
+    assert second.skipped == ["a", "b", "c"]
+
+
+def test_content_change_reruns_task_and_dependents(inputs):
+    build(inputs).run(processes=False)
+    (inputs / "in.txt").write_text("adiós")
+    report = build(inputs).run(processes=False)
+    assert set(report.ran) == {"a", "b"}
+    assert (inputs / "b.txt").read_text() == "ADIÓS"
+
+
+def test_touch_without_change_is_skipped(inputs):
+    build(inputs).run(processes=False)
+    stat = os.stat(inputs / "in.txt")
+    os.utime(inputs / "in.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert build(inputs).stale() == []
+
+
+def test_param_change_and_missing_output(inputs):
+    build(inputs).run(processes=False)
+    assert build(inputs, suffix="?").stale() == ["c"]
+    os.remove(inputs / "b.txt")
+    assert build(inputs).stale() == ["b"]
+    assert build(inputs).stale(force=True) == ["a", "b", "c"]
+
+
+def test_parallel_processes(inputs):
+    report = build(inputs).run(max_workers=2, processes=True)
+    assert report.errors == {}
+    assert set(report.ran) == {"a", "b", "c"}
+    assert (inputs / "c.txt").read_text() == "otro"
+
+
+def test_failure_is_not_recorded_and_blocks_dependents(tmp_path):
+    graph = TaskGraph(state_path(str(tmp_path), __file__))
+    graph.add("roto", fail)
+    graph.add("despues", partial(concat, tmp_path / "x.txt"), outputs=[tmp_path / "x.txt"], deps=["roto"])
+    report = graph.run(processes=False)
+    assert isinstance(report.errors["roto"], RuntimeError)
+    assert isinstance(report.errors["despues"], DependencyError)
+    assert not (tmp_path / "x.txt").exists()
+
+    graph = TaskGraph(state_path(str(tmp_path), __file__))
+    graph.add("roto", fail)
+    assert graph.stale() == ["roto"]
+
+
+def test_undeclared_dependency_is_rejected(tmp_path):
+    graph = TaskGraph(state_path(str(tmp_path), __file__))
+    with pytest.raises(KeyError):
+        graph.add("b", fail, deps=["a"])
+
+
+def test_imported_repo_module_is_part_of_the_key(tmp_path, monkeypatch):
+    # Módulos de prueba bajo una raíz temporal: script -> helper
+    monkeypatch.setattr(task_graph, "CODE_ROOT", str(tmp_path))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / "tg_helper.py").write_text("FACTOR = 1\n")
+    (tmp_path / "tg_script.py").write_text("from tg_helper import FACTOR\nimport tg_helper\n\ndef task():\n    pass\n")
+    for name in ("tg_helper", "tg_script"):
+        sys.modules.pop(name, None)
+    script = importlib.import_module("tg_script")
+    monkeypatch.setitem(sys.modules, "tg_script", script)
+
+    assert task_graph.module_sources(script) == sorted(
+        [str(tmp_path / "tg_helper.py"), str(tmp_path / "tg_script.py")]
+    )
+
+    def key():
+        graph = TaskGraph(str(tmp_path / "state.json"))
+        graph.add("t", script.task)
+        return graph.keys()["t"]
+
+    before = key()
+    (tmp_path / "tg_helper.py").write_text("FACTOR = 2\n")
+    assert key() != before
+    sys.modules.pop("tg_helper", None)
+
+
+def test_capture_table(tmp_path, capsys):
+    path = str(tmp_path / "tabla.txt")
+    with capture_table(path):
+        print("fila 1")
+    assert capsys.readouterr().out == ""
+    print_table(path)
+    assert capsys.readouterr().out == "fila 1\n"
+
+
+def test_dependent_reruns_when_missing_output_is_rewritten(tmp_path):
+    # "a" lee un archivo no declarado: su clave no cambia, pero al faltar su salida
+    # se vuelve a ejecutar y escribe otro contenido, que "b" (solo depende de "a") tiene que recoger
+    (tmp_path / "oculto.txt").write_text("uno")
+
+    def graph():
+        graph = TaskGraph(state_path(str(tmp_path), __file__))
+        graph.add("a", partial(copy_upper, tmp_path / "oculto.txt", tmp_path / "a.txt"),
+                  outputs=[tmp_path / "a.txt"])
+        graph.add("b", partial(concat, tmp_path / "b.txt", tmp_path / "a.txt"),
+                  outputs=[tmp_path / "b.txt"], deps=["a"])
+        return graph
+
+    graph().run(processes=False)
+    (tmp_path / "oculto.txt").write_text("dos")
+    os.remove(tmp_path / "a.txt")
+    report = graph().run(processes=False)
+    assert set(report.ran) == {"a", "b"}
+    assert (tmp_path / "b.txt").read_text() == "DOS"
+    assert graph().run(processes=False).skipped == ["a", "b"]
+
+    # Misma salida al rehacerla: el dependiente sigue al día
+    os.remove(tmp_path / "a.txt")
+    report = graph().run(processes=False)
+    assert set(report.ran) == {"a"}
+    assert report.skipped == ["b"]
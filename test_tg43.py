@@ -0,0 +1,127 @@
+"""Comprobaciones de tg43 con mapas sintéticos (sin archivos ROOT)."""
+
+import os
+
+import numpy as np
+import pytest
+
+from dose_loader import bin_centers
+from tg43 import geometry_function, tg43_grid, tg43_parameters, write_relative_dose
+
+GEANT4_6711_DOSE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "comparison", "geant4_6711_dose.txt")
+
+
+def centred_edges(half_width_mm, n_bins):
+    return np.linspace(-half_width_mm, half_width_mm, n_bins + 1)
+
+
+def radius_map(x_edges, y_edges):
+    xx, yy = np.meshgrid(bin_centers(x_edges), bin_centers(y_edges), indexing="ij")
+    return xx, yy, np.hypot(xx, yy)
+
+
+def test_shell_sums_match_voxel_loop():
+    rng = np.random.default_rng(0)
+    x_edges = centred_edges(6.0, 24)
+    y_edges = centred_edges(6.0, 24)
+    values = rng.random((24, 24))
+    result = tg43_parameters(values, x_edges, y_edges, radial_bin_mm=0.5, max_radius_mm=5.0,
+                             reference_radius_mm=2.0)
+
+    energy = np.zeros(len(result.radii_mm))
+    voxels = np.zeros(len(result.radii_mm), dtype=int)
+    for i, x in enumerate(bin_centers(x_edges)):
+        for j, y in enumerate(bin_centers(y_edges)):
+            shell = int(np.rint(np.hypot(x, y) / 0.5))
+            if 0 < shell < len(energy):
+                energy[shell] += values[i, j]
+                voxels[shell] += 1
+    np.testing.assert_allclose(result.energy[:, 0], energy)
+    np.testing.assert_array_equal(result.voxels[:, 0], voxels)
+
+
+def cell_geometry_map(x_edges, y_edges, source_axis=None, **grid_options):
+    """Mapa con G_L(r_capa, θ_celda) en cada vóxel: constante dentro de cada celda (capa, ángulo)."""
+    grid = tg43_grid(x_edges, y_edges, source_axis=source_axis, **grid_options)
+    n_angles = len(grid.angles_deg)
+    valid = grid.flat_index >= 0
+    index = np.where(valid, grid.flat_index, 0)
+    values = geometry_function(grid.radii_mm[index // n_angles], grid.angles_deg[index % n_angles])
+    return np.where(valid, values, 0.0)
+
+
+def test_radial_dose_is_one_for_pure_geometry():
+    x_edges = centred_edges(40.0, 320)
+    y_edges = centred_edges(40.0, 320)
+    result = tg43_parameters(cell_geometry_map(x_edges, y_edges, max_radius_mm=35.0), x_edges, y_edges,
+                             max_radius_mm=35.0)
+
+    reference = int(round(10.0 / 0.25))
+    assert result.relative_dose[reference] == pytest.approx(1.0)
+    filled = (result.voxels[:, 0] > 0) & (result.radii_mm > 0)
+    np.testing.assert_allclose(result.radial_dose[filled], 1.0, rtol=1e-12)
+
+
+def test_radial_dose_of_sampled_geometry():
+    # G_L evaluado en el centro de cada vóxel: g(r) = 1 salvo por el promedio dentro de cada capa
+    x_edges = centred_edges(40.0, 320)
+    y_edges = centred_edges(40.0, 320)
+    _, _, radius = radius_map(x_edges, y_edges)
+    values = geometry_function(radius, np.full_like(radius, 90.0))
+    result = tg43_parameters(values, x_edges, y_edges, max_radius_mm=35.0)
+
+    shells = (result.radii_mm >= 5.0) & (result.radii_mm <= 35.0)
+    np.testing.assert_allclose(result.radial_dose[shells], 1.0, rtol=1e-2)
+
+
+def test_anisotropy_is_one_for_pure_geometry():
+    # Malla con la fuente a lo largo del eje 0: F(r,θ) = 1 si la dosis de cada celda es G_L(r,θ)
+    x_edges = centred_edges(30.0, 240)
+    y_edges = centred_edges(30.0, 240)
+    values = cell_geometry_map(x_edges, y_edges, source_axis=0, max_radius_mm=25.0)
+    result = tg43_parameters(values, x_edges, y_edges, max_radius_mm=25.0, source_axis=0)
+
+    assert result.angles_deg[result.reference_column] == 90.0
+    transverse = result.voxels[:, result.reference_column:]
+    filled = (result.voxels > 0) & (transverse > 0) & (result.radii_mm[:, None] > 2.0)
+    np.testing.assert_allclose(result.anisotropy[filled], 1.0, rtol=1e-12)
+    assert filled[result.radii_mm > 10.0].sum() > 100
+
+
+def test_point_source_geometry_limit():
+    radius = np.array([5.0, 10.0, 20.0])
+    np.testing.assert_allclose(geometry_function(radius, np.full(3, 90.0), length_mm=1e-4), 1.0 / radius**2)
+    np.testing.assert_allclose(geometry_function(radius, np.zeros(3), length_mm=1.0), 1.0 / (radius**2 - 0.25))
+
+
+def test_grid_is_cached_and_read_only():
+    edges = centred_edges(5.0, 10)
+    grid = tg43_grid(edges, edges)
+    assert tg43_grid(edges.copy(), edges.copy()) is grid
+    assert not grid.flat_index.flags.writeable
+
+
+def test_missing_reference_deposit_raises():
+    edges = centred_edges(20.0, 40)
+    with pytest.raises(ValueError, match="referencia"):
+        tg43_parameters(np.zeros((40, 40)), edges, edges)
+
+
+def test_relative_dose_reproduces_geant4_6711_table(tmp_path):
+    # Rejilla de la macro (801×801 bins de 0.25 mm) con la dosis de cada capa
+    # Nint(4r) tomada de la tabla: la salida debe ser la propia tabla (398 filas, R > 0.05 cm)
+    reference = np.loadtxt(GEANT4_6711_DOSE)
+    shells = np.rint(reference[:, 0] * 40).astype(int)
+    profile = np.ones(401)
+    profile[shells] = reference[:, 1]
+    edges = centred_edges(100.125, 801)
+    _, _, radius = radius_map(edges, edges)
+    values = profile[np.minimum(np.rint(radius / 0.25).astype(int), 400)]
+
+    output = tmp_path / "geant4_dose.txt"
+    write_relative_dose(str(output), tg43_parameters(values, edges, edges))
+
+    written = np.loadtxt(output)
+    assert written.shape == reference.shape
+    np.testing.assert_allclose(written, reference, rtol=1e-5)
+    assert written[shells == 40, 1] == pytest.approx(1.0)
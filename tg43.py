@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Parámetros TG-43 (dosis relativa, g(r), F(r,θ), G_L) a partir de un mapa `h20`.
+
+Sustituye a `comparison/TG43_relative_dose.C`, que recorría el histograma
+801×801 bin a bin con `GetBinContent`, redondeaba el radio con
+`TMath::Nint(4*radius)` y acumulaba en arrays fijos `EnergyMap[401]`. Aquí
+los índices de capa radial (y de ángulo polar) se calculan una vez por
+rejilla y se reutilizan; la energía y el número de vóxeles por capa salen
+de un único `np.bincount`.
+
+Con los valores por defecto (capas de 0.25 mm hasta 100 mm, normalización
+en 1 cm) `relative_dose` y `write_relative_dose` siguen las capas, la
+normalización y el formato de `geant4_6711_dose.txt` (test_tg43 lo comprueba
+con un mapa sintético construido a partir de esa tabla). La única
+diferencia con la macro es la capa de 10 cm: sus bucles empezaban en el bin
+de underflow y nunca leían el último bin de cada eje.
+
+El mapa es un plano que contiene el centro de la fuente. Si el eje de la
+fuente está en el plano (malla XZ), `source_axis` indica cuál de los dos
+ejes del mapa es paralelo a ella y se obtiene F(r,θ). Con la malla XY en
+z=0 de las macros (`source_axis=None`) todo el plano es transversal, θ=90°."""
+
+import argparse
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from dose_loader import DEFAULT_HIST, bin_centers, load_histogram
+from score_reader import load_score
+
+RADIAL_BIN_MM = 0.25
+MAX_RADIUS_MM = 100.0
+ANGLE_BIN_DEG = 5.0
+REFERENCE_RADIUS_MM = 10.0
+SEED_LENGTH_MM = 3.5  # Seed_length de TG43_relative_dose.C (0.35 cm)
+MIN_OUTPUT_RADIUS_CM = 0.05
+
+
+class TG43Grid(NamedTuple):
+    """Índice plano (capa, ángulo) de cada vóxel del mapa; -1 fuera de rango."""
+
+    flat_index: np.ndarray
+    radii_mm: np.ndarray
+    angles_deg: np.ndarray
+
+
+class TG43Result(NamedTuple):
+    """Tablas (n_radios, n_ángulos); la columna `reference_column` es θ=90°."""
+
+    radii_mm: np.ndarray
+    angles_deg: np.ndarray
+    energy: np.ndarray
+    voxels: np.ndarray
+    dose: np.ndarray
+    geometry: np.ndarray
+    relative_dose: np.ndarray
+    radial_dose: np.ndarray
+    anisotropy: np.ndarray
+    reference_column: int
+
+
+@lru_cache(maxsize=8)
+def _cached_grid(
+    x_edges: bytes,
+    y_edges: bytes,
+    radial_bin_mm: float,
+    max_radius_mm: float,
+    angle_bin_deg: float,
+    source_axis: Optional[int],
+) -> TG43Grid:
+    x = bin_centers(np.frombuffer(x_edges))
+    y = bin_centers(np.frombuffer(y_edges))
+    xx, yy = np.meshgrid(x, y, indexing="ij")
+    radius = np.hypot(xx, yy)
+
+    n_radii = int(round(max_radius_mm / radial_bin_mm)) + 1
+    # Nint(r / ancho) como la macro: np.rint también redondea al par
+    radial_index = np.rint(radius / radial_bin_mm).astype(np.intp)
+    valid = (radius > 0) & (radial_index > 0) & (radial_index < n_radii)
+
+    if source_axis is None:
+        angles = np.array([90.0])
+        angle_index = np.zeros_like(radial_index)
+    else:
+        along = np.abs(xx if source_axis == 0 else yy)
+        theta = np.degrees(np.arccos(np.clip(along / np.where(radius > 0, radius, 1.0), 0.0, 1.0)))
+        n_angles = int(round(90.0 / angle_bin_deg)) + 1
+        angles = np.arange(n_angles) * angle_bin_deg
+        angle_index = np.rint(theta / angle_bin_deg).astype(np.intp)
+
+    flat_index = np.where(valid, radial_index * len(angles) + angle_index, -1)
+    flat_index.flags.writeable = False
+    return TG43Grid(flat_index, np.arange(n_radii) * radial_bin_mm, angles)
+
+
+def tg43_grid(
+    x_edges: np.ndarray,
+    y_edges: np.ndarray,
+    radial_bin_mm: float = RADIAL_BIN_MM,
+    max_radius_mm: float = MAX_RADIUS_MM,
+    angle_bin_deg: float = ANGLE_BIN_DEG,
+    source_axis: Optional[int] = None,
+) -> TG43Grid:
+    """Índices precalculados para una rejilla; se reutilizan entre mapas con los mismos bordes."""
+    return _cached_grid(
+        np.asarray(x_edges, dtype=np.float64).tobytes(),
+        np.asarray(y_edges, dtype=np.float64).tobytes(),
+        float(radial_bin_mm),
+        float(max_radius_mm),
+        float(angle_bin_deg),
+        source_axis,
+    )
+
+
+def geometry_function(
+    radius_mm: np.ndarray, theta_deg: np.ndarray, length_mm: float = SEED_LENGTH_MM
+) -> np.ndarray:
+    """G_L(r,θ) de fuente lineal: β / (L r sinθ), y 1 / (r² - L²/4) sobre el eje."""
+    radius = np.asarray(radius_mm, dtype=np.float64)
+    theta = np.radians(theta_deg)
+    rho = radius * np.sin(theta)
+    z = radius * np.cos(theta)
+    half = 0.5 * length_mm
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = np.arctan2(z + half, rho) - np.arctan2(z - half, rho)
+        off_axis = np.abs(beta) / (length_mm * rho)
+        on_axis = 1.0 / (radius * radius - half * half)
+    geometry = np.where(rho > 1e-9 * np.maximum(radius, 1.0), off_axis, on_axis)
+    return np.where(radius > 0, geometry, np.nan)
+
+
+def tg43_parameters(
+    values: np.ndarray,
+    x_edges: np.ndarray,
+    y_edges: np.ndarray,
+    radial_bin_mm: float = RADIAL_BIN_MM,
+    max_radius_mm: float = MAX_RADIUS_MM,
+    angle_bin_deg: float = ANGLE_BIN_DEG,
+    source_axis: Optional[int] = None,
+    reference_radius_mm: float = REFERENCE_RADIUS_MM,
+    seed_length_mm: float = SEED_LENGTH_MM,
+) -> TG43Result:
+    """Dosis media por capa/ángulo, G_L, dosis relativa, g(r) y F(r,θ) en una pasada.
+
+    La dosis de cada celda es la energía media por vóxel (energía / nº de
+    vóxeles), igual que `EnergyMap[i]/Voxels[i]` en la macro; las celdas
+    sin vóxeles quedan a 0."""
+    grid = tg43_grid(x_edges, y_edges, radial_bin_mm, max_radius_mm, angle_bin_deg, source_axis)
+    if grid.flat_index.shape != values.shape:
+        raise ValueError(f"Forma del mapa {values.shape} incompatible con los bordes {grid.flat_index.shape}")
+    n_radii, n_angles = len(grid.radii_mm), len(grid.angles_deg)
+
+    selected = grid.flat_index >= 0
+    index = grid.flat_index[selected]
+    size = n_radii * n_angles
+    energy = np.bincount(index, weights=np.asarray(values)[selected], minlength=size).reshape(n_radii, n_angles)
+    voxels = np.bincount(index, minlength=size).reshape(n_radii, n_angles)
+
+    dose = np.zeros_like(energy)
+    np.divide(energy, voxels, out=dose, where=voxels > 0)
+
+    column = n_angles - 1  # θ = 90°
+    reference = int(round(reference_radius_mm / radial_bin_mm))
+    if dose[reference, column] <= 0:
+        raise ValueError(f"Sin depósito en el punto de referencia (r = {reference_radius_mm} mm, 90°)")
+
+    radii, angles = np.meshgrid(grid.radii_mm, grid.angles_deg, indexing="ij")
+    geometry = geometry_function(radii, angles, seed_length_mm)
+    relative = dose[:, column] / dose[reference, column]
+    radial = relative * geometry[reference, column] / geometry[:, column]
+    anisotropy = np.zeros_like(dose)
+    transverse = dose[:, column : column + 1]
+    with np.errstate(invalid="ignore"):  # G_L es NaN en r = 0, donde no hay vóxeles
+        np.divide(
+            dose * geometry[:, column : column + 1],
+            transverse * geometry,
+            out=anisotropy,
+            where=transverse > 0,
+        )
+    return TG43Result(
+        grid.radii_mm,
+        grid.angles_deg,
+        energy,
+        voxels,
+        dose,
+        geometry,
+        relative,
+        np.nan_to_num(radial),
+        anisotropy,
+        column,
+    )
+
+
+def load_map(path: str, hist_name: str = DEFAULT_HIST) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Mapa 2D y bordes desde un ROOT (`h20`) o un volcado `.out`/`.bin` (suma en z)."""
+    if path.endswith(".root"):
+        hist = load_histogram(path, hist_name)
+        return hist.values, hist.x_edges, hist.y_edges
+    dump = load_score(path)
+    edges = []
+    for centers in dump.centers[:2]:
+        step = centers[1] - centers[0]
+        edges.append(np.append(centers - 0.5 * step, centers[-1] + 0.5 * step))
+    return np.asarray(dump.values).sum(axis=2), edges[0], edges[1]
+
+
+def write_relative_dose(
+    path: str, result: TG43Result, min_radius_cm: float = MIN_OUTPUT_RADIUS_CM
+) -> None:
+    """Escribe `R(cm)     dosis relativa` con el mismo formato que geant4_dose_*.txt."""
+    radii_cm = result.radii_mm / 10.0
+    with open(path, "w") as output:
+        for radius_cm, dose in zip(radii_cm, result.relative_dose):
+            if radius_cm > min_radius_cm:
+                output.write(f"{radius_cm:g}     {dose:g}\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parámetros TG-43 a partir de un mapa h20")
+    parser.add_argument("path", help="archivo ROOT del writer o volcado .out/.bin")
+    parser.add_argument("-o", "--output", help="archivo de dosis relativa (formato geant4_dose_*.txt)")
+    parser.add_argument("--hist", default=DEFAULT_HIST)
+    parser.add_argument("--radial-bin", type=float, default=RADIAL_BIN_MM, help="ancho de capa (mm)")
+    parser.add_argument("--angle-bin", type=float, default=ANGLE_BIN_DEG, help="ancho angular (grados)")
+    parser.add_argument("--max-radius", type=float, default=MAX_RADIUS_MM, help="radio máximo (mm)")
+    parser.add_argument("--source-axis", type=int, choices=(0, 1), help="eje del mapa paralelo a la fuente")
+    args = parser.parse_args()
+
+    values, x_edges, y_edges = load_map(args.path, args.hist)
+    result = tg43_parameters(
+        values,
+        x_edges,
+        y_edges,
+        radial_bin_mm=args.radial_bin,
+        max_radius_mm=args.max_radius,
+        angle_bin_deg=args.angle_bin,
+        source_axis=args.source_axis,
+    )
+    column = result.reference_column
+    reference = int(round(REFERENCE_RADIUS_MM / args.radial_bin))
+    print(f"Energía depositada en el punto de referencia: {result.energy[reference, column]:.6g}")
+    print("  r (cm)    dosis rel.    g(r)")
+    for r_mm in (2.5, 5.0, 10.0, 20.0, 30.0, 50.0, 70.0, 100.0):
+        i = int(round(r_mm / args.radial_bin))
+        if i < len(result.radii_mm):
+            print(f"  {r_mm / 10:6.2f}  {result.relative_dose[i]:10.5f}  {result.radial_dose[i]:8.5f}")
+    if args.output:
+        write_relative_dose(args.output, result)
+        print(f"Dosis relativa guardada en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Procesado por tiles de volúmenes de dosis que no caben en memoria.
+
+`TiledArray` envuelve un array mapeado en memoria (el `.bin` del writer,
+el sidecar `.npy` de un ROOT o un `.npy` intermedio) y lo recorre en tiles
+de filas completas del eje 0 de ~`tile_voxels` vóxeles. Las operaciones
+habituales de los scripts (edep → dosis, diferencia y ratio contra una
+referencia, estadísticas por región y extracción de láminas) leen un tile
+cada vez; los resultados del mismo tamaño que la entrada se escriben en
+otro `.npy` mapeado (`out_path`) en lugar de en RAM.
+
+Los tiles se procesan en un pool de hilos: numpy libera el GIL en la
+aritmética y la lectura de páginas del memmap, y cada tile escribe en una
+zona distinta de la salida.
+
+Un ROOT solo se decodifica entero la primera vez (uproot no lee por
+trozos); a partir de ahí el sidecar `.npy` se mapea como cualquier otro."""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from dose_loader import DEFAULT_HIST, load_histogram
+from mesh_index import RegionStats
+from score_reader import is_score_binary, open_score_binary
+
+TILE_VOXELS = 1 << 22  # 32 MiB por tile en float64
+MAX_TILE_WORKERS = 8
+MEV_TO_GY = 1.602e-10
+
+Selector = Tuple[slice, ...]
+ArrayLike = Union[np.ndarray, "TiledArray"]
+
+
+def iter_tiles(shape: Sequence[int], tile_voxels: int = TILE_VOXELS) -> Iterator[Selector]:
+    """Selectores de bloques de filas completas del eje 0 con ~`tile_voxels` vóxeles."""
+    row_voxels = int(np.prod(shape[1:], dtype=np.int64))
+    rows = max(1, tile_voxels // max(row_voxels, 1))
+    for start in range(0, shape[0], rows):
+        yield (slice(start, min(start + rows, shape[0])),) + (slice(None),) * (len(shape) - 1)
+
+
+def _source(array: ArrayLike) -> np.ndarray:
+    return array.values if isinstance(array, TiledArray) else array
+
+
+class TiledArray:
+    """Array (normalmente un memmap) que se procesa por tiles del eje 0."""
+
+    def __init__(
+        self, values: np.ndarray, tile_voxels: int = TILE_VOXELS, max_workers: Optional[int] = None
+    ):
+        self.values = values
+        self.tile_voxels = tile_voxels
+        self.max_workers = max_workers
+
+    @classmethod
+    def open(cls, path: str, hist_name: str = DEFAULT_HIST, **kwargs) -> "TiledArray":
+        """Abre un `.bin` del writer, un `.npy` o un histograma de un archivo ROOT, sin copiarlo a RAM."""
+        if is_score_binary(path):
+            return cls(open_score_binary(path).values, **kwargs)
+        if path.endswith(".npy"):
+            return cls(np.load(path, mmap_mode="r"), **kwargs)
+        return cls(load_histogram(path, hist_name).values, **kwargs)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.values.shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.values.dtype
+
+    def tiles(self) -> List[Selector]:
+        return list(iter_tiles(self.shape, self.tile_voxels))
+
+    def _run(self, task: Callable[[Selector], object]) -> List[object]:
+        """Ejecuta `task` sobre cada tile (en paralelo si hay más de uno) y devuelve los resultados en orden."""
+        tiles = self.tiles()
+        workers = self.max_workers or min(len(tiles), MAX_TILE_WORKERS)
+        if workers <= 1:
+            return [task(selector) for selector in tiles]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(task, tiles))
+
+    def map(
+        self,
+        func: Callable[[np.ndarray, Selector], np.ndarray],
+        out_path: Optional[str] = None,
+        dtype: type = np.float64,
+    ) -> "TiledArray":
+        """Aplica `func(tile, selector)` a cada tile; la salida va a `out_path` (.npy mapeado) o a RAM."""
+        if out_path is not None:
+            out = np.lib.format.open_memmap(out_path, mode="w+", dtype=dtype, shape=self.shape)
+        else:
+            out = np.empty(self.shape, dtype=dtype)
+
+        def task(selector: Selector) -> None:
+            out[selector] = func(np.asarray(self.values[selector], dtype=np.float64), selector)
+
+        self._run(task)
+        if isinstance(out, np.memmap):
+            out.flush()
+        return TiledArray(out, self.tile_voxels, self.max_workers)
+
+    def to_dose(
+        self,
+        density: Union[float, ArrayLike],
+        voxel_volume_cm3: float,
+        out_path: Optional[str] = None,
+    ) -> "TiledArray":
+        """edep (MeV) → Gy con densidad constante o un mapa de densidades de la misma forma."""
+        factor = MEV_TO_GY / voxel_volume_cm3
+        if np.ndim(density) == 0:
+            return self.map(lambda tile, _: tile * (factor / float(density)), out_path)
+        density = _source(density)
+
+        def convert(tile: np.ndarray, selector: Selector) -> np.ndarray:
+            rho = np.asarray(density[selector], dtype=np.float64)
+            dose = np.zeros_like(tile)
+            np.divide(tile * factor, rho, out=dose, where=rho > 0)
+            return dose
+
+        return self.map(convert, out_path)
+
+    def difference(self, reference: ArrayLike, out_path: Optional[str] = None) -> "TiledArray":
+        reference = _source(reference)
+        return self.map(lambda tile, selector: tile - reference[selector], out_path)
+
+    def ratio(self, reference: ArrayLike, out_path: Optional[str] = None, fill: float = 1.0) -> "TiledArray":
+        """self / referencia; `fill` donde la referencia es 0."""
+        reference = _source(reference)
+
+        def divide(tile: np.ndarray, selector: Selector) -> np.ndarray:
+            ref = np.asarray(reference[selector], dtype=np.float64)
+            out = np.full_like(tile, fill)
+            np.divide(tile, ref, out=out, where=ref > 0)
+            return out
+
+        return self.map(divide, out_path)
+
+    def region_stats(
+        self, labels: ArrayLike, n_labels: int, positive_only: bool = False
+    ) -> RegionStats:
+        """Suma, cuenta, media y máximo por etiqueta acumulando tile a tile (etiquetas < 0 ignoradas)."""
+        labels = _source(labels)
+
+        def reduce(selector: Selector) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+            tile_labels = np.asarray(labels[selector]).ravel()
+            values = np.asarray(self.values[selector], dtype=np.float64).ravel()
+            selected = tile_labels >= 0
+            if positive_only:
+                selected &= values > 0
+            tile_labels, values = tile_labels[selected].astype(np.intp), values[selected]
+            maxima = np.full(n_labels, -np.inf)
+            np.maximum.at(maxima, tile_labels, values)
+            return (
+                np.bincount(tile_labels, weights=values, minlength=n_labels),
+                np.bincount(tile_labels, minlength=n_labels),
+                maxima,
+            )
+
+        partial = self._run(reduce)
+        sums = np.sum([p[0] for p in partial], axis=0)
+        counts = np.sum([p[1] for p in partial], axis=0)
+        maxima = np.max([p[2] for p in partial], axis=0)
+        means = np.zeros(n_labels)
+        np.divide(sums, counts, out=means, where=counts > 0)
+        return RegionStats(sums, counts, means, np.where(counts > 0, maxima, 0.0))
+
+    def slab(self, axis: int, index: int) -> np.ndarray:
+        """Lámina en memoria; del memmap solo se leen las páginas que la contienen."""
+        selector = [slice(None)] * len(self.shape)
+        selector[axis] = index
+        return np.array(self.values[tuple(selector)])
+
+    def sum(self, axis: Optional[int] = None) -> Union[float, np.ndarray]:
+        """Suma total o a lo largo de un eje ≠ 0 (p. ej. la proyección XY de un volumen)."""
+        if axis == 0:
+            raise ValueError("La suma a lo largo del eje de tiles no está soportada; usa slab o map")
+        partial = self._run(lambda selector: np.asarray(self.values[selector], dtype=np.float64).sum(axis=axis))
+        return float(np.sum(partial)) if axis is None else np.concatenate(partial, axis=0)